@@ -0,0 +1,75 @@
+"""Tiempo de arranque en frío y de rerun de cada página de la app.
+
+    python benchmarks/bench_arranque.py
+    python benchmarks/bench_arranque.py --app /ruta/a/otra/version/streamlit_app.py --paginas "📈 Gráficar"
+
+Cada página se mide en un proceso nuevo con ``streamlit.testing.v1.AppTest``:
+
+* ``importar_streamlit_ms``: importar Streamlit (común a todas las páginas).
+* ``arranque_ms``: primer run de la app abierta en la página, con los imports en frío.
+* ``rerun_ms``: mediana de los reruns siguientes en la misma página.
+* ``modulos_pesados``: cuáles de ``MODULOS_PESADOS`` ha importado la página.
+
+Usa la base de datos del directorio actual; con ``DAD_PROVEEDOR=falso`` no necesita red.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS_PESADOS = ('plotly.graph_objects', 'matplotlib', 'yfinance', 'scipy', 'pyarrow')
+
+PAGINAS = ["📈 Gráficar", "📊 Estudio Índices", "💰 Inversión", "🧑🏻‍🤝‍🧑🏽 Estudio Países", "🗺️ Estudio Regiones"]
+
+# Se ejecuta en un proceso hijo para que cada medida empiece con los imports en frío
+MEDIDA = '''
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+importar_streamlit = time.perf_counter() - t0
+app, pagina, reruns, pesados = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4].split(',')
+at = AppTest.from_file(app, default_timeout=600)
+# La app abre directamente en la página pedida (radio con key="pagina"); si es una versión
+# sin esa key, se arranca en la página por defecto y se cambia con el radio
+at.session_state['pagina'] = pagina
+t0 = time.perf_counter(); at.run(); arranque = time.perf_counter() - t0
+if at.sidebar.radio[0].value != pagina:
+    at.sidebar.radio[0].set_value(pagina)
+    t0 = time.perf_counter(); at.run(); arranque += time.perf_counter() - t0
+tiempos = []
+for _ in range(reruns):
+    t0 = time.perf_counter(); at.run(); tiempos.append(time.perf_counter() - t0)
+tiempos.sort()
+print(json.dumps({
+    'importar_streamlit_ms': importar_streamlit * 1000,
+    'arranque_ms': arranque * 1000,
+    'rerun_ms': tiempos[len(tiempos) // 2] * 1000 if tiempos else None,
+    'modulos_pesados': [m for m in pesados if m in sys.modules],
+    'errores': [str(e.value) for e in at.exception],
+}))
+'''
+
+
+def medir(app, pagina, reruns):
+    entorno = dict(os.environ, PYTHONPATH=os.pathsep.join([RAIZ, os.environ.get('PYTHONPATH', '')]))
+    salida = subprocess.run([sys.executable, '-c', MEDIDA, app, pagina, str(reruns), ','.join(MODULOS_PESADOS)],
+                            capture_output=True, text=True, env=entorno, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--app', default=os.path.join(RAIZ, 'streamlit_app.py'))
+    parser.add_argument('--paginas', nargs='*', default=PAGINAS)
+    parser.add_argument('--reruns', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    resultados = {pagina: medir(os.path.abspath(args.app), pagina, args.reruns) for pagina in args.paginas}
+    print(json.dumps({'app': args.app, 'paginas': resultados}, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Compara la lectura de cierres diarios: pd.read_sql por ticker, consulta agrupada y caché columnar.
+
+    python benchmarks/bench_columnar.py --tickers 43 --anios 30 --repeticiones 5
+
+Genera una base de datos sintética en un directorio temporal (sin red) y muestra el
+tiempo medio de cargar todo el universo con cada método. Los tres construyen lo mismo que
+``CacheSeries``, ``{nombreTicker: DataFrame(fecha, close)}``, y devuelven la suma de los
+cierres para comprobar que han leído los mismos datos. La conexión y el ``AlmacenColumnar``
+se abren una vez fuera de la medida (como el pool de lectores de la app), así que ningún
+método paga su preparación.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dadanalysis import almacen  # noqa: E402
+from dadanalysis.columnar import AlmacenColumnar  # noqa: E402
+from dadanalysis.proveedores import ProveedorFalso  # noqa: E402
+from dadanalysis.sincronizacion import sincronizar  # noqa: E402
+
+
+def crear_db(ruta, tickers, anios):
+    df_tickers = pd.DataFrame({'ticker': [f'T{i:04d}' for i in range(tickers)],
+                               'nombreTicker': [f'Serie_{i:04d}' for i in range(tickers)]})
+    inicio = pd.Timestamp.today().normalize() - pd.DateOffset(years=anios)
+    with almacen.abrir(ruta) as conexion:
+        sincronizar(conexion, df_tickers, ProveedorFalso(inicio=inicio))
+    return list(df_tickers['nombreTicker'])
+
+
+def leer_read_sql(conexion, nombres):
+    # Camino anterior: una consulta por ticker con pd.read_sql y conversión de fechas en pandas
+    ids = dict(conexion.execute('SELECT nombreTicker, ticker_id FROM series'))
+    series = {}
+    for nombre in nombres:
+        df = pd.read_sql('SELECT fecha, close FROM prices WHERE ticker_id = ? ORDER BY fecha', conexion,
+                         params=(ids[nombre],))
+        df['fecha'] = almacen.dias_a_fechas(df['fecha'].to_numpy())
+        series[nombre] = df
+    return series
+
+
+def leer_agrupada(conexion, nombres):
+    # Igual que CacheSeries._leer_db
+    df = almacen.cargar_precios(conexion, nombres)
+    return {nombre: grupo[['fecha', 'close']].reset_index(drop=True) for nombre, grupo in df.groupby('nombreTicker', sort=False)}
+
+
+def leer_columnar(columnar, nombres):
+    # Igual que CacheSeries._leer_columnar: el DataFrame copia las páginas mapeadas
+    ids = columnar.ids_por_nombre()
+    series = {}
+    for nombre in nombres:
+        dias, close = columnar.serie(ids[nombre])
+        series[nombre] = pd.DataFrame({'fecha': almacen.dias_a_fechas(dias), 'close': close})
+    return series
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        series = funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return {'segundos': float(np.median(tiempos)), 'filas': sum(len(df) for df in series.values()),
+            'suma_cierres': float(sum(df['close'].sum() for df in series.values()))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', type=int, default=43)
+    parser.add_argument('--anios', type=int, default=30)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'bench.db')
+        nombres = crear_db(ruta, args.tickers, args.anios)
+
+        t0 = time.perf_counter()
+        with almacen.abrir(ruta) as conexion:
+            AlmacenColumnar(ruta).actualizar(conexion)
+        construccion = time.perf_counter() - t0
+
+        columnar = AlmacenColumnar(ruta)
+        with almacen.abrir(ruta) as conexion:
+            resultados = {
+                'read_sql_por_ticker': medir(lambda: leer_read_sql(conexion, nombres), args.repeticiones),
+                'consulta_agrupada': medir(lambda: leer_agrupada(conexion, nombres), args.repeticiones),
+                'columnar_mmap': medir(lambda: leer_columnar(columnar, nombres), args.repeticiones),
+            }
+        resultados['construccion_columnar'] = {'segundos': construccion}
+    print(json.dumps({'tickers': args.tickers, 'anios': args.anios, 'resultados': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
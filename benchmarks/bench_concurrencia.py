@@ -0,0 +1,102 @@
+"""Lecturas concurrentes mientras una sincronización escribe (WAL + pool de conexiones).
+
+    python benchmarks/bench_concurrencia.py --sesiones 8 --tickers 43 --anios 20
+
+Simula ``--sesiones`` sesiones de Streamlit leyendo series por el pool de
+``dadanalysis.conexiones`` mientras otro hilo sincroniza una segunda tanda de tickers
+con el proveedor sintético. Cuenta los errores ``database is locked`` (deben ser 0) y
+muestra la latencia de lectura antes y durante la escritura.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dadanalysis import almacen, conexiones  # noqa: E402
+from dadanalysis.proveedores import ProveedorFalso  # noqa: E402
+from dadanalysis.sincronizacion import sincronizar_por_fases  # noqa: E402
+
+
+def universo(desde, cantidad):
+    return pd.DataFrame({'ticker': [f'T{i:04d}' for i in range(desde, desde + cantidad)],
+                         'nombreTicker': [f'Serie_{i:04d}' for i in range(desde, desde + cantidad)]})
+
+
+def sesion(ruta, nombres, parar, latencias, errores):
+    rng = np.random.default_rng(threading.get_ident() % 2**32)
+    while not parar.is_set():
+        elegidos = list(rng.choice(nombres, size=min(5, len(nombres)), replace=False))
+        t0 = time.perf_counter()
+        try:
+            with conexiones.lectura(ruta) as conexion:
+                almacen.cargar_precios(conexion, elegidos)
+        except sqlite3.OperationalError as e:
+            errores.append(str(e))
+            continue
+        latencias.append(time.perf_counter() - t0)
+
+
+def medir_lecturas(ruta, nombres, sesiones, mientras):
+    """Lanza las sesiones lectoras, ejecuta ``mientras()`` y devuelve latencias y errores."""
+    parar = threading.Event()
+    latencias, errores = [], []
+    hilos = [threading.Thread(target=sesion, args=(ruta, nombres, parar, latencias, errores)) for _ in range(sesiones)]
+    for hilo in hilos:
+        hilo.start()
+    t0 = time.perf_counter()
+    mientras()
+    duracion = time.perf_counter() - t0
+    parar.set()
+    for hilo in hilos:
+        hilo.join()
+    return {
+        'segundos': duracion,
+        'lecturas': len(latencias),
+        'latencia_p50_ms': float(np.percentile(latencias, 50) * 1000) if latencias else None,
+        'latencia_p99_ms': float(np.percentile(latencias, 99) * 1000) if latencias else None,
+        'errores': len(errores),
+        'ejemplos_error': sorted(set(errores))[:3],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sesiones', type=int, default=8)
+    parser.add_argument('--tickers', type=int, default=43)
+    parser.add_argument('--anios', type=int, default=20)
+    parser.add_argument('--reposo', type=float, default=2.0, help='Segundos de lectura sin escritura (referencia)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'bench.db')
+        inicio = pd.Timestamp.today().normalize() - pd.DateOffset(years=args.anios)
+        gestor = conexiones.gestor(ruta)
+        base = universo(0, args.tickers)
+        sincronizar_por_fases(gestor.escritura, base, ProveedorFalso(inicio=inicio))
+        nombres = list(base['nombreTicker'])
+
+        resultados = {
+            'solo_lectura': medir_lecturas(ruta, nombres, args.sesiones, lambda: time.sleep(args.reposo)),
+            'durante_sincronizacion': medir_lecturas(
+                ruta, nombres, args.sesiones,
+                lambda: sincronizar_por_fases(gestor.escritura, universo(args.tickers, args.tickers),
+                                              ProveedorFalso(inicio=inicio))),
+        }
+        gestor.cerrar()
+    print(json.dumps({'sesiones': args.sesiones, 'tickers': args.tickers, 'anios': args.anios,
+                      'resultados': resultados}, indent=2, ensure_ascii=False))
+    if any(r['errores'] for r in resultados.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Benchmark por fases de la app, sin red, de 43 a 5.000 tickers.
+
+    python benchmarks/bench_fases.py --escenarios 43,500,5000 --anios 10 --salida resultados.json
+    python benchmarks/bench_fases.py --comparar anterior.json
+
+Para cada escenario (número de tickers) genera bases de datos sintéticas y mide, con
+``yfinance.Ticker`` sustituido por ``yf_falso.TickerFalso`` (latencia configurable):
+
+* ``sync_frio``: sincronización completa sobre una base de datos vacía.
+* ``sync_incremental``: sincronización de los últimos ``--dias-atraso`` días hábiles.
+* ``consulta_fria`` / ``consulta_caliente``: lectura de ``--seleccion`` series con
+  ``CacheSeries`` (caché vacía / ya poblada), como ``render_graph``.
+* ``normalizacion``: el paso a base 100 del "Gráfico de Índices".
+* ``figura``: construir la figura de Plotly y serializarla a JSON (lo que hace ``st.plotly_chart``).
+* ``info_red`` / ``info_disco`` / ``info_memoria``: el bucle de "Datos Financieros Clave"
+  con ``CacheInfo`` sin caché, leyendo de SQLite y desde memoria.
+
+La salida es JSON (con el commit actual) para poder comparar resultados entre commits.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos_sinteticos  # noqa: E402
+import yf_falso  # noqa: E402
+from dadanalysis import almacen, conexiones  # noqa: E402
+from dadanalysis.consultas import CacheSeries  # noqa: E402
+from dadanalysis.graficos import PUNTOS_POR_TRAZO, clase_trazo, elegir_frecuencia  # noqa: E402
+from dadanalysis.info_tickers import CacheInfo, obtener_info_yfinance  # noqa: E402
+from dadanalysis.proveedores import ProveedorYFinance  # noqa: E402
+from dadanalysis.sincronizacion import sincronizar  # noqa: E402
+
+
+def cronometrar(funcion, repeticiones=1):
+    """Mediana de ``repeticiones`` ejecuciones de ``funcion``; devuelve ``(segundos, último resultado)``."""
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return float(np.median(tiempos)), resultado
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def medir_sync(directorio, df_tickers, args, yf):
+    fases = {}
+    ruta = os.path.join(directorio, 'frio.db')
+    proveedor = ProveedorYFinance(max_workers=args.workers)
+    with almacen.abrir(ruta) as conexion:
+        yf.llamadas.clear()
+        fases['sync_frio'], resumen = cronometrar(lambda: sincronizar(conexion, df_tickers, proveedor))
+    fases['sync_frio_filas'] = resumen['filas']
+    fases['sync_frio_llamadas'] = yf.llamadas['history']
+
+    ruta = os.path.join(directorio, 'incremental.db')
+    datos_sinteticos.generar(ruta, df_tickers, args.anios, dias_atraso=args.dias_atraso, calcular_derivadas=True)
+    with almacen.abrir(ruta) as conexion:
+        fases['sync_incremental'], resumen = cronometrar(lambda: sincronizar(conexion, df_tickers, proveedor))
+    fases['sync_incremental_filas'] = resumen['filas']
+    return ruta, fases
+
+
+def medir_lectura(ruta, nombres, args):
+    fases = {}
+    desde = date.today() - timedelta(days=int(args.anios * 365.25))
+    frecuencia = elegir_frecuencia(desde)
+
+    def leer(cache):
+        return cache.series(nombres, desde=desde, frecuencia=frecuencia, puntos=PUNTOS_POR_TRAZO)
+
+    fases['consulta_fria'], _ = cronometrar(lambda: leer(CacheSeries(ruta)), args.repeticiones)
+    cache = CacheSeries(ruta)
+    leer(cache)
+    fases['consulta_caliente'], series = cronometrar(lambda: leer(cache), args.repeticiones)
+
+    fases['normalizacion'], normalizadas = cronometrar(
+        lambda: {n: df['close'] / df['close'].iloc[0] * 100 for n, df in series.items()}, args.repeticiones)
+
+    def figura():
+        import plotly.graph_objects as go
+        fig = go.Figure()
+        Trazo = clase_trazo(sum(len(df) for df in series.values()))
+        for nombre, df in series.items():
+            fig.add_trace(Trazo(x=df['fecha'], y=normalizadas[nombre], mode='lines', name=nombre))
+        fig.update_layout(hovermode='x unified', xaxis=dict(rangeslider=dict(visible=True)))
+        return fig.to_json()
+
+    fases['figura'], json_figura = cronometrar(figura, args.repeticiones)
+    fases['figura_kb'] = len(json_figura) / 1024
+    return fases
+
+
+def medir_info(ruta, tickers, yf):
+    fases = {}
+
+    def bucle(cache):
+        return [cache.info(t) for t in tickers]
+
+    yf.llamadas.clear()
+    cache = CacheInfo(ruta, obtener=obtener_info_yfinance)
+    fases['info_red'], _ = cronometrar(lambda: bucle(cache))
+    fases['info_red_llamadas'] = yf.llamadas['info']
+    fases['info_memoria'], _ = cronometrar(lambda: bucle(cache))
+    fases['info_disco'], _ = cronometrar(lambda: bucle(CacheInfo(ruta, obtener=obtener_info_yfinance)))
+    return fases
+
+
+def escenario(tickers, args):
+    df_tickers = datos_sinteticos.universo_sintetico(tickers, bancos_por_pais=args.bancos_por_pais)
+    seleccion = df_tickers.head(args.seleccion)
+    with tempfile.TemporaryDirectory() as directorio, \
+            yf_falso.instalar(args.latencia_historia, args.latencia_info, anios=args.anios) as yf:
+        ruta, fases = medir_sync(directorio, df_tickers, args, yf)
+        fases.update(medir_lectura(ruta, list(seleccion['nombreTicker']), args))
+        fases.update(medir_info(ruta, list(seleccion['ticker']), yf))
+        conexiones.gestor(ruta).cerrar()
+    return {'tickers': tickers, 'fases': fases}
+
+
+def comparar(actual, anterior):
+    """``{tickers: {fase: actual / anterior}}`` de las fases de tiempo comunes a ambos resultados."""
+    previos = {e['tickers']: e['fases'] for e in anterior['escenarios']}
+    cocientes = {}
+    for e in actual['escenarios']:
+        base = previos.get(e['tickers'], {})
+        cocientes[e['tickers']] = {fase: round(valor / base[fase], 3) for fase, valor in e['fases'].items()
+                                   if fase in base and base[fase] and not fase.endswith(('_filas', '_llamadas', '_kb'))}
+    return cocientes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--escenarios', default='43,500', help='Números de tickers separados por comas (hasta 5000)')
+    parser.add_argument('--anios', type=float, default=10)
+    parser.add_argument('--dias-atraso', type=int, default=5)
+    parser.add_argument('--seleccion', type=int, default=10, help='Series que se leen y dibujan (tickers seleccionados)')
+    parser.add_argument('--bancos-por-pais', type=int, default=5, help='Tamaño de los compuestos por país')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latencia-historia', type=float, default=0.05)
+    parser.add_argument('--latencia-info', type=float, default=0.2)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--salida', help='Guarda el JSON en este fichero')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior con el que comparar')
+    args = parser.parse_args(argv)
+
+    resultado = {
+        'commit': commit_actual(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('salida', 'comparar')},
+        'escenarios': [escenario(int(n), args) for n in args.escenarios.split(',')],
+    }
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            resultado['comparacion'] = comparar(resultado, json.load(f))
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    print(texto)
+
+
+if __name__ == '__main__':
+    main()
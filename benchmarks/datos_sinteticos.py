@@ -0,0 +1,90 @@
+"""Generador de bases de datos sintéticas con el esquema de ``macroeconomic_data.db``.
+
+    python benchmarks/datos_sinteticos.py --tickers 500 --anios 20 --salida /tmp/bench.db
+
+Cada ticker es un paseo aleatorio determinista (el mismo nombre da siempre la misma
+serie). ``--dias-atraso`` deja la historia sin los últimos días hábiles para medir una
+sincronización incremental, y ``--derivadas`` calcula también los compuestos y la tabla
+``metricas``, como quedarían tras una sincronización normal.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dadanalysis import almacen, compuestos, derivadas  # noqa: E402
+from dadanalysis.consultas import incrementar_version_datos  # noqa: E402
+
+
+def universo_sintetico(tickers, bancos_por_pais=0):
+    """``df_tickers`` con ``tickers`` filas. Con ``bancos_por_pais`` se añade la columna ``pais``."""
+    df = pd.DataFrame({'ticker': [f'T{i:05d}' for i in range(tickers)],
+                       'nombreTicker': [f'Serie_{i:05d}' for i in range(tickers)]})
+    if bancos_por_pais:
+        df['pais'] = [f'Pais_{i // bancos_por_pais:03d}' for i in range(tickers)]
+    return df
+
+
+def dias_habiles(inicio, fin):
+    """Días hábiles ``[inicio, fin]`` como días desde 1970-01-01 (``int64``)."""
+    dias = np.arange(np.datetime64(inicio, 'D'), np.datetime64(fin, 'D') + 1)
+    return dias[np.is_busday(dias)].astype(np.int64)
+
+
+def cierres_sinteticos(ticker, n):
+    rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+    return 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.012, n)))
+
+
+def generar(ruta, df_tickers, anios, dias_atraso=0, calcular_derivadas=False, hoy=None):
+    """Escribe en ``ruta`` (que no debe existir) la historia de ``df_tickers``. Devuelve métricas de la generación."""
+    hoy = hoy or date.today()
+    fin = hoy - timedelta(days=1)
+    dias = dias_habiles(hoy - timedelta(days=int(anios * 365.25)), fin)
+    if dias_atraso:
+        dias = dias[:-dias_atraso]
+
+    t0 = time.perf_counter()
+    with almacen.abrir(ruta) as conexion:
+        ids = almacen.registrar_tickers(conexion, df_tickers)
+        for ticker, ticker_id in ids.items():
+            cierres = cierres_sinteticos(ticker, len(dias))
+            conexion.executemany('INSERT INTO prices (ticker_id, fecha, close) VALUES (?, ?, ?)',
+                                 zip([ticker_id] * len(dias), dias.tolist(), cierres.tolist()))
+        almacen.actualizar_agregados(conexion)
+        if calcular_derivadas:
+            compuestos.actualizar(conexion, df_tickers)
+            derivadas.actualizar(conexion)
+        incrementar_version_datos(conexion)
+        if not dias_atraso:
+            almacen.escribir_meta(conexion, 'dia_sincronizado', almacen.dia_a_fecha(dias[-1]).isoformat())
+    return {'tickers': len(ids), 'filas': len(ids) * len(dias), 'segundos': time.perf_counter() - t0,
+            'megabytes': os.path.getsize(ruta) / 2**20}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', type=int, default=43)
+    parser.add_argument('--anios', type=float, default=30)
+    parser.add_argument('--dias-atraso', type=int, default=0)
+    parser.add_argument('--derivadas', action='store_true')
+    parser.add_argument('--salida', default='bench.db')
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.salida):
+        parser.error(f'{args.salida} ya existe')
+    metricas = generar(args.salida, universo_sintetico(args.tickers), args.anios,
+                       dias_atraso=args.dias_atraso, calcular_derivadas=args.derivadas)
+    print(json.dumps(metricas, indent=2))
+
+
+if __name__ == '__main__':
+    main()
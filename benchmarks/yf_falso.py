@@ -0,0 +1,77 @@
+"""Sustituto de ``yfinance.Ticker`` para medir sin red.
+
+``instalar(latencia_historia=..., latencia_info=...)`` cambia ``yfinance.Ticker`` por
+``TickerFalso`` mientras dura el ``with``, así que ``ProveedorYFinance`` y
+``obtener_info_yfinance`` ejecutan su código real contra datos sintéticos. Cada llamada
+duerme la latencia configurada y queda contada en ``TickerFalso.llamadas``.
+"""
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pandas as pd
+
+from datos_sinteticos import cierres_sinteticos, dias_habiles
+from dadanalysis.info_tickers import obtener_info_falso
+
+
+class TickerFalso:
+    latencia_historia = 0.0
+    latencia_info = 0.0
+    anios = 30
+    llamadas = Counter()
+    _lock = threading.Lock()
+
+    def __init__(self, ticker, session=None):
+        self.ticker = ticker
+
+    @classmethod
+    def _contar(cls, tipo):
+        with cls._lock:
+            cls.llamadas[tipo] += 1
+
+    def history(self, period=None, start=None, **opciones):
+        self._contar('history')
+        time.sleep(self.latencia_historia)
+        hoy = date.today()
+        dias = dias_habiles(hoy - timedelta(days=int(self.anios * 365.25)), hoy - timedelta(days=1))
+        cierres = cierres_sinteticos(self.ticker, len(dias))
+        # Como yfinance: índice con zona horaria y columnas OHLCV
+        indice = pd.DatetimeIndex(dias.astype('datetime64[D]'), name='Date').tz_localize('America/New_York')
+        df = pd.DataFrame({'Open': cierres, 'High': cierres, 'Low': cierres, 'Close': cierres, 'Volume': 0},
+                          index=indice)
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start, tz='America/New_York')]
+        return df
+
+    @property
+    def info(self):
+        self._contar('info')
+        time.sleep(self.latencia_info)
+        return obtener_info_falso(self.ticker)
+
+
+@contextmanager
+def instalar(latencia_historia=0.0, latencia_info=0.0, anios=30):
+    """Sustituye ``yfinance.Ticker`` (o crea un módulo ``yfinance`` mínimo si no está instalado)."""
+    try:
+        import yfinance as modulo
+    except ImportError:
+        modulo = sys.modules['yfinance'] = types.ModuleType('yfinance')
+    original = getattr(modulo, 'Ticker', None)
+    TickerFalso.latencia_historia = latencia_historia
+    TickerFalso.latencia_info = latencia_info
+    TickerFalso.anios = anios
+    TickerFalso.llamadas.clear()
+    modulo.Ticker = TickerFalso
+    try:
+        yield TickerFalso
+    finally:
+        if original is None:
+            del modulo.Ticker
+        else:
+            modulo.Ticker = original
@@ -0,0 +1 @@
+"""Capa de datos de Dad Analysis App: ingesta, almacenamiento y consultas."""
@@ -0,0 +1,186 @@
+"""Línea de comandos: ``python -m dadanalysis sync [--forzar] [--proveedor falso] ...``."""
+import argparse
+import json
+from datetime import datetime
+
+from . import almacen, compuestos, derivadas, divisas, intradia, universo
+from .columnar import AlmacenColumnar
+from .consultas import incrementar_version_datos
+from .info_tickers import OBTENEDORES, CacheInfo
+from .proveedores import PROVEEDORES, crear_proveedor
+from .sincronizacion import TAMANO_LOTE, esta_al_dia, inicializar_tabla, sincronizar
+
+
+def comando_sync(args):
+    with almacen.abrir(args.db) as conexion:
+        if not args.forzar and esta_al_dia(conexion):
+            print("✅ La base de datos ya está al día")
+            return
+        proveedor = crear_proveedor(args.proveedor, max_workers=args.workers,
+                                    llamadas_por_segundo=args.llamadas_por_segundo, reintentos=args.reintentos)
+        cache_info = CacheInfo(args.db, obtener=OBTENEDORES[args.proveedor])
+        resumen = sincronizar(conexion, universo.cargar(conexion), proveedor, tamano_lote=args.lote,
+                              presupuesto=args.presupuesto, ignorar_backoff=args.reintentar_fallidos,
+                              cache_info=cache_info)
+        if args.columnar:
+            resumen['columnar'] = len(AlmacenColumnar(args.db).actualizar(conexion))
+    print(json.dumps(resumen, ensure_ascii=False))
+
+
+def comando_estado(args):
+    with almacen.abrir(args.db) as conexion:
+        inicializar_tabla(conexion)
+        filas = conexion.execute('''SELECT s.ticker, e.errores, e.ultimo_error, e.ultimo_exito, e.proximo_intento
+                                    FROM sync_status e JOIN series s ON s.ticker_id = e.ticker_id
+                                    WHERE e.errores > 0 ORDER BY e.errores DESC, s.ticker''').fetchall()
+
+    def instante(segundos):
+        return datetime.fromtimestamp(segundos).isoformat(timespec='seconds') if segundos else None
+
+    for ticker, errores, error, exito, proximo in filas:
+        print(json.dumps({'ticker': ticker, 'errores': errores, 'ultimo_error': error,
+                          'ultimo_exito': instante(exito), 'proximo_intento': instante(proximo)}, ensure_ascii=False))
+
+
+def comando_derivadas(args):
+    with almacen.abrir(args.db) as conexion:
+        if args.reconstruir:
+            filas = derivadas.reconstruir(conexion)
+        else:
+            filas = derivadas.actualizar(conexion)
+    print(json.dumps({'filas': filas}))
+
+
+def comando_compuestos(args):
+    with almacen.abrir(args.db) as conexion:
+        if args.reconstruir:
+            cambiados = compuestos.reconstruir(conexion, universo.cargar(conexion))
+        else:
+            cambiados = compuestos.actualizar(conexion, universo.cargar(conexion))
+        filas = derivadas.actualizar(conexion, ticker_ids=list(cambiados), desde_dia_por_ticker=cambiados)
+        if cambiados:
+            incrementar_version_datos(conexion)
+    print(json.dumps({'compuestos': len(cambiados), 'filas_derivadas': filas}))
+
+
+def comando_divisas(args):
+    with almacen.abrir(args.db) as conexion:
+        if args.reconstruir:
+            convertidas = divisas.reconstruir(conexion, universo.cargar(conexion), bases=args.bases)
+        else:
+            convertidas = divisas.actualizar(conexion, universo.cargar(conexion), bases=args.bases)
+        filas = derivadas.actualizar(conexion, ticker_ids=list(convertidas), desde_dia_por_ticker=convertidas)
+        if convertidas:
+            incrementar_version_datos(conexion)
+    print(json.dumps({'convertidas': len(convertidas), 'filas_derivadas': filas}))
+
+
+def comando_intradia(args):
+    with almacen.abrir(args.db) as conexion:
+        if args.solo_compactar:
+            intradia.inicializar_tabla(conexion)
+            resumen = {'barras': 0, 'series': 0, 'borradas': intradia.compactar(conexion)}
+        else:
+            df = universo.cargar(conexion)
+            if args.tickers:
+                df = df[df['ticker'].isin(args.tickers) | df['nombreTicker'].isin(args.tickers)]
+            elif args.tipo != 'todos':
+                df = df[df['tipo'] == args.tipo]
+            proveedor = crear_proveedor(args.proveedor, max_workers=args.workers, reintentos=args.reintentos)
+            errores = {}
+            resumen = intradia.ingerir(conexion, proveedor, df, args.intervalo, errores=errores)
+            resumen['errores'] = len(errores)
+        if resumen['barras'] or resumen['borradas']:
+            incrementar_version_datos(conexion)
+    print(json.dumps(resumen, ensure_ascii=False))
+
+
+def comando_servir(args):
+    from .servidor import servir
+    servir(args.host, args.puerto, args.db)
+
+
+def comando_componentes(args):
+    with almacen.abrir(args.db) as conexion:
+        if args.borrar:
+            n = universo.borrar_componentes(conexion, args.indice)
+        elif args.fichero:
+            n = universo.importar_componentes(conexion, args.indice, universo.leer_componentes(args.fichero, args.sufijo))
+        else:
+            n = None
+        df = universo.cargar(conexion)
+    total = int(df['indices'].str.split(',').apply(lambda indices: args.indice in indices).sum())
+    print(json.dumps({'indice': args.indice, 'cambiados': n, 'componentes': total, 'universo': len(df)}, ensure_ascii=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m dadanalysis')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    sync = subparsers.add_parser('sync', help='Descarga los cierres que falten en la base de datos')
+    sync.add_argument('--db', default=almacen.RUTA_DB)
+    sync.add_argument('--proveedor', choices=sorted(PROVEEDORES), default='yfinance')
+    sync.add_argument('--workers', type=int, default=8, help='Descargas en paralelo dentro de cada lote')
+    sync.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Tickers por lote (cada lote se guarda al terminar)')
+    sync.add_argument('--llamadas-por-segundo', type=float, default=None)
+    sync.add_argument('--forzar', action='store_true', help='Sincroniza aunque hoy ya se haya hecho')
+    sync.add_argument('--presupuesto', type=float, default=None,
+                      help='Segundos de reloj como mucho; lo pendiente se reanuda en la siguiente sincronización')
+    sync.add_argument('--reintentos', type=int, default=2, help='Reintentos de cada descarga fallida (con backoff)')
+    sync.add_argument('--reintentar-fallidos', action='store_true',
+                      help='Pide también los tickers que están esperando su próximo intento')
+    sync.add_argument('--columnar', action='store_true', help='Actualiza también la caché columnar (.cols)')
+    sync.set_defaults(funcion=comando_sync)
+
+    estado = subparsers.add_parser('estado', help='Tickers con errores de sincronización y su próximo intento')
+    estado.add_argument('--db', default=almacen.RUTA_DB)
+    estado.set_defaults(funcion=comando_estado)
+
+    metricas = subparsers.add_parser('derivadas', help='Actualiza las métricas derivadas (rendimientos, volatilidad, medias, drawdown)')
+    metricas.add_argument('--db', default=almacen.RUTA_DB)
+    metricas.add_argument('--reconstruir', action='store_true', help='Borra y recalcula todas las métricas desde cero')
+    metricas.set_defaults(funcion=comando_derivadas)
+
+    indices = subparsers.add_parser('compuestos', help='Actualiza los índices compuestos de bancos por país y región')
+    indices.add_argument('--db', default=almacen.RUTA_DB)
+    indices.add_argument('--reconstruir', action='store_true', help='Recalcula los compuestos desde el principio')
+    indices.set_defaults(funcion=comando_compuestos)
+
+    conversion = subparsers.add_parser('divisas', help='Actualiza las series convertidas a las divisas base')
+    conversion.add_argument('--db', default=almacen.RUTA_DB)
+    conversion.add_argument('--bases', nargs='+', default=list(divisas.BASES), help='Divisas a las que convertir')
+    conversion.add_argument('--reconstruir', action='store_true', help='Recalcula las conversiones desde el principio')
+    conversion.set_defaults(funcion=comando_divisas)
+
+    miembros = subparsers.add_parser('componentes', help='Importa (o borra) los componentes de un índice desde un CSV')
+    miembros.add_argument('indice', help='Nombre del índice, p. ej. SyP_500')
+    miembros.add_argument('fichero', nargs='?', help='CSV con una columna ticker/symbol y, opcional, el nombre')
+    miembros.add_argument('--sufijo', default='', help='Sufijo de Yahoo para los tickers que no lo lleven, p. ej. .MC')
+    miembros.add_argument('--borrar', action='store_true', help='Quita el índice del universo')
+    miembros.add_argument('--db', default=almacen.RUTA_DB)
+    miembros.set_defaults(funcion=comando_componentes)
+
+    barras = subparsers.add_parser('intradia', help='Descarga barras intradía (1m, 5m, 1h) y aplica la retención')
+    barras.add_argument('--db', default=almacen.RUTA_DB)
+    barras.add_argument('--intervalo', choices=list(intradia.INTERVALOS), default='5m')
+    barras.add_argument('--tipo', choices=['banco', 'indice', 'divisa', 'componente', 'todos'], default='banco',
+                        help='Series del universo a descargar')
+    barras.add_argument('--tickers', nargs='+', help='Tickers o nombres concretos (en lugar de --tipo)')
+    barras.add_argument('--proveedor', choices=sorted(PROVEEDORES), default='yfinance')
+    barras.add_argument('--workers', type=int, default=8)
+    barras.add_argument('--reintentos', type=int, default=2)
+    barras.add_argument('--solo-compactar', action='store_true', help='Solo aplica la retención, sin descargar')
+    barras.set_defaults(funcion=comando_intradia)
+
+    api = subparsers.add_parser('servir', help='API HTTP local de solo lectura (JSON o Arrow) sobre la base de datos')
+    api.add_argument('--db', default=almacen.RUTA_DB)
+    api.add_argument('--host', default='127.0.0.1')
+    api.add_argument('--puerto', type=int, default=8765)
+    api.set_defaults(funcion=comando_servir)
+
+    args = parser.parse_args(argv)
+    args.funcion(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""Almacén de cotizaciones en SQLite.
+
+Todas las series comparten una única tabla larga ``prices(ticker_id, fecha, close)`` con
+clave ``(ticker_id, fecha)`` y sin rowid. Las fechas se guardan como número de días desde
+1970-01-01, y el catálogo ``series`` asigna un ``ticker_id`` entero a cada ticker.
+
+Junto a los cierres diarios se mantienen los agregados ``prices_semanal`` y
+``prices_mensual`` (último cierre de cada semana / mes), que sirven para dibujar
+historias largas sin leer decenas de miles de filas.
+
+``reescrituras`` anota cada vez que cambian o se borran cierres ya guardados de una serie
+(revisiones del proveedor, cierres de media sesión corregidos, compuestos y conversiones
+recalculados), con el primer día que cambia, para que las cachés derivadas de ``prices``
+(la columnar) sepan desde dónde rehacer cada serie. Volver a escribir los mismos valores
+no cuenta.
+"""
+import math
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from . import diagnostico
+
+RUTA_DB = 'macroeconomic_data.db'
+
+# PRAGMA user_version: 0 = esquema antiguo (una tabla por ticker), 1 = tabla larga ``prices``,
+# 2 = agregados semanales y mensuales
+VERSION_ESQUEMA = 2
+
+TABLAS_FRECUENCIA = {'D': 'prices', 'W': 'prices_semanal', 'M': 'prices_mensual'}
+
+# Número de periodo a partir del día. Las semanas empiezan en lunes (1970-01-01 fue jueves);
+# el desplazamiento evita que la división entera de SQLite trunque hacia cero en fechas
+# anteriores a 1970.
+PERIODOS_SQL = {
+    'W': '((fecha + 3 + 700000) / 7) - 100000',
+    'M': "CAST(strftime('%Y', fecha * 86400, 'unixepoch') AS INTEGER) * 12"
+         " + CAST(strftime('%m', fecha * 86400, 'unixepoch') AS INTEGER) - 1",
+}
+
+EPOCH = date(1970, 1, 1)
+# julianday('1970-01-01'): permite convertir las fechas de texto en SQL durante la migración
+JULIANO_EPOCH = 2440587.5
+
+# Diferencia relativa por debajo de la cual un cierre reescrito es el mismo (ruido de coma flotante)
+TOLERANCIA_CIERRE = 1e-12
+
+
+def fecha_a_dia(fecha):
+    """Convierte una fecha (``date``, ``datetime``, ``Timestamp`` o texto ISO) en días desde 1970-01-01."""
+    return int(pd.Timestamp(fecha).to_datetime64().astype('datetime64[D]').astype(np.int64))
+
+
+def dia_a_fecha(dia):
+    return EPOCH + timedelta(days=int(dia))
+
+
+def dias_a_fechas(dias):
+    """Versión vectorizada de ``dia_a_fecha``: array de enteros -> ``DatetimeIndex``."""
+    return pd.DatetimeIndex(np.asarray(dias, dtype=np.int64).astype('datetime64[D]'))
+
+
+def fechas_a_dias(fechas):
+    """Array de fechas (cualquier formato que entienda pandas) -> array ``int64`` de días."""
+    return pd.to_datetime(fechas).values.astype('datetime64[D]').astype(np.int64)
+
+
+def conectar(ruta=RUTA_DB, **opciones):
+    """Conexión suelta (CLI, scripts). Dentro de la app se usa el pool de ``dadanalysis.conexiones``."""
+    from .conexiones import aplicar_pragmas
+    opciones.setdefault('timeout', 10)
+    opciones.setdefault('check_same_thread', False)
+    conexion = sqlite3.connect(ruta, **opciones)
+    aplicar_pragmas(conexion)
+    inicializar_esquema(conexion)
+    return conexion
+
+
+@contextmanager
+def abrir(ruta=RUTA_DB, **opciones):
+    """Como ``conectar`` pero en un ``with``: confirma al salir (o deshace si hay error) y cierra."""
+    conexion = conectar(ruta, **opciones)
+    try:
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def inicializar_esquema(conexion):
+    cursor = conexion.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS series (
+                          ticker_id INTEGER PRIMARY KEY,
+                          ticker TEXT NOT NULL UNIQUE,
+                          nombreTicker TEXT NOT NULL)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS prices (
+                          ticker_id INTEGER NOT NULL,
+                          fecha INTEGER NOT NULL,
+                          close REAL,
+                          PRIMARY KEY (ticker_id, fecha)) WITHOUT ROWID''')
+    for frecuencia in ('W', 'M'):
+        cursor.execute(f'''CREATE TABLE IF NOT EXISTS {TABLAS_FRECUENCIA[frecuencia]} (
+                              ticker_id INTEGER NOT NULL,
+                              periodo INTEGER NOT NULL,
+                              fecha INTEGER NOT NULL,
+                              close REAL,
+                              PRIMARY KEY (ticker_id, periodo)) WITHOUT ROWID''')
+    cursor.execute('CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS reescrituras (
+                          ticker_id INTEGER PRIMARY KEY,
+                          numero INTEGER NOT NULL,
+                          desde_dia INTEGER NOT NULL)''')
+
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    if version < 1:
+        migrar_tablas_por_ticker(conexion)
+    if version < 2:
+        actualizar_agregados(conexion)
+    if version < VERSION_ESQUEMA:
+        cursor.execute(f'PRAGMA user_version = {VERSION_ESQUEMA}')
+    conexion.commit()
+
+
+def migrar_tablas_por_ticker(conexion):
+    """Vuelca las antiguas tablas ``{nombreTicker}(fecha DATE, close REAL)`` en ``prices`` y las borra.
+
+    El catálogo antiguo ``tickers(ticker, nombreTicker)`` indica qué tablas migrar; si no
+    existe (base de datos nueva) no hay nada que hacer.
+    """
+    cursor = conexion.cursor()
+    existe = cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='tickers'").fetchone()
+    if not existe:
+        return
+
+    tablas = {fila[0] for fila in cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    antiguos = cursor.execute('SELECT ticker, nombreTicker FROM tickers').fetchall()
+    for ticker, nombre in antiguos:
+        ticker_id = registrar_serie(conexion, ticker, nombre)
+        if nombre not in tablas:
+            continue
+        cursor.execute(f'''INSERT OR REPLACE INTO prices (ticker_id, fecha, close)
+                           SELECT ?, CAST(julianday(fecha) - {JULIANO_EPOCH} AS INTEGER), close
+                           FROM "{nombre}" WHERE fecha IS NOT NULL AND close IS NOT NULL''', (ticker_id,))
+        cursor.execute(f'DROP TABLE "{nombre}"')
+    cursor.execute('DROP TABLE tickers')
+
+
+def actualizar_agregados(conexion, ticker_id=None, desde_dia=None):
+    """Recalcula el último cierre por semana y mes de ``ticker_id`` (o de todos) a partir de ``desde_dia``.
+
+    Basta con mirar las filas nuevas: el último cierre de un periodo siempre está entre ellas
+    si el periodo ha recibido alguna, así que la actualización incremental es O(filas nuevas).
+    """
+    condiciones, parametros = ['close IS NOT NULL'], []
+    if ticker_id is not None:
+        condiciones.append('ticker_id = ?')
+        parametros.append(ticker_id)
+    if desde_dia is not None:
+        condiciones.append('fecha >= ?')
+        parametros.append(int(desde_dia))
+    for frecuencia in ('W', 'M'):
+        # Con un único MAX(), SQLite devuelve el close de la fila con la fecha máxima
+        conexion.execute(f'''INSERT OR REPLACE INTO {TABLAS_FRECUENCIA[frecuencia]} (ticker_id, periodo, fecha, close)
+                             SELECT ticker_id, {PERIODOS_SQL[frecuencia]} AS periodo, MAX(fecha), close FROM prices
+                             WHERE {' AND '.join(condiciones)}
+                             GROUP BY ticker_id, periodo''', parametros)
+
+
+def leer_meta(conexion, clave, defecto=None):
+    fila = conexion.execute('SELECT valor FROM meta WHERE clave = ?', (clave,)).fetchone()
+    return fila[0] if fila else defecto
+
+
+def escribir_meta(conexion, clave, valor):
+    conexion.execute('INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)', (clave, str(valor)))
+
+
+def registrar_serie(conexion, ticker, nombre):
+    """Da de alta (o renombra) una serie en el catálogo y devuelve su ``ticker_id``."""
+    cursor = conexion.cursor()
+    cursor.execute('''INSERT INTO series (ticker, nombreTicker) VALUES (?, ?)
+                      ON CONFLICT(ticker) DO UPDATE SET nombreTicker = excluded.nombreTicker''', (ticker, nombre))
+    return cursor.execute('SELECT ticker_id FROM series WHERE ticker = ?', (ticker,)).fetchone()[0]
+
+
+def registrar_tickers(conexion, df_tickers):
+    """Registra todas las filas ``ticker``/``nombreTicker`` y devuelve ``{ticker: ticker_id}``."""
+    return {ticker: registrar_serie(conexion, ticker, nombre)
+            for ticker, nombre in zip(df_tickers['ticker'], df_tickers['nombreTicker'])}
+
+
+def ultimas_fechas(conexion):
+    """``{ticker: date}`` con la última fecha guardada de cada serie, en una sola consulta."""
+    filas = conexion.execute('''SELECT s.ticker, MAX(p.fecha) FROM prices p
+                                JOIN series s ON s.ticker_id = p.ticker_id
+                                GROUP BY p.ticker_id''').fetchall()
+    return {ticker: dia_a_fecha(dia) for ticker, dia in filas}
+
+
+def primeras_fechas(conexion):
+    """``{nombreTicker: date}`` con la primera fecha guardada de cada serie."""
+    filas = conexion.execute('''SELECT s.nombreTicker, MIN(p.fecha) FROM prices p
+                                JOIN series s ON s.ticker_id = p.ticker_id
+                                GROUP BY p.ticker_id''').fetchall()
+    return {nombre: dia_a_fecha(dia) for nombre, dia in filas}
+
+
+def anotar_reescritura(conexion, ticker_id, desde_dia):
+    """Anota que han cambiado cierres ya guardados de ``ticker_id`` a partir de ``desde_dia``."""
+    conexion.execute('''INSERT INTO reescrituras (ticker_id, numero, desde_dia) VALUES (?, 1, ?)
+                        ON CONFLICT(ticker_id) DO UPDATE SET numero = numero + 1, desde_dia = excluded.desde_dia''',
+                     (ticker_id, int(desde_dia)))
+
+
+def reescrituras(conexion):
+    """``{ticker_id: (número de reescrituras, primer día de la última)}`` (vale con conexiones de solo lectura)."""
+    if not conexion.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reescrituras'").fetchone():
+        return {}
+    return {ticker_id: (numero, desde_dia)
+            for ticker_id, numero, desde_dia in conexion.execute('SELECT ticker_id, numero, desde_dia FROM reescrituras')}
+
+
+def _primer_cambio(conexion, ticker_id, dias, cierres, desde_dia, hasta_dia, borrando=False):
+    """Primer día guardado de ``[desde_dia, hasta_dia]`` que cambia al escribir ``dias``/``cierres`` (None si ninguno).
+
+    Cuentan los cierres distintos (más allá de ``TOLERANCIA_CIERRE``) y los días nuevos
+    intercalados; con ``borrando``, también los días guardados que no están en ``dias``. Lo
+    posterior al último día guardado se añade al final y no es un cambio.
+    """
+    ultimo = conexion.execute('SELECT MAX(fecha) FROM prices WHERE ticker_id = ?', (ticker_id,)).fetchone()[0]
+    if ultimo is None or desde_dia > ultimo:
+        return None
+    hasta_dia = min(int(hasta_dia), ultimo)
+    guardados = dict(conexion.execute('SELECT fecha, close FROM prices WHERE ticker_id = ? AND fecha BETWEEN ? AND ?',
+                                      (ticker_id, int(desde_dia), hasta_dia)))
+    nuevos = {d: c for d, c in zip(dias.tolist(), cierres.tolist()) if desde_dia <= d <= hasta_dia}
+    cambios = [d for d, c in nuevos.items()
+               if guardados.get(d) is None or not math.isclose(guardados[d], c, rel_tol=TOLERANCIA_CIERRE)]
+    if borrando:
+        cambios += [d for d in guardados if d not in nuevos]
+    return min(cambios, default=None)
+
+
+def guardar_precios(conexion, ticker_id, datos):
+    """Inserta (o reemplaza) las filas ``Date``/``Close`` de ``datos``. Devuelve el número de filas escritas."""
+    datos = datos.dropna(subset=['Close'])
+    if datos.empty:
+        return 0
+    dias = fechas_a_dias(datos['Date'])
+    cierres = datos['Close'].to_numpy(dtype=np.float64)
+    cambio = _primer_cambio(conexion, ticker_id, dias, cierres, int(dias.min()), int(dias.max()))
+    if cambio is not None:
+        anotar_reescritura(conexion, ticker_id, cambio)
+    filas = zip([ticker_id] * len(dias), dias.tolist(), cierres.tolist())
+    conexion.executemany('INSERT OR REPLACE INTO prices (ticker_id, fecha, close) VALUES (?, ?, ?)', filas)
+    actualizar_agregados(conexion, ticker_id, dias.min())
+    diagnostico.contar('db.filas_escritas', len(dias))
+    return len(dias)
+
+
+def reescribir_precios(conexion, ticker_id, datos, desde_dia):
+    """Sustituye los cierres de ``ticker_id`` entre ``desde_dia`` y el último día de ``datos`` por los de ``datos``.
+
+    Los días guardados que ya no están en ``datos`` se borran. Devuelve el número de filas escritas.
+    """
+    datos = datos.dropna(subset=['Close'])
+    dias = fechas_a_dias(datos['Date'])
+    dentro = dias >= desde_dia
+    if not dentro.any():
+        return 0
+    hasta_dia = int(dias.max())
+    cambio = _primer_cambio(conexion, ticker_id, dias, datos['Close'].to_numpy(dtype=np.float64), int(desde_dia), hasta_dia,
+                            borrando=True)
+    if cambio is not None:
+        anotar_reescritura(conexion, ticker_id, cambio)
+    conexion.execute('DELETE FROM prices WHERE ticker_id = ? AND fecha BETWEEN ? AND ?', (ticker_id, int(desde_dia), hasta_dia))
+    filas = zip([ticker_id] * int(dentro.sum()), dias[dentro].tolist(), datos['Close'][dentro].astype(float).tolist())
+    conexion.executemany('INSERT INTO prices (ticker_id, fecha, close) VALUES (?, ?, ?)', filas)
+    # Los agregados de los periodos tocados se rehacen enteros: su último cierre puede haber desaparecido
+    for frecuencia in ('W', 'M'):
+        conexion.execute(f'DELETE FROM {TABLAS_FRECUENCIA[frecuencia]} WHERE ticker_id = ? AND fecha BETWEEN ? AND ?',
+                         (ticker_id, int(desde_dia), hasta_dia))
+    actualizar_agregados(conexion, ticker_id, int(desde_dia) - 31)
+    diagnostico.contar('db.filas_escritas', int(dentro.sum()))
+    return int(dentro.sum())
+
+
+def borrar_precios(conexion, ticker_id):
+    """Borra los cierres de ``ticker_id`` y sus agregados (p. ej. para reconstruir una serie calculada)."""
+    borradas = conexion.execute('DELETE FROM prices WHERE ticker_id = ?', (ticker_id,)).rowcount
+    for frecuencia in ('W', 'M'):
+        conexion.execute(f'DELETE FROM {TABLAS_FRECUENCIA[frecuencia]} WHERE ticker_id = ?', (ticker_id,))
+    if borradas:
+        anotar_reescritura(conexion, ticker_id, np.iinfo(np.int32).min)
+
+
+def cargar_precios(conexion, nombres, desde=None, frecuencia='D', hasta=None):
+    """Carga en una sola consulta las series ``nombres`` (``nombreTicker``) entre las fechas ``desde`` y ``hasta``.
+
+    ``frecuencia`` elige entre los cierres diarios (``D``) y los agregados semanales (``W``) o mensuales (``M``).
+
+    Devuelve un DataFrame largo ``nombreTicker, fecha (datetime64), close`` ordenado por serie y fecha.
+    """
+    nombres = list(nombres)
+    if not nombres:
+        return pd.DataFrame({'nombreTicker': [], 'fecha': pd.DatetimeIndex([]), 'close': []})
+    marcadores = ','.join('?' * len(nombres))
+    desde_dia = fecha_a_dia(desde) if desde is not None else np.iinfo(np.int32).min
+    hasta_dia = fecha_a_dia(hasta) if hasta is not None else np.iinfo(np.int32).max
+    with diagnostico.tramo('db.cargar_precios', series=len(nombres), frecuencia=frecuencia):
+        filas = conexion.execute(f'''SELECT s.nombreTicker, p.fecha, p.close FROM {TABLAS_FRECUENCIA[frecuencia]} p
+                                     JOIN series s ON s.ticker_id = p.ticker_id
+                                     WHERE s.nombreTicker IN ({marcadores}) AND p.fecha BETWEEN ? AND ?
+                                     ORDER BY p.ticker_id, p.fecha''', (*nombres, desde_dia, hasta_dia)).fetchall()
+    diagnostico.contar('db.filas_leidas', len(filas))
+    df = pd.DataFrame(filas, columns=['nombreTicker', 'fecha', 'close'])
+    df['fecha'] = dias_a_fechas(df['fecha'].to_numpy(dtype=np.int64))
+    return df
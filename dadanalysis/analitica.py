@@ -0,0 +1,159 @@
+"""Motor de analítica cruzada para "📊 Estudio Índices".
+
+Todo se calcula sobre una única matriz de precios alineada por calendario (filas = días,
+columnas = series). Cada mercado tiene sus festivos, así que la matriz usa la unión de
+todas las fechas y rellena hacia delante los huecos de cada serie; antes del primer dato
+de una serie hay NaN. Las métricas son operaciones NumPy sobre la matriz completa, sin
+bucles por ticker.
+"""
+import numpy as np
+import pandas as pd
+
+from . import almacen, diagnostico
+
+DIAS_HABILES_ANIO = 252
+
+
+def cargar_matriz(conexion, nombres, desde=None, columnar=None):
+    """DataFrame ``fecha x nombreTicker`` con los cierres alineados y los festivos rellenados.
+
+    Con ``columnar`` se leen las vistas mapeadas en memoria; si no, una única consulta a SQLite.
+    """
+    nombres = list(nombres)
+    desde_dia = almacen.fecha_a_dia(desde) if desde is not None else None
+
+    if columnar is not None:
+        ids = columnar.ids_por_nombre()
+        trozos = [columnar.serie(ids[n], desde_dia) if n in ids else (np.empty(0, np.int32), np.empty(0)) for n in nombres]
+        columnas = np.concatenate([np.full(len(d), i, dtype=np.int64) for i, (d, _) in enumerate(trozos)])
+        dias = np.concatenate([d for d, _ in trozos]).astype(np.int64)
+        cierres = np.concatenate([c for _, c in trozos])
+    else:
+        ids = dict(conexion.execute('SELECT nombreTicker, ticker_id FROM series'))
+        posicion = {ids[n]: i for i, n in enumerate(nombres) if n in ids}
+        marcadores = ','.join('?' * len(posicion))
+        with diagnostico.tramo('db.cargar_matriz', series=len(posicion)):
+            filas = conexion.execute(f'''SELECT ticker_id, fecha, close FROM prices
+                                         WHERE ticker_id IN ({marcadores}) AND fecha >= ? AND close IS NOT NULL''',
+                                     (*posicion, desde_dia if desde_dia is not None else np.iinfo(np.int32).min)).fetchall()
+        diagnostico.contar('db.filas_leidas', len(filas))
+        datos = np.array(filas, dtype=np.float64).reshape(-1, 3)
+        traduccion = np.zeros(max(posicion, default=0) + 1, dtype=np.int64)
+        traduccion[list(posicion)] = list(posicion.values())
+        columnas = traduccion[datos[:, 0].astype(np.int64)]
+        dias = datos[:, 1].astype(np.int64)
+        cierres = datos[:, 2]
+
+    calendario, filas_idx = np.unique(dias, return_inverse=True)
+    matriz = np.full((len(calendario), len(nombres)), np.nan)
+    matriz[filas_idx, columnas] = cierres
+    return pd.DataFrame(rellenar_adelante(matriz), index=almacen.dias_a_fechas(calendario), columns=nombres)
+
+
+def rellenar_adelante(matriz):
+    """Forward-fill por columnas en NumPy puro (los NaN iniciales se mantienen)."""
+    validos = ~np.isnan(matriz)
+    indices = np.where(validos, np.arange(len(matriz))[:, None], 0)
+    np.maximum.accumulate(indices, axis=0, out=indices)
+    rellena = matriz[indices, np.arange(matriz.shape[1])]
+    rellena[~np.maximum.accumulate(validos, axis=0)] = np.nan
+    return rellena
+
+
+def rendimientos_log(precios):
+    """Rendimientos logarítmicos diarios; la primera fila es NaN."""
+    precios = np.asarray(precios, dtype=np.float64)
+    r = np.full_like(precios, np.nan)
+    r[1:] = np.diff(np.log(precios), axis=0)
+    return r
+
+
+def volatilidad_movil(rendimientos, ventana, anualizar=True):
+    """Desviación típica móvil de ``ventana`` días por columna con sumas acumuladas (O(n) por serie)."""
+    r = np.asarray(rendimientos, dtype=np.float64)
+    validos = ~np.isnan(r)
+    x = np.where(validos, r, 0.0)
+    ceros = np.zeros((1, r.shape[1]))
+    s1 = np.vstack([ceros, np.cumsum(x, axis=0)])
+    s2 = np.vstack([ceros, np.cumsum(x * x, axis=0)])
+    n = np.vstack([ceros, np.cumsum(validos, axis=0)])
+
+    vol = np.full_like(r, np.nan)
+    if len(r) < ventana:
+        return vol
+    suma = s1[ventana:] - s1[:-ventana]
+    suma2 = s2[ventana:] - s2[:-ventana]
+    cuenta = n[ventana:] - n[:-ventana]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        varianza = (suma2 - suma * suma / cuenta) / (cuenta - 1)
+    varianza[cuenta < ventana] = np.nan
+    vol[ventana - 1:] = np.sqrt(np.clip(varianza, 0, None))
+    return vol * np.sqrt(DIAS_HABILES_ANIO) if anualizar else vol
+
+
+def drawdown(precios):
+    """Caída desde el máximo previo (0 = en máximos, -0.3 = 30 % por debajo)."""
+    precios = np.asarray(precios, dtype=np.float64)
+    maximos = np.fmax.accumulate(precios, axis=0)
+    return precios / maximos - 1
+
+
+def betas(rendimientos, rendimientos_referencia):
+    """Beta de cada columna frente a la referencia, usando solo los días en que ambas tienen dato."""
+    r = np.asarray(rendimientos, dtype=np.float64)
+    ref = np.asarray(rendimientos_referencia, dtype=np.float64)[:, None]
+    validos = ~np.isnan(r) & ~np.isnan(ref)
+    n = validos.sum(axis=0)
+    x = np.where(validos, r, 0.0)
+    y = np.where(validos, ref, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media_x = x.sum(axis=0) / n
+        media_y = y.sum(axis=0) / n
+        cov = (x * y).sum(axis=0) / n - media_x * media_y
+        var = (y * y).sum(axis=0) / n - media_y * media_y
+        return cov / var
+
+
+def correlaciones(rendimientos):
+    """Matriz de correlación por pares con los días comunes de cada par, en unas pocas multiplicaciones de matrices."""
+    r = np.asarray(rendimientos, dtype=np.float64)
+    m = (~np.isnan(r)).astype(np.float64)
+    x = np.where(m > 0, r, 0.0)
+    n = m.T @ m
+    sx = x.T @ m            # sx[i, j] = suma de x_i en los días comunes a i y j
+    sxx = (x * x).T @ m
+    sxy = x.T @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        numerador = n * sxy - sx * sx.T
+        denominador = np.sqrt((n * sxx - sx * sx) * (n * sxx.T - sx.T * sx.T))
+        corr = numerador / denominador
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+def resumen(matriz, referencia=None, ventana_volatilidad=20):
+    """Tabla por serie: rentabilidad, volatilidad, máximo drawdown y beta frente a ``referencia``."""
+    precios = matriz.to_numpy()
+    r = rendimientos_log(precios)
+
+    validos = ~np.isnan(precios)
+    primera = np.argmax(validos, axis=0)
+    columnas = np.arange(precios.shape[1])
+    inicio = precios[primera, columnas]
+    fin = precios[-1, :]
+    fechas = matriz.index.to_numpy()
+    anios = (fechas[-1] - fechas[primera]) / np.timedelta64(1, 'D') / 365.25
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = fin / inicio - 1
+        anualizada = (fin / inicio) ** (1 / anios) - 1
+    tabla = pd.DataFrame({
+        'Rentabilidad total': total,
+        'Rentabilidad anualizada': anualizada,
+        'Volatilidad anualizada': np.nanstd(r, axis=0, ddof=1) * np.sqrt(DIAS_HABILES_ANIO),
+        f'Volatilidad {ventana_volatilidad}d': volatilidad_movil(r, ventana_volatilidad)[-1, :],
+        'Máximo drawdown': np.nanmin(drawdown(precios), axis=0),
+    }, index=matriz.columns)
+    if referencia is not None and referencia in matriz.columns:
+        tabla[f'Beta vs {referencia}'] = betas(r, r[:, matriz.columns.get_loc(referencia)])
+    return tabla
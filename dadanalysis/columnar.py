@@ -0,0 +1,180 @@
+"""Caché columnar de cierres diarios, mapeada en memoria.
+
+Junto a ``macroeconomic_data.db`` se guarda un directorio ``macroeconomic_data.cols/``
+con dos ficheros binarios contiguos por serie:
+
+* ``{ticker_id}.dias``: fechas como días desde 1970-01-01 (``int32``).
+* ``{ticker_id}.close``: cierres (``float64``).
+
+``manifiesto.json`` guarda cuántas filas válidas tiene cada serie y con qué
+``version_datos`` de la base de datos está al día. Los lectores abren los ficheros con
+``np.memmap`` y reciben vistas NumPy sin copiar ni parsear nada. SQLite sigue siendo la
+fuente de verdad: si el manifiesto va por detrás, ``actualizar`` añade al final las filas
+nuevas. Las series con cierres sobrescritos en SQLite (contador de ``reescrituras`` de
+``almacen``: revisiones, cierres de media sesión, compuestos y conversiones recalculados)
+se rehacen desde el primer día afectado si solo ha habido una reescritura desde la
+última actualización, y enteras si no. Salvo al añadir filas, se escribe un fichero nuevo
+que sustituye al anterior, así que un lector con el fichero mapeado nunca ve una mezcla de
+datos viejos y nuevos. Las series que desaparecen de ``prices`` salen del manifiesto.
+"""
+import json
+import os
+import threading
+from contextlib import suppress
+
+import numpy as np
+
+from . import almacen
+from .consultas import version_datos
+
+TIPO_DIAS = np.int32
+TIPO_CLOSE = np.float64
+
+
+def directorio_por_defecto(ruta_db):
+    return os.path.splitext(ruta_db)[0] + '.cols'
+
+
+class AlmacenColumnar:
+
+    def __init__(self, ruta_db=almacen.RUTA_DB, directorio=None):
+        self.ruta_db = ruta_db
+        self.directorio = directorio or directorio_por_defecto(ruta_db)
+        self._lock = threading.Lock()
+        self._manifiesto = None
+        self._mapas = {}
+
+    # ----------------------------------------------------------------------------- manifiesto
+
+    @property
+    def _ruta_manifiesto(self):
+        return os.path.join(self.directorio, 'manifiesto.json')
+
+    def manifiesto(self):
+        if self._manifiesto is None:
+            try:
+                with open(self._ruta_manifiesto, encoding='utf-8') as f:
+                    self._manifiesto = json.load(f)
+            except FileNotFoundError:
+                self._manifiesto = {'version_datos': None, 'series': {}}
+        return self._manifiesto
+
+    def _guardar_manifiesto(self):
+        temporal = self._ruta_manifiesto + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self._manifiesto, f)
+        os.replace(temporal, self._ruta_manifiesto)
+
+    @property
+    def version(self):
+        return self.manifiesto()['version_datos']
+
+    def _ruta(self, ticker_id, columna):
+        return os.path.join(self.directorio, f'{ticker_id}.{columna}')
+
+    # ----------------------------------------------------------------------------- escritura
+
+    def actualizar(self, conexion):
+        """Pone los ficheros al día con SQLite. Devuelve los ``ticker_id`` reescritos o ampliados."""
+        with self._lock:
+            os.makedirs(self.directorio, exist_ok=True)
+            # Se relee de disco por si otro proceso (p. ej. el CLI) ha actualizado los ficheros
+            self._manifiesto = None
+            self._mapas.clear()
+            manifiesto = self.manifiesto()
+            version = version_datos(conexion)
+            estado = conexion.execute('''SELECT p.ticker_id, s.nombreTicker, COUNT(*), MAX(p.fecha) FROM prices p
+                                         JOIN series s ON s.ticker_id = p.ticker_id
+                                         GROUP BY p.ticker_id''').fetchall()
+            reescritas = almacen.reescrituras(conexion)
+            cambiados = []
+            for ticker_id, nombre, filas, ultima in estado:
+                actual = manifiesto['series'].get(str(ticker_id))
+                numero, desde_dia = reescritas.get(ticker_id, (0, None))
+                anterior = actual.get('reescritura') if actual else None
+                entrada = {'nombre': nombre, 'filas': filas, 'ultima': ultima, 'reescritura': numero}
+                desde_fila = 0
+                if anterior == numero:
+                    if actual['filas'] == filas and actual['ultima'] == ultima:
+                        continue
+                    desde_fila, primer_dia = actual['filas'], actual['ultima'] + 1
+                elif anterior is not None and anterior + 1 == numero and actual['filas']:
+                    # Una sola reescritura desde la última vez: se rehace desde su primer día
+                    dias = np.memmap(self._ruta(ticker_id, 'dias'), dtype=TIPO_DIAS, mode='r', shape=(actual['filas'],))
+                    desde_fila, primer_dia = int(np.searchsorted(dias, desde_dia)), desde_dia
+                    del dias
+                if desde_fila:
+                    nuevas = conexion.execute('SELECT fecha, close FROM prices WHERE ticker_id = ? AND fecha >= ? ORDER BY fecha',
+                                              (ticker_id, primer_dia)).fetchall()
+                    # Lo anterior a desde_fila no ha cambiado si cuadran las cuentas
+                    if desde_fila + len(nuevas) == filas:
+                        self._escribir(ticker_id, nuevas, desde_fila=desde_fila, anadir=desde_fila == actual['filas'])
+                        manifiesto['series'][str(ticker_id)] = entrada
+                        cambiados.append(ticker_id)
+                        continue
+                todas = conexion.execute('SELECT fecha, close FROM prices WHERE ticker_id = ? ORDER BY fecha',
+                                         (ticker_id,)).fetchall()
+                self._escribir(ticker_id, todas)
+                manifiesto['series'][str(ticker_id)] = dict(entrada, filas=len(todas))
+                cambiados.append(ticker_id)
+
+            # Series que ya no están en prices
+            vigentes = {str(fila[0]) for fila in estado}
+            for clave in [clave for clave in manifiesto['series'] if clave not in vigentes]:
+                del manifiesto['series'][clave]
+                for columna in ('dias', 'close'):
+                    with suppress(FileNotFoundError):
+                        os.remove(self._ruta(clave, columna))
+
+            manifiesto['version_datos'] = version
+            self._guardar_manifiesto()
+            return cambiados
+
+    def _escribir(self, ticker_id, filas, desde_fila=0, anadir=False):
+        """Escribe ``filas`` desde la fila ``desde_fila`` en adelante, conservando las anteriores.
+
+        Con ``anadir`` (``desde_fila`` = filas actuales) se escribe al final del fichero; si no,
+        se escribe un fichero nuevo y se cambia por el anterior.
+        """
+        datos = np.array(filas, dtype=[('fecha', np.int64), ('close', TIPO_CLOSE)])
+        for columna, valores in (('dias', datos['fecha'].astype(TIPO_DIAS)), ('close', datos['close'])):
+            ruta = self._ruta(ticker_id, columna)
+            if anadir:
+                # Se trunca a lo que dice el manifiesto por si una escritura anterior quedó a medias
+                with open(ruta, 'r+b') as f:
+                    f.truncate(desde_fila * valores.itemsize)
+                    f.seek(0, os.SEEK_END)
+                    valores.tofile(f)
+            else:
+                # Reescritura atómica: quien tenga el fichero anterior mapeado sigue viéndolo entero
+                previas = np.fromfile(ruta, dtype=valores.dtype, count=desde_fila) if desde_fila else valores[:0]
+                temporal = ruta + '.tmp'
+                with open(temporal, 'wb') as f:
+                    previas.tofile(f)
+                    valores.tofile(f)
+                os.replace(temporal, ruta)
+
+    # ----------------------------------------------------------------------------- lectura
+
+    def ids_por_nombre(self):
+        return {datos['nombre']: int(ticker_id) for ticker_id, datos in self.manifiesto()['series'].items()}
+
+    def serie(self, ticker_id, desde_dia=None):
+        """``(dias, close)`` de la serie como vistas de solo lectura sobre los ficheros mapeados."""
+        with self._lock:
+            if ticker_id not in self._mapas:
+                datos = self.manifiesto()['series'].get(str(ticker_id))
+                filas = datos['filas'] if datos else 0
+                if not filas:
+                    vacio = (np.empty(0, dtype=TIPO_DIAS), np.empty(0, dtype=TIPO_CLOSE))
+                    self._mapas[ticker_id] = vacio
+                else:
+                    self._mapas[ticker_id] = (
+                        np.memmap(self._ruta(ticker_id, 'dias'), dtype=TIPO_DIAS, mode='r', shape=(filas,)),
+                        np.memmap(self._ruta(ticker_id, 'close'), dtype=TIPO_CLOSE, mode='r', shape=(filas,)),
+                    )
+            dias, close = self._mapas[ticker_id]
+        if desde_dia is not None:
+            inicio = int(np.searchsorted(dias, desde_dia))
+            dias, close = dias[inicio:], close[inicio:]
+        return dias, close
@@ -0,0 +1,220 @@
+"""Índices compuestos de bancos por país y por región, materializados en ``prices``.
+
+Cada compuesto es una serie más del catálogo (``ticker`` ``@pais:España:eq``,
+``nombreTicker`` ``Bancos_España_eq``), así que se lee, se agrega por semana/mes, entra
+en la caché columnar y tiene métricas derivadas como cualquier ticker descargado.
+
+Hay dos ponderaciones:
+
+* ``eq``: equiponderado, rebalanceado cada día (media simple de los rendimientos).
+* ``cap``: por capitalización. El número de acciones de cada banco se estima como
+  ``marketCap / último cierre`` con el ``marketCap`` guardado en ``ticker_info`` (la
+  sincronización lo pide para los bancos de los compuestos) y se mantiene fijo; el peso
+  de cada día es ``acciones x cierre anterior``. Las capitalizaciones se pasan a euros con
+  el último tipo de cambio guardado de la divisa de cotización, para poder sumar bancos de
+  bolsas distintas. Los bancos sin ``marketCap`` conocido toman la capitalización media
+  de los que sí lo tienen.
+
+Los niveles empiezan en ``BASE`` y se calculan sobre el calendario unión de los
+componentes con los huecos rellenados hacia delante. ``compuestos_estado`` guarda el
+último nivel y el último cierre de cada componente, de modo que cada sincronización solo
+calcula los días nuevos. Si llega una corrección de fechas ya procesadas, se retoma desde
+el último día del compuesto anterior a la corrección (su nivel guardado y el último cierre
+de cada componente hasta ese día) y se sobrescribe desde ahí; si cambian los componentes,
+el compuesto se reconstruye entero. Si cambia qué bancos tienen
+capitalización conocida, las acciones se vuelven a estimar y los pesos nuevos se aplican
+desde el siguiente día calculado, sin tocar la historia.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from . import almacen, analitica, divisas
+from .universo import regiones_bancos
+
+BASE = 100.0
+
+PONDERACIONES = {'eq': 'Equiponderado', 'cap': 'Por capitalización'}
+PREFIJOS = {'pais': 'Bancos', 'region': 'Región'}
+
+
+def inicializar_tabla(conexion):
+    conexion.execute('''CREATE TABLE IF NOT EXISTS compuestos_estado (
+                            ticker_id INTEGER PRIMARY KEY,
+                            ultima_fecha INTEGER NOT NULL,
+                            nivel REAL NOT NULL,
+                            componentes TEXT NOT NULL,
+                            capitalizados TEXT NOT NULL,
+                            acciones BLOB,
+                            cierres BLOB NOT NULL)''')
+
+
+def nombre_compuesto(ambito, grupo, ponderacion):
+    return f"{PREFIJOS[ambito]}_{grupo.replace(' ', '_')}_{ponderacion}"
+
+
+def definiciones(df_tickers):
+    """Un compuesto por país y por región y ponderación, a partir de la columna ``pais`` de ``df_tickers``.
+
+    Devuelve un DataFrame ``ticker, nombreTicker, ambito, grupo, ponderacion, componentes``.
+    """
+    if 'pais' not in df_tickers:
+        return pd.DataFrame(columns=['ticker', 'nombreTicker', 'ambito', 'grupo', 'ponderacion', 'componentes'])
+    bancos = df_tickers.dropna(subset=['pais'])
+    por_pais = {pais: list(grupo['nombreTicker']) for pais, grupo in bancos.groupby('pais', sort=False)}
+    grupos = [('pais', pais, nombres) for pais, nombres in por_pais.items()]
+    for region, paises in regiones_bancos.items():
+        nombres = [n for pais in paises for n in por_pais.get(pais, [])]
+        if nombres:
+            grupos.append(('region', region, nombres))
+    return pd.DataFrame([{'ticker': f'@{ambito}:{grupo}:{ponderacion}',
+                          'nombreTicker': nombre_compuesto(ambito, grupo, ponderacion),
+                          'ambito': ambito, 'grupo': grupo, 'ponderacion': ponderacion, 'componentes': nombres}
+                         for ambito, grupo, nombres in grupos for ponderacion in PONDERACIONES])
+
+
+def miembros(df_tickers):
+    """Tickers de los bancos que forman algún compuesto."""
+    if 'pais' not in df_tickers:
+        return []
+    return list(df_tickers.dropna(subset=['pais'])['ticker'])
+
+
+def capitalizaciones(conexion, df_tickers):
+    """``{ticker: marketCap en euros}`` de ``ticker_info`` (vacío si la tabla no existe todavía).
+
+    ``marketCap`` viene en la divisa de cotización (las subdivisiones, como ``GBp``, en su
+    divisa principal). Se descartan las capitalizaciones sin tipo de cambio guardado.
+    """
+    existe = conexion.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='ticker_info'").fetchone()
+    if not existe:
+        return {}
+    filas = conexion.execute("SELECT ticker, valor FROM ticker_info WHERE campo = 'marketCap'").fetchall()
+    caps = {ticker: json.loads(valor) for ticker, valor in filas}
+    explicitas = (dict(zip(df_tickers['ticker'], df_tickers['divisa'])) if 'divisa' in df_tickers else {})
+    divisa_de = {ticker: divisas.principal(explicitas[ticker] if isinstance(explicitas.get(ticker), str)
+                                           else divisas.por_sufijo(ticker))[0] for ticker in caps}
+    tipos = divisas.ultimos_tipos(conexion, set(divisa_de.values()))
+    return {ticker: valor / tipos[divisa_de[ticker]] for ticker, valor in caps.items()
+            if valor and divisa_de[ticker] in tipos}
+
+
+def calcular(matriz, cierres_previos, nivel_previo, acciones=None):
+    """Niveles del compuesto para las filas de ``matriz`` (días x componentes, NaN = sin dato).
+
+    ``cierres_previos`` es el último cierre conocido de cada componente antes de la primera
+    fila (NaN si no hay). Devuelve ``(niveles, últimos cierres)``.
+    """
+    precios = analitica.rellenar_adelante(np.vstack([cierres_previos, matriz]))
+    anteriores, actuales = precios[:-1], precios[1:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = actuales / anteriores - 1
+    validos = ~np.isnan(r)
+    if acciones is None:
+        pesos = validos.astype(np.float64)
+    else:
+        pesos = np.where(validos, acciones * np.nan_to_num(anteriores), 0.0)
+    total = pesos.sum(axis=1)
+    ponderado = (pesos * np.where(validos, r, 0.0)).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rendimiento = np.where(total > 0, ponderado / total, 0.0)
+    return nivel_previo * np.cumprod(1 + rendimiento), precios[-1]
+
+
+def _acciones(conexion, componentes, ids_por_nombre, caps):
+    """Acciones estimadas de cada componente y lista de los que tienen capitalización conocida."""
+    tickers = dict(conexion.execute('SELECT nombreTicker, ticker FROM series'))
+    ultimos = []
+    for nombre in componentes:
+        fila = conexion.execute('SELECT close FROM prices WHERE ticker_id = ? AND close IS NOT NULL ORDER BY fecha DESC LIMIT 1',
+                                (ids_por_nombre[nombre],)).fetchone()
+        ultimos.append(fila[0] if fila else np.nan)
+    valores = np.array([caps.get(tickers.get(nombre), np.nan) for nombre in componentes], dtype=np.float64)
+    conocidos = ~np.isnan(valores)
+    valores[~conocidos] = np.nanmean(valores) if conocidos.any() else 1.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        acciones = np.nan_to_num(valores / np.array(ultimos))
+    return acciones, sorted(ids_por_nombre[n] for n, c in zip(componentes, conocidos) if c)
+
+
+def _retomar(conexion, ticker_id, ids, desde_dia):
+    """``(día, nivel, cierres de los componentes)`` del último día del compuesto antes de ``desde_dia``, o None."""
+    fila = conexion.execute('SELECT fecha, close FROM prices WHERE ticker_id = ? AND fecha < ? ORDER BY fecha DESC LIMIT 1',
+                            (ticker_id, int(desde_dia))).fetchone()
+    if fila is None:
+        return None
+    dia, nivel = fila
+    cierres = []
+    for componente in ids:
+        previo = conexion.execute('''SELECT close FROM prices WHERE ticker_id = ? AND fecha <= ? AND close IS NOT NULL
+                                     ORDER BY fecha DESC LIMIT 1''', (componente, dia)).fetchone()
+        cierres.append(previo[0] if previo else np.nan)
+    return dia, nivel, np.array(cierres, dtype=np.float64)
+
+
+def actualizar(conexion, df_tickers, desde_dia_por_ticker=None):
+    """Registra y pone al día los compuestos de ``df_tickers``.
+
+    ``desde_dia_por_ticker`` (``{ticker_id: primer día escrito}``) detecta correcciones de los
+    componentes. Devuelve ``{ticker_id: primer día escrito}`` de los compuestos que han
+    cambiado, para encadenar la actualización de métricas derivadas.
+    """
+    inicializar_tabla(conexion)
+    desde_dia_por_ticker = desde_dia_por_ticker or {}
+    ids_por_nombre = dict(conexion.execute('SELECT nombreTicker, ticker_id FROM series'))
+    caps = capitalizaciones(conexion, df_tickers)
+    escritos = {}
+    for d in definiciones(df_tickers).itertuples():
+        ticker_id = almacen.registrar_serie(conexion, d.ticker, d.nombreTicker)
+        componentes = [n for n in d.componentes if n in ids_por_nombre]
+        ids = [ids_por_nombre[n] for n in componentes]
+        if not componentes:
+            continue
+        acciones, capitalizados = (_acciones(conexion, componentes, ids_por_nombre, caps)
+                                   if d.ponderacion == 'cap' else (None, []))
+
+        estado = conexion.execute('''SELECT ultima_fecha, nivel, componentes, capitalizados, acciones, cierres
+                                     FROM compuestos_estado WHERE ticker_id = ?''', (ticker_id,)).fetchone()
+        inicio, corregido = None, False
+        if estado:
+            ultima_fecha, nivel, componentes_previos, capitalizados_previos, blob_acciones, blob_cierres = estado
+            if json.loads(componentes_previos) == ids:
+                if blob_acciones is not None and json.loads(capitalizados_previos) == capitalizados:
+                    # Con los mismos bancos capitalizados se mantienen las acciones de la primera estimación
+                    acciones = np.frombuffer(blob_acciones, dtype=np.float64)
+                primer_corregido = min(desde_dia_por_ticker.get(i, np.inf) for i in ids)
+                corregido = primer_corregido <= ultima_fecha
+                inicio = (_retomar(conexion, ticker_id, ids, primer_corregido) if corregido
+                          else (ultima_fecha, nivel, np.frombuffer(blob_cierres, dtype=np.float64)))
+        if inicio:
+            ultima_fecha, nivel, cierres_previos = inicio
+            desde = almacen.dia_a_fecha(ultima_fecha + 1)
+        else:
+            almacen.borrar_precios(conexion, ticker_id)
+            desde, nivel, corregido = None, BASE, False
+            cierres_previos = np.full(len(ids), np.nan)
+
+        matriz = analitica.cargar_matriz(conexion, componentes, desde=desde)
+        if matriz.empty:
+            continue
+        niveles, ultimos = calcular(matriz.to_numpy(), cierres_previos, nivel, acciones)
+        datos = pd.DataFrame({'Date': matriz.index, 'Close': niveles})
+        if corregido:
+            almacen.reescribir_precios(conexion, ticker_id, datos, ultima_fecha + 1)
+        else:
+            almacen.guardar_precios(conexion, ticker_id, datos)
+        conexion.execute('''INSERT OR REPLACE INTO compuestos_estado
+                            (ticker_id, ultima_fecha, nivel, componentes, capitalizados, acciones, cierres)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         (ticker_id, almacen.fecha_a_dia(matriz.index[-1]), float(niveles[-1]), json.dumps(ids),
+                          json.dumps(capitalizados), None if acciones is None else acciones.tobytes(), ultimos.tobytes()))
+        escritos[ticker_id] = almacen.fecha_a_dia(matriz.index[0])
+    return escritos
+
+
+def reconstruir(conexion, df_tickers):
+    """Borra el estado de todos los compuestos y los recalcula desde el principio."""
+    inicializar_tabla(conexion)
+    conexion.execute('DELETE FROM compuestos_estado')
+    return actualizar(conexion, df_tickers)
@@ -0,0 +1,131 @@
+"""Gestión de conexiones SQLite compartida por todo el proceso.
+
+* La base de datos trabaja en modo WAL: los lectores no se bloquean mientras una
+  sincronización escribe, y el escritor no espera a los lectores.
+* Hay una única conexión de escritura por base de datos y proceso, serializada con un
+  candado (``escritura()``).
+* Las lecturas usan un pool de conexiones de solo lectura (``mode=ro``) reutilizadas
+  entre reruns y sesiones (``lectura()``), así que no se paga abrir una conexión ni
+  preparar el esquema en cada consulta.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from . import almacen
+
+TAMANO_POOL = 8
+
+# Perfil de pragmas: WAL + synchronous=NORMAL es seguro ante caídas del proceso y mucho
+# más rápido que FULL; 64 MB de caché de páginas y 256 MB de mmap para las lecturas.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 10000,
+}
+
+
+def aplicar_pragmas(conexion, solo_lectura=False):
+    for pragma, valor in PRAGMAS.items():
+        if solo_lectura and pragma == 'journal_mode':
+            continue
+        conexion.execute(f'PRAGMA {pragma} = {valor}')
+    if solo_lectura:
+        conexion.execute('PRAGMA query_only = ON')
+
+
+def inicializar_todo(conexion):
+    """Crea todas las tablas de la app, para que las conexiones de solo lectura las encuentren."""
+    from . import compuestos, derivadas, divisas, info_tickers, intradia, revisiones, sincronizacion, universo
+    almacen.inicializar_esquema(conexion)
+    compuestos.inicializar_tabla(conexion)
+    derivadas.inicializar_tablas(conexion)
+    divisas.inicializar_tabla(conexion)
+    info_tickers.inicializar_tabla(conexion)
+    intradia.inicializar_tabla(conexion)
+    revisiones.inicializar_tabla(conexion)
+    universo.inicializar_tabla(conexion)
+    sincronizacion.inicializar_tabla(conexion)
+    conexion.commit()
+
+
+class GestorConexiones:
+
+    def __init__(self, ruta=almacen.RUTA_DB, tamano_pool=TAMANO_POOL):
+        self.ruta = ruta
+        self.tamano_pool = tamano_pool
+        self._escritor = sqlite3.connect(ruta, timeout=10, check_same_thread=False)
+        aplicar_pragmas(self._escritor)
+        inicializar_todo(self._escritor)
+        self._candado_escritura = threading.RLock()
+        self._libres = queue.LifoQueue()
+        self._creadas = 0
+        self._candado_pool = threading.Lock()
+
+    def _nueva_lectora(self):
+        conexion = sqlite3.connect(f'file:{self.ruta}?mode=ro', uri=True, timeout=10, check_same_thread=False)
+        aplicar_pragmas(conexion, solo_lectura=True)
+        return conexion
+
+    @contextmanager
+    def lectura(self):
+        """Presta una conexión de solo lectura del pool (espera si están todas ocupadas)."""
+        try:
+            conexion = self._libres.get_nowait()
+        except queue.Empty:
+            with self._candado_pool:
+                crear = self._creadas < self.tamano_pool
+                if crear:
+                    self._creadas += 1
+            conexion = self._nueva_lectora() if crear else self._libres.get()
+        try:
+            yield conexion
+        finally:
+            # Cierra la transacción de lectura implícita para no retener instantáneas del WAL
+            if conexion.in_transaction:
+                conexion.rollback()
+            self._libres.put(conexion)
+
+    @contextmanager
+    def escritura(self):
+        """La conexión de escritura, en exclusiva: confirma al salir o deshace si hay error."""
+        with self._candado_escritura:
+            try:
+                yield self._escritor
+                self._escritor.commit()
+            except BaseException:
+                self._escritor.rollback()
+                raise
+
+    def cerrar(self):
+        with self._candado_escritura:
+            self._escritor.close()
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_gestores = {}
+_candado_gestores = threading.Lock()
+
+
+def gestor(ruta=almacen.RUTA_DB):
+    """El ``GestorConexiones`` de ``ruta`` para este proceso (se crea la primera vez)."""
+    with _candado_gestores:
+        if ruta not in _gestores:
+            _gestores[ruta] = GestorConexiones(ruta)
+        return _gestores[ruta]
+
+
+def lectura(ruta=almacen.RUTA_DB):
+    return gestor(ruta).lectura()
+
+
+def escritura(ruta=almacen.RUTA_DB):
+    return gestor(ruta).escritura()
@@ -0,0 +1,249 @@
+"""Capa de consultas memoizada sobre el almacén de precios.
+
+Las series se cachean por ``(nombreTicker, día de inicio, frecuencia, versión de datos)``. La versión
+(``version_datos`` en la tabla ``meta``) la incrementa cada sincronización que escribe
+filas nuevas, así que una entrada nunca devuelve datos viejos: basta con que cambie la
+versión para que la siguiente lectura vaya a la base de datos.
+
+``obtener_series`` es la entrada para notebooks y otras herramientas: un DataFrame ancho
+con las series alineadas, leído en una sola consulta y sin pasar por Streamlit ni por la
+sincronización (``dadanalysis/servidor.py`` lo sirve por HTTP).
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from . import almacen, analitica, conexiones, diagnostico, divisas, intradia, universo
+from .graficos import reducir
+
+
+def version_datos(conexion):
+    return int(almacen.leer_meta(conexion, 'version_datos', 0))
+
+
+def incrementar_version_datos(conexion):
+    conexion.execute('''INSERT INTO meta (clave, valor) VALUES ('version_datos', '1')
+                        ON CONFLICT(clave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1''')
+    almacen.escribir_meta(conexion, 'datos_modificados', datetime.now(timezone.utc).isoformat(timespec='seconds'))
+
+
+def marca_datos(conexion):
+    """``(versión de datos, instante UTC de la última escritura o None)``: la marca de agua de las lecturas.
+
+    Las bases de datos anteriores a ``datos_modificados`` usan el fin de la última sincronización.
+    """
+    instante = almacen.leer_meta(conexion, 'datos_modificados') or almacen.leer_meta(conexion, 'ultima_sincronizacion')
+    if instante is not None:
+        instante = datetime.fromisoformat(instante).astimezone(timezone.utc)
+    return version_datos(conexion), instante
+
+
+SERIE_VACIA = pd.DataFrame({'fecha': pd.DatetimeIndex([]), 'close': pd.Series([], dtype=float)})
+
+
+def _reducir_df(serie, puntos):
+    if len(serie) <= puntos:
+        return serie
+    fechas, valores = reducir(serie['fecha'].to_numpy(), serie['close'].to_numpy(), puntos)
+    return pd.DataFrame({'fecha': fechas, 'close': valores})
+
+
+class CacheSeries:
+    """Caché LRU de series compartida por todo el proceso.
+
+    La versión de datos se relee de SQLite como mucho cada ``comprobar_version_cada``
+    segundos (por si otro proceso, p. ej. el CLI, ha sincronizado); ``invalidar()`` fuerza
+    la relectura inmediata tras una sincronización en este mismo proceso.
+
+    Con ``columnar`` (un ``AlmacenColumnar``) las series diarias se leen de los ficheros
+    mapeados en memoria en lugar de SQLite; la caché columnar se pone al día sola cuando
+    cambia la versión de datos.
+    """
+
+    def __init__(self, ruta_db=almacen.RUTA_DB, max_entradas=512, comprobar_version_cada=60, columnar=None):
+        self.ruta_db = ruta_db
+        self.columnar = columnar
+        self.max_entradas = max_entradas
+        self.comprobar_version_cada = comprobar_version_cada
+        self.lecturas_db = 0
+        self._entradas = OrderedDict()
+        self._primeras_fechas = None
+        self._intradia = None
+        self._version = None
+        self._version_leida = float('-inf')
+        self._lock = threading.Lock()
+
+    def invalidar(self):
+        with self._lock:
+            self._version_leida = float('-inf')
+
+    def version(self):
+        with self._lock:
+            if time.monotonic() - self._version_leida < self.comprobar_version_cada:
+                return self._version
+        with conexiones.lectura(self.ruta_db) as conexion:
+            version = version_datos(conexion)
+            if self.columnar is not None and self.columnar.version != version:
+                self.columnar.actualizar(conexion)
+        with self._lock:
+            if version != self._version:
+                self._entradas.clear()
+                self._primeras_fechas = None
+                self._intradia = None
+            self._version = version
+            self._version_leida = time.monotonic()
+        return version
+
+    def primeras_fechas(self):
+        """``{nombreTicker: date}`` de inicio de cada serie, cacheado por versión de datos."""
+        self.version()
+        with self._lock:
+            if self._primeras_fechas is not None:
+                return self._primeras_fechas
+        with conexiones.lectura(self.ruta_db) as conexion:
+            primeras = almacen.primeras_fechas(conexion)
+        with self._lock:
+            self._primeras_fechas = primeras
+        return primeras
+
+    def intradia(self):
+        """``{nombreTicker: {resolución: primer día}}`` de las barras intradía, cacheado por versión de datos."""
+        self.version()
+        with self._lock:
+            if self._intradia is not None:
+                return self._intradia
+        with conexiones.lectura(self.ruta_db) as conexion:
+            disponibles = intradia.disponibilidad(conexion)
+        with self._lock:
+            self._intradia = disponibles
+        return disponibles
+
+    def series(self, nombres, desde=None, frecuencia='D', puntos=None):
+        """``{nombreTicker: DataFrame(fecha, close)}`` de las series pedidas que tengan datos.
+
+        ``frecuencia`` puede ser también una resolución intradía (``1m``, ``5m``, ``1h``).
+
+        Con ``puntos`` cada serie se reduce (LTTB) a como mucho ese número de puntos y se
+        cachea ya reducida. Los DataFrames devueltos se comparten entre llamadas: no se
+        deben modificar.
+        """
+        version = self.version()
+        desde_dia = almacen.fecha_a_dia(desde) if desde is not None else None
+        with self._lock:
+            resultado = {}
+            for nombre in nombres:
+                clave = (nombre, desde_dia, frecuencia, puntos, version)
+                if clave in self._entradas:
+                    self._entradas.move_to_end(clave)
+                    resultado[nombre] = self._entradas[clave]
+        faltan = [nombre for nombre in nombres if nombre not in resultado]
+        diagnostico.contar('cache.series.aciertos', len(resultado))
+        diagnostico.contar('cache.series.fallos', len(faltan))
+
+        if faltan:
+            if self.columnar is not None and frecuencia == 'D':
+                leidas = self._leer_columnar(faltan, desde_dia)
+            elif frecuencia in intradia.RESOLUCIONES:
+                leidas = self._leer_intradia(faltan, desde, frecuencia)
+            else:
+                leidas = self._leer_db(faltan, desde, frecuencia)
+            if puntos:
+                with diagnostico.tramo('graficos.reducir', series=len(leidas), puntos=puntos):
+                    leidas = {nombre: _reducir_df(serie, puntos) for nombre, serie in leidas.items()}
+            with self._lock:
+                for nombre in faltan:
+                    serie = leidas.get(nombre, SERIE_VACIA)
+                    self._entradas[(nombre, desde_dia, frecuencia, puntos, version)] = serie
+                    resultado[nombre] = serie
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+
+        return {nombre: resultado[nombre] for nombre in nombres if not resultado[nombre].empty}
+
+    def _leer_db(self, nombres, desde, frecuencia):
+        # Las series que faltan se leen todas juntas en una única consulta
+        with conexiones.lectura(self.ruta_db) as conexion:
+            df = almacen.cargar_precios(conexion, nombres, desde=desde, frecuencia=frecuencia)
+        self.lecturas_db += 1
+        return {nombre: grupo[['fecha', 'close']].reset_index(drop=True)
+                for nombre, grupo in df.groupby('nombreTicker', sort=False)}
+
+    def _leer_intradia(self, nombres, desde, resolucion):
+        with conexiones.lectura(self.ruta_db) as conexion:
+            df = intradia.cargar_barras(conexion, nombres, desde=desde, resolucion=resolucion)
+        self.lecturas_db += 1
+        return {nombre: grupo[['fecha', 'close']].reset_index(drop=True)
+                for nombre, grupo in df.groupby('nombreTicker', sort=False)}
+
+    def _leer_columnar(self, nombres, desde_dia):
+        ids = self.columnar.ids_por_nombre()
+        leidas = {}
+        with diagnostico.tramo('columnar.series', series=len(nombres)):
+            for nombre in nombres:
+                if nombre in ids:
+                    dias, close = self.columnar.serie(ids[nombre], desde_dia)
+                    leidas[nombre] = pd.DataFrame({'fecha': almacen.dias_a_fechas(dias), 'close': close})
+        diagnostico.contar('columnar.filas_leidas', sum(len(df) for df in leidas.values()))
+        return leidas
+
+
+# Etiqueta de cada fila en los agregados: el último día natural de la semana (domingo) o del mes,
+# para que las series de bolsas con distintos festivos caigan en la misma fila
+PERIODOS = {'W': 'W', 'M': 'M'}
+
+
+def resolver_nombres(conexion, tickers, divisa=None):
+    """``{pedido: nombreTicker}`` de cada ticker (``^GSPC``) o ``nombreTicker`` (``SyP_500``) pedido.
+
+    Con ``divisa`` devuelve la serie convertida a esa divisa (la original si ya cotiza en ella).
+    Lanza ``ValueError`` con los que no existen o no tienen conversión.
+    """
+    catalogo = dict(conexion.execute('SELECT ticker, nombreTicker FROM series'))
+    nombres = set(catalogo.values())
+    if divisa is not None:
+        if divisa not in divisas.BASES:
+            raise ValueError(f"Divisa no soportada: {divisa} (una de {', '.join(divisas.BASES)})")
+        monedas = universo.cargar(conexion).set_index('nombreTicker')['divisa']
+    resultado, desconocidos = {}, []
+    for pedido in tickers:
+        nombre = pedido if pedido in nombres else catalogo.get(pedido)
+        if nombre is not None and divisa is not None and monedas.get(nombre) != divisa:
+            nombre = divisas.nombre_convertido(nombre, divisa)
+            nombre = nombre if nombre in nombres else None
+        if nombre is None:
+            desconocidos.append(pedido)
+        else:
+            resultado[pedido] = nombre
+    if desconocidos:
+        raise ValueError(f"Series desconocidas{f' en {divisa}' if divisa else ''}: {', '.join(desconocidos)}")
+    return resultado
+
+
+def obtener_series(tickers, desde=None, hasta=None, frecuencia='D', normalizar=False, divisa=None, ruta_db=almacen.RUTA_DB):
+    """DataFrame ancho ``fecha x serie`` con las series pedidas, alineadas, en una sola lectura.
+
+    ``tickers`` admite tickers (``^GSPC``) o ``nombreTicker`` (``SyP_500``); las columnas llevan
+    los nombres tal como se piden. ``frecuencia`` elige cierres diarios (``D``) o el último
+    cierre de cada semana (``W``) o mes (``M``), con la fila fechada al final del periodo.
+    Los huecos de cada serie (festivos de su bolsa) se rellenan con su último cierre.
+    ``normalizar`` pasa cada serie a base 100 en su primer cierre del rango y ``divisa``
+    (una de ``divisas.BASES``) lee las series convertidas a esa divisa.
+    """
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    if frecuencia not in almacen.TABLAS_FRECUENCIA:
+        raise ValueError(f"Frecuencia no soportada: {frecuencia} (una de {', '.join(almacen.TABLAS_FRECUENCIA)})")
+    with conexiones.lectura(ruta_db) as conexion:
+        nombres = resolver_nombres(conexion, tickers, divisa)
+        largo = almacen.cargar_precios(conexion, set(nombres.values()), desde=desde, hasta=hasta, frecuencia=frecuencia)
+    if frecuencia in PERIODOS:
+        largo['fecha'] = largo['fecha'].dt.to_period(PERIODOS[frecuencia]).dt.end_time.dt.normalize()
+    ancho = largo.pivot_table(index='fecha', columns='nombreTicker', values='close', aggfunc='last')
+    ancho = ancho.reindex(columns=list(nombres.values()))
+    df = pd.DataFrame(analitica.rellenar_adelante(ancho.to_numpy(dtype=float)), index=ancho.index, columns=list(nombres))
+    df.index.name = 'fecha'
+    if normalizar:
+        df = df / df.bfill().iloc[0] * 100
+    return df
@@ -0,0 +1,168 @@
+"""Métricas derivadas materializadas y mantenidas de forma incremental.
+
+Por cada serie y fecha, la tabla ``metricas`` guarda el rendimiento logarítmico diario,
+la volatilidad móvil anualizada y la media móvil a 20/60/250 sesiones y el drawdown
+frente al máximo histórico. ``metricas_estado`` conserva lo necesario para seguir
+calculando sin releer la historia: los últimos ``HISTORIA_ESTADO`` cierres (como BLOB
+``float64``), la última fecha procesada y el máximo acumulado. Así cada sincronización
+cuesta O(filas nuevas) por serie.
+
+Si llegan filas anteriores a la última fecha procesada (correcciones), ``retroceder``
+borra las métricas desde el día corregido y rehace el estado con los cierres anteriores,
+así que solo se recalcula desde ahí; ``python -m dadanalysis derivadas --reconstruir``
+rehace todo.
+"""
+import numpy as np
+import pandas as pd
+
+from . import almacen
+from .analitica import DIAS_HABILES_ANIO
+
+VENTANAS = (20, 60, 250)
+HISTORIA_ESTADO = max(VENTANAS) + 1
+
+COLUMNAS = ['log_ret', *[f'vol{v}' for v in VENTANAS], *[f'ma{v}' for v in VENTANAS], 'drawdown']
+
+
+def inicializar_tablas(conexion):
+    columnas = ',\n'.join(f'{c} REAL' for c in COLUMNAS)
+    conexion.execute(f'''CREATE TABLE IF NOT EXISTS metricas (
+                             ticker_id INTEGER NOT NULL,
+                             fecha INTEGER NOT NULL,
+                             {columnas},
+                             PRIMARY KEY (ticker_id, fecha)) WITHOUT ROWID''')
+    conexion.execute('''CREATE TABLE IF NOT EXISTS metricas_estado (
+                            ticker_id INTEGER PRIMARY KEY,
+                            ultima_fecha INTEGER NOT NULL,
+                            maximo REAL NOT NULL,
+                            cierres BLOB NOT NULL)''')
+
+
+def _suma_movil(x, ventana):
+    """Suma de las últimas ``ventana`` posiciones (NaN mientras no haya ``ventana`` valores)."""
+    acumulada = np.concatenate([[0.0], np.cumsum(x)])
+    resultado = np.full(len(x), np.nan)
+    if len(x) >= ventana:
+        resultado[ventana - 1:] = acumulada[ventana:] - acumulada[:-ventana]
+    return resultado
+
+
+def calcular(cierres_previos, cierres_nuevos, maximo_previo):
+    """Métricas de las filas nuevas a partir del estado (cierres previos y máximo acumulado).
+
+    Devuelve un array ``(len(cierres_nuevos), len(COLUMNAS))``.
+    """
+    cierres = np.concatenate([cierres_previos, cierres_nuevos])
+    previas = len(cierres_previos)
+
+    log_ret = np.full(len(cierres), np.nan)
+    log_ret[1:] = np.diff(np.log(cierres))
+    r = np.nan_to_num(log_ret)
+    validos = (~np.isnan(log_ret)).astype(np.float64)
+
+    columnas = [log_ret]
+    for ventana in VENTANAS:
+        n = _suma_movil(validos, ventana)
+        suma = _suma_movil(r, ventana)
+        suma2 = _suma_movil(r * r, ventana)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            varianza = (suma2 - suma * suma / n) / (n - 1)
+        varianza[n < ventana] = np.nan
+        columnas.append(np.sqrt(np.clip(varianza, 0, None)) * np.sqrt(DIAS_HABILES_ANIO))
+    for ventana in VENTANAS:
+        columnas.append(_suma_movil(cierres, ventana) / ventana)
+
+    maximos = np.fmax.accumulate(np.concatenate([[maximo_previo], cierres_nuevos]))[1:]
+    drawdown = np.concatenate([np.full(previas, np.nan), cierres_nuevos / maximos - 1])
+    columnas.append(drawdown)
+    return np.column_stack(columnas)[previas:], maximos[-1] if len(maximos) else maximo_previo
+
+
+def actualizar_ticker(conexion, ticker_id):
+    """Añade las métricas de las filas nuevas de ``ticker_id``. Devuelve cuántas filas se han escrito."""
+    estado = conexion.execute('SELECT ultima_fecha, maximo, cierres FROM metricas_estado WHERE ticker_id = ?',
+                              (ticker_id,)).fetchone()
+    if estado:
+        ultima_fecha, maximo, blob = estado
+        cierres_previos = np.frombuffer(blob, dtype=np.float64)
+        nuevas = conexion.execute('''SELECT fecha, close FROM prices
+                                     WHERE ticker_id = ? AND fecha > ? AND close IS NOT NULL ORDER BY fecha''',
+                                  (ticker_id, ultima_fecha)).fetchall()
+    else:
+        cierres_previos, maximo = np.empty(0), -np.inf
+        nuevas = conexion.execute('SELECT fecha, close FROM prices WHERE ticker_id = ? AND close IS NOT NULL ORDER BY fecha',
+                                  (ticker_id,)).fetchall()
+    if not nuevas:
+        return 0
+
+    datos = np.array(nuevas, dtype=np.float64)
+    fechas, cierres_nuevos = datos[:, 0].astype(np.int64), datos[:, 1]
+    valores, maximo = calcular(cierres_previos, cierres_nuevos, maximo)
+
+    marcadores = ', '.join('?' * (len(COLUMNAS) + 2))
+    filas = ([ticker_id, int(fecha), *[None if np.isnan(v) else float(v) for v in fila]]
+             for fecha, fila in zip(fechas, valores))
+    conexion.executemany(f'INSERT OR REPLACE INTO metricas (ticker_id, fecha, {", ".join(COLUMNAS)}) VALUES ({marcadores})',
+                         filas)
+    cierres = np.concatenate([cierres_previos, cierres_nuevos])[-HISTORIA_ESTADO:]
+    conexion.execute('INSERT OR REPLACE INTO metricas_estado (ticker_id, ultima_fecha, maximo, cierres) VALUES (?, ?, ?, ?)',
+                     (ticker_id, int(fechas[-1]), float(maximo), cierres.tobytes()))
+    return len(fechas)
+
+
+def retroceder(conexion, ticker_id, desde_dia):
+    """Borra las métricas de ``ticker_id`` desde ``desde_dia`` y deja el estado en el día anterior."""
+    conexion.execute('DELETE FROM metricas WHERE ticker_id = ? AND fecha >= ?', (ticker_id, int(desde_dia)))
+    previas = conexion.execute('''SELECT fecha, close FROM prices WHERE ticker_id = ? AND fecha < ? AND close IS NOT NULL
+                                  ORDER BY fecha DESC LIMIT ?''', (ticker_id, int(desde_dia), HISTORIA_ESTADO)).fetchall()
+    if not previas:
+        conexion.execute('DELETE FROM metricas_estado WHERE ticker_id = ?', (ticker_id,))
+        return
+    maximo = conexion.execute('SELECT MAX(close) FROM prices WHERE ticker_id = ? AND fecha < ?',
+                              (ticker_id, int(desde_dia))).fetchone()[0]
+    cierres = np.array([close for _, close in reversed(previas)], dtype=np.float64)
+    conexion.execute('INSERT OR REPLACE INTO metricas_estado (ticker_id, ultima_fecha, maximo, cierres) VALUES (?, ?, ?, ?)',
+                     (ticker_id, int(previas[0][0]), float(maximo), cierres.tobytes()))
+
+
+def reconstruir(conexion, ticker_ids=None):
+    """Borra y recalcula las métricas de ``ticker_ids`` (o de todas las series)."""
+    inicializar_tablas(conexion)
+    if ticker_ids is None:
+        conexion.execute('DELETE FROM metricas')
+        conexion.execute('DELETE FROM metricas_estado')
+    else:
+        for ticker_id in ticker_ids:
+            conexion.execute('DELETE FROM metricas WHERE ticker_id = ?', (ticker_id,))
+            conexion.execute('DELETE FROM metricas_estado WHERE ticker_id = ?', (ticker_id,))
+    return actualizar(conexion, ticker_ids)
+
+
+def actualizar(conexion, ticker_ids=None, desde_dia_por_ticker=None):
+    """Pone al día las métricas. ``desde_dia_por_ticker`` (``{ticker_id: primer día escrito}``)
+    permite detectar correcciones de fechas ya procesadas, que se recalculan desde ese día."""
+    inicializar_tablas(conexion)
+    if ticker_ids is None:
+        ticker_ids = [fila[0] for fila in conexion.execute('SELECT ticker_id FROM series')]
+    if desde_dia_por_ticker:
+        ultimas = dict(conexion.execute('SELECT ticker_id, ultima_fecha FROM metricas_estado'))
+        corregidos = [t for t, dia in desde_dia_por_ticker.items() if t in ultimas and dia <= ultimas[t]]
+        for ticker_id in corregidos:
+            retroceder(conexion, ticker_id, desde_dia_por_ticker[ticker_id])
+    return sum(actualizar_ticker(conexion, ticker_id) for ticker_id in ticker_ids)
+
+
+def cargar_metrica(conexion, nombres, columna, desde=None):
+    """DataFrame ancho ``fecha x nombreTicker`` con la columna ``columna`` de ``metricas``."""
+    if columna not in COLUMNAS:
+        raise ValueError(f"Métrica desconocida: {columna}")
+    nombres = list(nombres)
+    marcadores = ','.join('?' * len(nombres))
+    desde_dia = almacen.fecha_a_dia(desde) if desde is not None else np.iinfo(np.int32).min
+    filas = conexion.execute(f'''SELECT s.nombreTicker, m.fecha, m.{columna} FROM metricas m
+                                 JOIN series s ON s.ticker_id = m.ticker_id
+                                 WHERE s.nombreTicker IN ({marcadores}) AND m.fecha >= ?''',
+                             (*nombres, desde_dia)).fetchall()
+    df = pd.DataFrame(filas, columns=['nombreTicker', 'fecha', columna])
+    df['fecha'] = almacen.dias_a_fechas(df['fecha'].to_numpy(dtype=np.int64))
+    return df.pivot(index='fecha', columns='nombreTicker', values=columna).reindex(columns=nombres)
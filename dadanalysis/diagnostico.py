@@ -0,0 +1,142 @@
+"""Instrumentación ligera: tramos cronometrados, contadores y logs JSON.
+
+* ``tramo(nombre, **etiquetas)`` cronometra un bloque ``with`` (una fase, una llamada de red,
+  una consulta); las etiquetas (p. ej. ``ticker=``) permiten el desglose por ticker.
+* ``contar(nombre, n)`` suma a un contador (llamadas de red, filas escritas, filas leídas...).
+
+Cada tramo se emite como una línea JSON en el logger ``dadanalysis.diagnostico`` y se
+acumula en dos sitios: el ``Registro`` del rerun en curso (si el hilo tiene uno, ver
+``nuevo_registro``) y las estadísticas acumuladas del proceso (``acumulado()``).
+
+Todo está desactivado por defecto. ``DAD_DIAGNOSTICO=1`` o ``activar()`` lo activan en todo
+el proceso; ``nuevo_registro`` lo activa solo en el contexto actual (p. ej. el rerun de una
+sesión de Streamlit), sin afectar a las demás sesiones ni a los hilos de fondo.
+Desactivado, ``tramo`` devuelve un gestor de contexto vacío compartido y ``contar`` vuelve
+en la primera línea, así que el coste es el de una llamada a función.
+"""
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+log = logging.getLogger(__name__)
+
+_activo = False
+_NULO = nullcontext()
+_registro = contextvars.ContextVar('registro_diagnostico', default=None)
+
+_lock = threading.Lock()
+_tramos_acumulados = {}
+_contadores_acumulados = Counter()
+
+
+class Registro:
+    """Tramos y contadores de un rerun (o de cualquier unidad de trabajo)."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.tramos = []
+        self.contadores = Counter()
+
+    @property
+    def segundos(self):
+        return time.perf_counter() - self.inicio
+
+
+class _Tramo:
+    __slots__ = ('nombre', 'etiquetas', 't0')
+
+    def __init__(self, nombre, etiquetas):
+        self.nombre = nombre
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        ms = (time.perf_counter() - self.t0) * 1000
+        evento = {'tramo': self.nombre, 'ms': round(ms, 3), **self.etiquetas}
+        if tipo is not None:
+            evento['error'] = tipo.__name__
+        registro = _registro.get()
+        if registro is not None:
+            registro.tramos.append(evento)
+        with _lock:
+            n, total, maximo = _tramos_acumulados.get(self.nombre, (0, 0.0, 0.0))
+            _tramos_acumulados[self.nombre] = (n + 1, total + ms, max(maximo, ms))
+        log.info(json.dumps(evento, ensure_ascii=False, default=str))
+        return False
+
+
+def activo():
+    """Si la instrumentación está activa en todo el proceso."""
+    return _activo
+
+
+def activar(valor=True):
+    """Activa o desactiva la instrumentación en todo el proceso."""
+    global _activo
+    if valor and not log.handlers:
+        manejador = logging.StreamHandler(sys.stderr)
+        manejador.setFormatter(logging.Formatter('%(message)s'))
+        log.addHandler(manejador)
+        log.setLevel(logging.INFO)
+        log.propagate = False
+    _activo = bool(valor)
+
+
+def tramo(nombre, **etiquetas):
+    if not _activo and _registro.get() is None:
+        return _NULO
+    return _Tramo(nombre, etiquetas)
+
+
+def contar(nombre, n=1):
+    registro = _registro.get()
+    if not _activo and registro is None:
+        return
+    if registro is not None:
+        registro.contadores[nombre] += n
+    with _lock:
+        _contadores_acumulados[nombre] += n
+
+
+def nuevo_registro():
+    """Empieza un ``Registro`` para el hilo/contexto actual (p. ej. al principio de cada rerun).
+
+    Mientras esté abierto, el contexto actual se instrumenta aunque el proceso no lo esté.
+    """
+    registro = Registro()
+    _registro.set(registro)
+    return registro
+
+
+def cerrar_registro(registro, **etiquetas):
+    """Emite el resumen JSON de ``registro`` y lo desvincula del contexto actual."""
+    if _registro.get() is registro:
+        _registro.set(None)
+    if _activo:
+        log.info(json.dumps({'registro': round(registro.segundos * 1000, 3), 'tramos': len(registro.tramos),
+                             'contadores': dict(registro.contadores), **etiquetas}, ensure_ascii=False, default=str))
+
+
+def acumulado():
+    """``(tramos, contadores)`` acumulados del proceso: ``{nombre: (n, ms total, ms máximo)}`` y ``{nombre: total}``."""
+    with _lock:
+        return dict(_tramos_acumulados), dict(_contadores_acumulados)
+
+
+def reiniciar_acumulado():
+    with _lock:
+        _tramos_acumulados.clear()
+        _contadores_acumulados.clear()
+
+
+if os.environ.get('DAD_DIAGNOSTICO') == '1':
+    activar()
@@ -0,0 +1,189 @@
+"""Series convertidas a una divisa común, materializadas en ``prices``.
+
+El universo mezcla cotizaciones en EUR, USD, GBp (peniques), DKK, HUF, CHF, SEK...
+(columna ``divisa`` de ``df_tickers``). Para comparar precios en una misma divisa:
+
+* Los tipos de cambio se descargan como un ticker más: ``pares`` añade al universo un par
+  ``EUR{X}=X`` (unidades de ``X`` por euro) por cada divisa ``X`` distinta del euro.
+* Cada serie se convierte a cada divisa de ``BASES`` con un cruce *as-of*: el cierre de
+  cada día usa el último tipo de cambio publicado ese día o antes. Pasar de ``X`` a ``B``
+  es ``cierre / EURX * EURB``; las subdivisiones (``GBp``) se pasan antes a su divisa.
+* La serie convertida es una serie más del catálogo (``ticker`` ``@EUR:^GSPC``,
+  ``nombreTicker`` ``SyP_500_EUR``): se lee con la caché de series, tiene agregados
+  semanales y mensuales y métricas derivadas como cualquier otra.
+
+``conversiones`` guarda el último día convertido de cada serie, así que cada sincronización
+solo convierte los días nuevos. Solo se convierten los días cubiertos por los tipos de
+cambio: si el par va con retraso, los días siguientes esperan a la próxima sincronización
+en lugar de convertirse con un tipo viejo. Una corrección de la serie o de sus pares
+recalcula desde el primer día corregido; un cambio de divisa de la serie, desde el principio.
+"""
+import numpy as np
+import pandas as pd
+
+from . import almacen
+
+# Divisas a las que se convierten todas las series
+BASES = ('EUR', 'USD')
+
+# Divisa de referencia de los pares descargados
+PIVOTE = 'EUR'
+
+# Subdivisiones que Yahoo usa en algunas bolsas: divisa y unidades por unidad de la divisa
+SUBDIVISIONES = {'GBp': ('GBP', 100), 'GBX': ('GBP', 100), 'ZAc': ('ZAR', 100), 'ILA': ('ILS', 100)}
+
+# Divisa de cotización por sufijo de Yahoo, para los tickers sin divisa explícita (componentes)
+SUFIJOS = {
+    'MC': 'EUR', 'DE': 'EUR', 'F': 'EUR', 'PA': 'EUR', 'MI': 'EUR', 'AS': 'EUR', 'BR': 'EUR', 'VI': 'EUR',
+    'HE': 'EUR', 'AT': 'EUR', 'LS': 'EUR', 'IR': 'EUR', 'L': 'GBp', 'CO': 'DKK', 'ST': 'SEK', 'OL': 'NOK',
+    'SW': 'CHF', 'BD': 'HUF', 'WA': 'PLN', 'PR': 'CZK', 'T': 'JPY', 'HK': 'HKD', 'TO': 'CAD', 'AX': 'AUD',
+}
+
+
+def inicializar_tabla(conexion):
+    conexion.execute('''CREATE TABLE IF NOT EXISTS conversiones (
+                            ticker_id INTEGER PRIMARY KEY,
+                            origen_id INTEGER NOT NULL,
+                            divisa TEXT NOT NULL,
+                            base TEXT NOT NULL,
+                            ultima_fecha INTEGER NOT NULL)''')
+
+
+def por_sufijo(ticker):
+    """Divisa de cotización deducida del sufijo de Yahoo (``SAN.MC`` -> ``EUR``); sin sufijo, USD."""
+    if '.' not in ticker:
+        return 'USD'
+    return SUFIJOS.get(ticker.rsplit('.', 1)[1].upper(), 'USD')
+
+
+def principal(divisa):
+    """``(divisa, unidades)``: ``GBp`` -> ``('GBP', 100)``, ``EUR`` -> ``('EUR', 1)``."""
+    return SUBDIVISIONES.get(divisa, (divisa, 1))
+
+
+def ticker_par(divisa):
+    return f'{PIVOTE}{divisa}=X'
+
+
+def nombre_par(divisa):
+    return f'{PIVOTE}_{divisa}'
+
+
+def nombre_convertido(nombre, base):
+    return f'{nombre}_{base}'
+
+
+def pares(df_tickers, bases=BASES):
+    """Filas de universo (``tipo`` = ``divisa``) con los pares necesarios para convertir ``df_tickers`` a ``bases``."""
+    divisas = {principal(d)[0] for d in df_tickers['divisa'].dropna()} | set(bases)
+    divisas = sorted(divisas - {PIVOTE})
+    return pd.DataFrame({'ticker': [ticker_par(d) for d in divisas], 'nombreTicker': [nombre_par(d) for d in divisas],
+                         'tipo': 'divisa', 'pais': None, 'indices': '', 'divisa': divisas})
+
+
+def cruzar(dias, tipos_dias, tipos):
+    """Cruce *as-of*: el último tipo de ``tipos`` publicado en cada día de ``dias`` o antes (NaN si no hay)."""
+    posicion = np.searchsorted(tipos_dias, dias, side='right') - 1
+    return np.where(posicion >= 0, tipos[np.maximum(posicion, 0)], np.nan)
+
+
+def convertir(dias, cierres, divisa, base, tipos):
+    """Convierte ``cierres`` de ``divisa`` a ``base``. ``tipos`` = ``{divisa: (días, unidades por PIVOTE)}``."""
+    origen, unidades = principal(divisa)
+    valores = np.asarray(cierres, dtype=np.float64) / unidades
+    if origen != PIVOTE:
+        valores = valores / cruzar(dias, *tipos[origen])
+    if base != PIVOTE:
+        valores = valores * cruzar(dias, *tipos[base])
+    return valores
+
+
+def _cargar_tipos(conexion, divisas, ids_por_nombre):
+    tipos = {}
+    for divisa in divisas:
+        ticker_id = ids_por_nombre.get(nombre_par(divisa))
+        filas = conexion.execute('SELECT fecha, close FROM prices WHERE ticker_id = ? AND close > 0 ORDER BY fecha',
+                                 (ticker_id,)).fetchall() if ticker_id is not None else []
+        if filas:
+            datos = np.array(filas, dtype=np.float64)
+            tipos[divisa] = (datos[:, 0].astype(np.int64), datos[:, 1])
+    return tipos
+
+
+def ultimos_tipos(conexion, divisas):
+    """``{divisa: último tipo guardado}`` (unidades por ``PIVOTE``) de ``divisas``; el pivote vale 1."""
+    ids_por_nombre = dict(conexion.execute('SELECT nombreTicker, ticker_id FROM series'))
+    tipos = _cargar_tipos(conexion, set(divisas) - {PIVOTE}, ids_por_nombre)
+    return {PIVOTE: 1.0, **{divisa: float(valores[-1]) for divisa, (_, valores) in tipos.items()}}
+
+
+def actualizar(conexion, df_tickers, bases=BASES, desde_dia_por_ticker=None):
+    """Registra y pone al día las series de ``df_tickers`` convertidas a cada divisa de ``bases``.
+
+    ``desde_dia_por_ticker`` (``{ticker_id: primer día escrito}``) detecta correcciones de las
+    series y de los pares. Devuelve ``{ticker_id: primer día escrito}`` de las series
+    convertidas que han cambiado, para encadenar la actualización de métricas derivadas.
+    """
+    inicializar_tabla(conexion)
+    if 'divisa' not in df_tickers:
+        return {}
+    desde_dia_por_ticker = desde_dia_por_ticker or {}
+    ids_por_nombre = dict(conexion.execute('SELECT nombreTicker, ticker_id FROM series'))
+    series = df_tickers[(df_tickers['tipo'] != 'divisa') & df_tickers['divisa'].notna()]
+    necesarias = {principal(d)[0] for d in series['divisa']} | set(bases)
+    tipos = _cargar_tipos(conexion, necesarias - {PIVOTE}, ids_por_nombre)
+    # Último día cubierto por los tipos de cada divisa; el pivote no tiene límite
+    hasta = {divisa: int(dias[-1]) for divisa, (dias, _) in tipos.items()}
+    hasta[PIVOTE] = int(np.iinfo(np.int32).max)
+    estados = {fila[0]: fila[1:] for fila in conexion.execute(
+        'SELECT ticker_id, origen_id, divisa, ultima_fecha FROM conversiones')}
+
+    escritos = {}
+    for base in bases:
+        for fila in series.itertuples():
+            origen = principal(fila.divisa)[0]
+            if fila.divisa == base or fila.nombreTicker not in ids_por_nombre:
+                continue
+            if origen not in hasta or base not in hasta:
+                continue
+            ticker_id = almacen.registrar_serie(conexion, f'@{base}:{fila.ticker}', nombre_convertido(fila.nombreTicker, base))
+            origen_id = ids_por_nombre[fila.nombreTicker]
+            limite = min(hasta[origen], hasta[base])
+
+            estado = estados.get(ticker_id)
+            corregido = False
+            if estado and tuple(estado[:2]) == (origen_id, fila.divisa):
+                desde = estado[2] + 1
+                # Una corrección de la serie o de sus pares rehace la conversión desde ese día
+                pares_id = [ids_por_nombre.get(nombre_par(d)) for d in (origen, base) if d != PIVOTE]
+                primer_corregido = min(desde_dia_por_ticker.get(i, np.inf) for i in [origen_id, *pares_id])
+                corregido = primer_corregido < desde
+                desde = int(min(desde, primer_corregido))
+            else:
+                almacen.borrar_precios(conexion, ticker_id)
+                desde = int(np.iinfo(np.int32).min)
+
+            filas = conexion.execute('''SELECT fecha, close FROM prices
+                                        WHERE ticker_id = ? AND fecha >= ? AND fecha <= ? AND close IS NOT NULL
+                                        ORDER BY fecha''', (origen_id, desde, limite)).fetchall()
+            if not filas:
+                continue
+            datos = np.array(filas, dtype=np.float64)
+            dias = datos[:, 0].astype(np.int64)
+            valores = convertir(dias, datos[:, 1], fila.divisa, base, tipos)
+            convertidos = pd.DataFrame({'Date': almacen.dias_a_fechas(dias), 'Close': valores})
+            # Una corrección se sobrescribe: los días que ya no están en el origen se borran
+            escritas = (almacen.reescribir_precios(conexion, ticker_id, convertidos, desde) if corregido
+                        else almacen.guardar_precios(conexion, ticker_id, convertidos))
+            if escritas:
+                escritos[ticker_id] = int(dias[~np.isnan(valores)][0])
+            conexion.execute('''INSERT OR REPLACE INTO conversiones (ticker_id, origen_id, divisa, base, ultima_fecha)
+                                VALUES (?, ?, ?, ?, ?)''', (ticker_id, origen_id, fila.divisa, base, int(dias[-1])))
+    return escritos
+
+
+def reconstruir(conexion, df_tickers, bases=BASES):
+    """Borra el estado de todas las conversiones y las recalcula desde el principio."""
+    inicializar_tabla(conexion)
+    conexion.execute('DELETE FROM conversiones')
+    return actualizar(conexion, df_tickers, bases)
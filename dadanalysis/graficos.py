@@ -0,0 +1,102 @@
+"""Nivel de detalle para los gráficos de precios.
+
+Con "Todos los tiempos" una sola serie diaria puede superar las 20.000 filas. Antes de
+enviarlas al navegador:
+
+1. ``elegir_frecuencia`` escoge, por serie, la resolución más fina (diaria, semanal o
+   mensual) cuyo número de puntos en el rango visible no pase de ``FACTOR_RESOLUCION``
+   veces el límite por trazo; las semanales y mensuales están precalculadas en SQLite.
+   En rangos de hasta ``DIAS_INTRADIA`` días prueba antes las barras intradía (1m, 5m,
+   1h) de las series que las tengan desde el inicio del rango.
+2. ``reducir`` recorta el resultado a ``PUNTOS_POR_TRAZO`` con LTTB (o mín/máx por
+   cubo), que conserva la forma visual de la serie.
+3. ``clase_trazo`` pasa a ``Scattergl`` (WebGL) cuando la figura total es grande.
+
+LTTB y mín/máx son invariantes a multiplicar la serie por una constante positiva, así que
+el resultado reducido se puede cachear y normalizar después ("Gráfico de Índices").
+"""
+from datetime import date
+
+import numpy as np
+
+PUNTOS_POR_TRAZO = 2000
+FACTOR_RESOLUCION = 2
+UMBRAL_WEBGL = 20000
+
+# Puntos aproximados por día natural de cada resolución (sesiones de ~8,5 horas)
+DENSIDAD = {'1m': 510 * 5 / 7, '5m': 102 * 5 / 7, '1h': 9 * 5 / 7, 'D': 5 / 7, 'W': 1 / 7, 'M': 12 / 365.25}
+DIAS_INTRADIA = 90
+
+
+def elegir_frecuencia(desde, hasta=None, puntos=PUNTOS_POR_TRAZO, intradia=None):
+    """Resolución para ``[desde, hasta]``. ``intradia`` = ``{resolución: primer día}`` de las barras de la serie."""
+    hasta = hasta or date.today()
+    dias = max((hasta - desde).days, 1)
+    if intradia and dias <= DIAS_INTRADIA:
+        for resolucion in ('1m', '5m', '1h'):
+            if resolucion in intradia and intradia[resolucion] <= desde \
+                    and dias * DENSIDAD[resolucion] <= FACTOR_RESOLUCION * puntos:
+                return resolucion
+    for frecuencia in ('D', 'W'):
+        if dias * DENSIDAD[frecuencia] <= FACTOR_RESOLUCION * puntos:
+            return frecuencia
+    return 'M'
+
+
+def lttb(x, y, puntos):
+    """Índices de los ``puntos`` elegidos por Largest-Triangle-Three-Buckets sobre ``x``/``y`` (numéricos)."""
+    n = len(x)
+    if puntos >= n or puntos < 3:
+        return np.arange(n)
+
+    # Cubos intermedios (el primer y el último punto se conservan siempre)
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(np.int64)
+    indices = np.empty(puntos, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        siguiente_fin = bordes[i + 2] if i + 2 < len(bordes) else n
+        # Vértice C: media del cubo siguiente
+        cx = x[fin:siguiente_fin].mean()
+        cy = y[fin:siguiente_fin].mean()
+        bx, by = x[inicio:fin], y[inicio:fin]
+        areas = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = inicio + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax(x, y, puntos):
+    """Índices del mínimo y el máximo de cada cubo (``puntos // 2`` cubos), en orden."""
+    n = len(x)
+    cubos = max(puntos // 2, 1)
+    if puntos >= n:
+        return np.arange(n)
+    bordes = np.linspace(0, n, cubos + 1).astype(np.int64)
+    indices = []
+    for inicio, fin in zip(bordes[:-1], bordes[1:]):
+        if fin <= inicio:
+            continue
+        tramo = y[inicio:fin]
+        indices.extend(sorted({inicio + int(np.argmin(tramo)), inicio + int(np.argmax(tramo))}))
+    return np.asarray(indices, dtype=np.int64)
+
+
+METODOS = {'lttb': lttb, 'minmax': minmax}
+
+
+def reducir(fechas, valores, puntos=PUNTOS_POR_TRAZO, metodo='lttb'):
+    """Devuelve ``(fechas, valores)`` con como mucho ``puntos`` elementos."""
+    if len(valores) <= puntos:
+        return fechas, valores
+    x = np.asarray(fechas).astype('datetime64[s]').astype(np.int64).astype(np.float64)
+    y = np.asarray(valores, dtype=np.float64)
+    indices = METODOS[metodo](x, y, puntos)
+    return np.asarray(fechas)[indices], y[indices]
+
+
+def clase_trazo(total_puntos):
+    """``go.Scattergl`` por encima de ``UMBRAL_WEBGL`` puntos en la figura, ``go.Scatter`` por debajo."""
+    import plotly.graph_objects as go
+    return go.Scattergl if total_puntos > UMBRAL_WEBGL else go.Scatter
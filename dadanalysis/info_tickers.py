@@ -0,0 +1,199 @@
+"""Caché persistente de ``Ticker.info`` con caducidad por campo.
+
+``.info`` es de las llamadas más lentas de yfinance y la app solo usa unos pocos campos.
+Cada campo se guarda en la tabla ``ticker_info`` con el instante en que se obtuvo, y
+caduca según ``TTL_CAMPOS``: la divisa y el tipo de cotización casi nunca cambian,
+los fundamentales se refrescan a diario. Encima hay una capa en memoria compartida
+por todo el proceso, de modo que un rerun con los datos frescos no toca ni la red
+ni la base de datos.
+
+``lanzar`` pide la info de varios tickers a la vez en un pool de hilos y ``a_medida``
+la entrega según va llegando; lo que no llega antes de ``TIMEOUT_INFO`` se sustituye
+por los últimos valores conocidos (``ultimos``) y la descarga sigue en segundo plano
+para el siguiente rerun.
+"""
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+from . import almacen, conexiones, diagnostico
+
+DIA = 24 * 60 * 60
+
+TTL_CAMPOS = {
+    'currency': 90 * DIA,
+    'quoteType': 90 * DIA,
+    'priceToBook': DIA,
+    'netIncomeToCommon': DIA,
+    'marketCap': DIA,
+    'returnOnAssets': DIA,
+    'returnOnEquity': DIA,
+}
+TTL_POR_DEFECTO = DIA
+# Tras un fallo de red no se vuelve a intentar el mismo ticker hasta pasado este tiempo
+ESPERA_TRAS_FALLO = 5 * 60
+# Segundos que se espera a las descargas de ``.info`` antes de tirar de los últimos valores conocidos
+TIMEOUT_INFO = 8
+MAX_WORKERS_INFO = 8
+
+
+def obtener_info_yfinance(ticker):
+    import yfinance as yf
+    return yf.Ticker(ticker).info or {}
+
+
+def obtener_info_falso(ticker):
+    """Info sintética para trabajar sin red (``DAD_PROVEEDOR=falso``)."""
+    es_indice = ticker.startswith('^')
+    return {
+        'currency': 'EUR' if '.' in ticker else 'USD',
+        'quoteType': 'INDEX' if es_indice else 'EQUITY',
+        'priceToBook': None if es_indice else 1.1,
+        'netIncomeToCommon': None if es_indice else 1_000_000_000,
+        'marketCap': None if es_indice else 50_000_000_000,
+        'returnOnAssets': None if es_indice else 0.008,
+        'returnOnEquity': None if es_indice else 0.11,
+    }
+
+
+OBTENEDORES = {
+    'yfinance': obtener_info_yfinance,
+    'falso': obtener_info_falso,
+}
+
+
+def inicializar_tabla(conexion):
+    conexion.execute('''CREATE TABLE IF NOT EXISTS ticker_info (
+                            ticker TEXT NOT NULL,
+                            campo TEXT NOT NULL,
+                            valor TEXT,
+                            actualizado REAL NOT NULL,
+                            PRIMARY KEY (ticker, campo)) WITHOUT ROWID''')
+    conexion.commit()
+
+
+class CacheInfo:
+    """``info(ticker, campos)`` devuelve ``{campo: valor}`` leyendo memoria, luego SQLite y, solo si algún campo ha caducado, la red.
+
+    Si la descarga falla se devuelven los últimos valores conocidos aunque estén caducados.
+    ``_lock`` solo protege la memoria: las lecturas y escrituras de SQLite se hacen fuera,
+    para que ``ultimos`` no espere a una escritura que está esperando a la sincronización.
+    """
+
+    def __init__(self, ruta_db=almacen.RUTA_DB, obtener=obtener_info_yfinance, ttl=None, max_workers=MAX_WORKERS_INFO):
+        self.ruta_db = ruta_db
+        self.obtener = obtener
+        self.ttl = dict(TTL_CAMPOS, **(ttl or {}))
+        self.llamadas_red = 0
+        self._memoria = {}
+        self._fallos = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='info')
+
+    def _caducado(self, campo, actualizado, ahora):
+        return ahora - actualizado > self.ttl.get(campo, TTL_POR_DEFECTO)
+
+    def _pendientes(self, ticker, campos, ahora):
+        en_memoria = self._memoria.get(ticker, {})
+        return [c for c in campos if c not in en_memoria or self._caducado(c, en_memoria[c][1], ahora)]
+
+    def _a_memoria(self, ticker, valores):
+        """Pasa ``{campo: (valor, actualizado)}`` a memoria sin pisar valores más recientes. Con ``_lock``."""
+        en_memoria = self._memoria.setdefault(ticker, {})
+        for campo, (valor, actualizado) in valores.items():
+            if campo not in en_memoria or en_memoria[campo][1] <= actualizado:
+                en_memoria[campo] = (valor, actualizado)
+
+    def _cargar_de_db(self, ticker):
+        with conexiones.lectura(self.ruta_db) as conexion:
+            filas = conexion.execute('SELECT campo, valor, actualizado FROM ticker_info WHERE ticker = ?',
+                                     (ticker,)).fetchall()
+        with self._lock:
+            self._a_memoria(ticker, {campo: (json.loads(valor), actualizado) for campo, valor, actualizado in filas})
+
+    def _guardar(self, ticker, valores, ahora):
+        with conexiones.escritura(self.ruta_db) as conexion:
+            conexion.executemany('INSERT OR REPLACE INTO ticker_info (ticker, campo, valor, actualizado) VALUES (?, ?, ?, ?)',
+                                 [(ticker, campo, json.dumps(valor), ahora) for campo, valor in valores.items()])
+        with self._lock:
+            self._a_memoria(ticker, {campo: (valor, ahora) for campo, valor in valores.items()})
+
+    def info(self, ticker, campos=tuple(TTL_CAMPOS)):
+        ahora = time.time()
+        with self._lock:
+            en_db = bool(self._pendientes(ticker, campos, ahora))
+        if en_db:
+            with diagnostico.tramo('db.ticker_info', ticker=ticker):
+                self._cargar_de_db(ticker)
+        with self._lock:
+            pendientes = self._pendientes(ticker, campos, ahora)
+            if self._fallo_reciente(ticker):
+                pendientes = []
+
+        if pendientes:
+            try:
+                self.llamadas_red += 1
+                diagnostico.contar('red.llamadas')
+                with diagnostico.tramo('red.info', ticker=ticker):
+                    info = self.obtener(ticker)
+                # Se guardan todos los campos conocidos, no solo los pedidos: una sola llamada
+                # a .info rellena la divisa del gráfico y los datos financieros a la vez.
+                valores = {campo: info.get(campo) for campo in set(self.ttl) | set(campos)}
+                self._guardar(ticker, valores, ahora)
+            except Exception as e:
+                self._fallos[ticker] = ahora
+                print(f"❌ Error obteniendo info para {ticker}: {e}")
+
+        with self._lock:
+            en_memoria = self._memoria.get(ticker, {})
+            return {campo: en_memoria[campo][0] for campo in campos if campo in en_memoria}
+
+    def _fallo_reciente(self, ticker):
+        return time.time() - self._fallos.get(ticker, float('-inf')) < ESPERA_TRAS_FALLO
+
+    def lanzar(self, tickers, campos=tuple(TTL_CAMPOS)):
+        """Pide ``info`` de todos los ``tickers`` a la vez. Devuelve ``{ticker: Future}``."""
+        # Con una copia del contexto, los tramos de cada tarea van al registro de quien la lanza
+        return {ticker: self._pool.submit(contextvars.copy_context().run, self.info, ticker, campos)
+                for ticker in dict.fromkeys(tickers)}
+
+    def ultimos(self, ticker, campos=tuple(TTL_CAMPOS)):
+        """Últimos valores conocidos (memoria o SQLite), caducados o no, sin tocar la red.
+
+        Devuelve ``(valores, actualizado)``, con el instante del campo más antiguo (``None`` si no hay ninguno).
+        """
+        with self._lock:
+            en_memoria = ticker in self._memoria
+        if not en_memoria:
+            self._cargar_de_db(ticker)
+        with self._lock:
+            en_memoria = self._memoria.get(ticker, {})
+            valores = {campo: en_memoria[campo][0] for campo in campos if campo in en_memoria}
+            instantes = [en_memoria[campo][1] for campo in campos if campo in en_memoria]
+        return valores, min(instantes) if instantes else None
+
+    def a_medida(self, futuros, timeout=TIMEOUT_INFO, campos=tuple(TTL_CAMPOS)):
+        """Genera ``(ticker, valores, actualizado)`` según llegan los ``futuros`` de ``lanzar``.
+
+        ``actualizado`` es ``None`` si los valores acaban de llegar; los tickers que no
+        responden en ``timeout`` segundos (en total, no por ticker) salen al final con
+        ``ultimos`` y el instante de esos valores.
+        """
+        por_futuro = {futuro: ticker for ticker, futuro in futuros.items()}
+        pendientes = set(futuros)
+        try:
+            for futuro in as_completed(por_futuro, timeout=timeout):
+                ticker = por_futuro[futuro]
+                pendientes.discard(ticker)
+                # ``info`` ya devuelve los valores guardados si la descarga falla: se marcan como antiguos
+                if futuro.exception() is None and not self._fallo_reciente(ticker):
+                    yield ticker, futuro.result(), None
+                else:
+                    yield (ticker, *self.ultimos(ticker, campos))
+        except TimeoutError:
+            for ticker in futuros:
+                if ticker in pendientes:
+                    diagnostico.contar('red.info_timeout')
+                    yield (ticker, *self.ultimos(ticker, campos))
@@ -0,0 +1,305 @@
+"""Barras intradía (1m, 5m, 1h) en particiones por tiempo y con codificación compacta.
+
+``prices`` guarda una fila por serie y día; las barras de minuto son cientos por día y se
+guardan aparte:
+
+* Particiones: una tabla por resolución y periodo, mensual para las barras en bruto
+  (``intradia_1m_202406``, ``intradia_5m_202406``), anual para las horarias
+  (``intradia_1h_2024``) y una sola para las diarias (``intradia_1d``). Una lectura solo
+  abre las particiones de su rango y la retención borra tablas enteras (``DROP TABLE``)
+  en lugar de millones de filas.
+* Codificación: cada fila es un día de una serie, ``(ticker_id, dia, n, decimales,
+  minutos, precios)``. Los minutos desde medianoche UTC se guardan como diferencias
+  ``uint16`` y los cierres como enteros con ``decimales`` fijos (unas 7 cifras
+  significativas) en diferencias ``int32``, ambos comprimidos con zlib: un día de barras
+  de minuto ocupa ~1 KB en lugar de ~500 filas.
+* Agregados: cada día escrito en bruto recalcula su último cierre por hora (``1h``) y del
+  día (``1d``). Cada barra cuenta en la hora de reloj en la que termina, así que las barras
+  horarias nativas de Yahoo (alineadas con la sesión, p. ej. a las :30 en Nueva York) pasan
+  por el mismo agregado y comparten etiquetas con las que salen de barras de 1m y 5m. ``compactar`` aplica después ``RETENCION``: borra las barras en bruto
+  antiguas y, más tarde, las horarias, así que la historia vieja queda compactada en
+  barras horarias y diarias.
+
+``intradia_estado`` guarda el último instante descargado de cada serie e intervalo: cada
+ingesta pide desde esa barra (que pudo llegar incompleta) en adelante.
+"""
+import re
+import zlib
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from . import almacen, diagnostico
+
+# Segundos por barra de cada intervalo que se descarga
+INTERVALOS = {'1m': 60, '5m': 300, '1h': 3600}
+RESOLUCIONES = ('1m', '5m', '1h', '1d')
+
+# Días de historia que se conservan de cada resolución; la diaria se conserva entera
+RETENCION = {'1m': 30, '5m': 90, '1h': 730}
+
+SEGUNDOS_DIA = 86400
+MAX_CIFRAS = 7
+
+
+def inicializar_tabla(conexion):
+    conexion.execute('''CREATE TABLE IF NOT EXISTS intradia_estado (
+                            ticker_id INTEGER NOT NULL,
+                            intervalo TEXT NOT NULL,
+                            ultimo_instante INTEGER NOT NULL,
+                            PRIMARY KEY (ticker_id, intervalo)) WITHOUT ROWID''')
+    conexion.execute('''CREATE TABLE IF NOT EXISTS intradia_1d (
+                            ticker_id INTEGER NOT NULL,
+                            dia INTEGER NOT NULL,
+                            close REAL,
+                            PRIMARY KEY (ticker_id, dia)) WITHOUT ROWID''')
+
+
+def nombre_particion(resolucion, dia):
+    """Tabla que guarda ``dia`` (días desde 1970) en ``resolucion``: ``intradia_1m_202406``, ``intradia_1h_2024``..."""
+    fecha = almacen.dia_a_fecha(dia)
+    if resolucion == '1d':
+        return 'intradia_1d'
+    if resolucion == '1h':
+        return f'intradia_1h_{fecha.year}'
+    return f'intradia_{resolucion}_{fecha.year}{fecha.month:02d}'
+
+
+def rango_particion(tabla):
+    """``(resolución, primer día, último día)`` que cubre la partición ``tabla``."""
+    resolucion, periodo = tabla.split('_')[1:]
+    if len(periodo) == 4:
+        inicio, fin = date(int(periodo), 1, 1), date(int(periodo) + 1, 1, 1)
+    else:
+        anio, mes = int(periodo[:4]), int(periodo[4:])
+        inicio, fin = date(anio, mes, 1), date(anio + mes // 12, mes % 12 + 1, 1)
+    return resolucion, almacen.fecha_a_dia(inicio), almacen.fecha_a_dia(fin) - 1
+
+
+def particiones(conexion, resolucion, desde_dia=None, hasta_dia=None):
+    """Particiones existentes de ``resolucion`` que se solapan con ``[desde_dia, hasta_dia]``, por orden."""
+    patron = re.compile(rf'^intradia_{resolucion}_\d{{4}}(\d{{2}})?$')
+    tablas = sorted(nombre for (nombre,) in conexion.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+                    if patron.match(nombre))
+    resultado = []
+    for tabla in tablas:
+        _, inicio, fin = rango_particion(tabla)
+        if (desde_dia is None or fin >= desde_dia) and (hasta_dia is None or inicio <= hasta_dia):
+            resultado.append(tabla)
+    return resultado
+
+
+def _crear_particion(conexion, tabla):
+    conexion.execute(f'''CREATE TABLE IF NOT EXISTS {tabla} (
+                             ticker_id INTEGER NOT NULL,
+                             dia INTEGER NOT NULL,
+                             n INTEGER NOT NULL,
+                             decimales INTEGER NOT NULL,
+                             minutos BLOB NOT NULL,
+                             precios BLOB NOT NULL,
+                             PRIMARY KEY (ticker_id, dia)) WITHOUT ROWID''')
+
+
+def decimales_precio(cierres):
+    """Decimales que dejan el mayor cierre en ``MAX_CIFRAS`` cifras significativas (caben en ``int32``)."""
+    maximo = float(np.max(np.abs(cierres))) if len(cierres) else 0.0
+    if not np.isfinite(maximo) or maximo <= 0:
+        return 4
+    return int(np.clip(MAX_CIFRAS - 1 - np.floor(np.log10(maximo)), 0, 12))
+
+
+def codificar(segundos, cierres):
+    """``(decimales, minutos, precios)`` de un día: ``segundos`` desde medianoche (ordenados) y sus cierres."""
+    minutos = np.asarray(segundos, dtype=np.int64) // 60
+    decimales = decimales_precio(cierres)
+    enteros = np.round(np.asarray(cierres, dtype=np.float64) * 10.0 ** decimales).astype(np.int64)
+    return (decimales,
+            zlib.compress(np.diff(minutos, prepend=0).astype(np.uint16).tobytes()),
+            zlib.compress(np.diff(enteros, prepend=0).astype(np.int32).tobytes()))
+
+
+def decodificar(decimales, minutos, precios):
+    """Inverso de ``codificar``: ``(segundos desde medianoche, cierres)``."""
+    minutos = np.cumsum(np.frombuffer(zlib.decompress(minutos), dtype=np.uint16).astype(np.int64))
+    enteros = np.cumsum(np.frombuffer(zlib.decompress(precios), dtype=np.int32).astype(np.int64))
+    return minutos * 60, enteros / 10.0 ** decimales
+
+
+def _fusionar_dia(conexion, tabla, ticker_id, dia, segundos, cierres):
+    """Une las barras nuevas de un día con las guardadas (ganan las nuevas) y reescribe la fila."""
+    _crear_particion(conexion, tabla)
+    fila = conexion.execute(f'SELECT decimales, minutos, precios FROM {tabla} WHERE ticker_id = ? AND dia = ?',
+                            (ticker_id, dia)).fetchone()
+    if fila is not None:
+        viejos_segundos, viejos_cierres = decodificar(*fila)
+        conservar = ~np.isin(viejos_segundos, segundos)
+        segundos = np.concatenate([viejos_segundos[conservar], segundos])
+        cierres = np.concatenate([viejos_cierres[conservar], cierres])
+        orden = np.argsort(segundos, kind='stable')
+        segundos, cierres = segundos[orden], cierres[orden]
+    conexion.execute(f'''INSERT OR REPLACE INTO {tabla} (ticker_id, dia, n, decimales, minutos, precios)
+                         VALUES (?, ?, ?, ?, ?, ?)''', (ticker_id, dia, len(segundos), *codificar(segundos, cierres)))
+    return segundos, cierres
+
+
+def _ultimos_por(segundos, cierres, paso, duracion):
+    """Último cierre de cada tramo de ``paso`` segundos, etiquetado con el inicio del tramo.
+
+    ``segundos`` son inicios de barras de ``duracion`` segundos; cada barra cuenta en el tramo en que termina.
+    """
+    tramos = np.minimum((segundos + duracion - 1) // paso, (SEGUNDOS_DIA - 1) // paso)
+    ultimos = np.flatnonzero(np.diff(tramos, append=tramos[-1] + 1))
+    return tramos[ultimos] * paso, cierres[ultimos]
+
+
+def guardar_barras(conexion, ticker_id, intervalo, datos):
+    """Guarda las barras ``Datetime`` (UTC) / ``Close`` de ``datos`` y sus agregados. Devuelve el número de barras."""
+    datos = datos.dropna(subset=['Close'])
+    if datos.empty:
+        return 0
+    instantes = pd.to_datetime(datos['Datetime']).values.astype('datetime64[s]').astype(np.int64)
+    cierres = datos['Close'].to_numpy(dtype=np.float64)
+    orden = np.argsort(instantes, kind='stable')
+    instantes, cierres = instantes[orden], cierres[orden]
+    # Barras repetidas en la descarga: se queda la última
+    unicas = np.flatnonzero(np.diff(instantes, append=instantes[-1] + 1))
+    instantes, cierres = instantes[unicas], cierres[unicas]
+
+    dias = instantes // SEGUNDOS_DIA
+    cortes = np.flatnonzero(np.diff(dias)) + 1
+    for tramo_instantes, tramo_cierres in zip(np.split(instantes, cortes), np.split(cierres, cortes)):
+        dia = int(tramo_instantes[0] // SEGUNDOS_DIA)
+        segundos, cierres_dia = tramo_instantes - dia * SEGUNDOS_DIA, tramo_cierres
+        # Las barras horarias nativas solo se guardan agregadas, con las mismas etiquetas que las demás
+        if intervalo != '1h':
+            segundos, cierres_dia = _fusionar_dia(conexion, nombre_particion(intervalo, dia), ticker_id, dia,
+                                                  segundos, cierres_dia)
+        _, cierres_horas = _fusionar_dia(conexion, nombre_particion('1h', dia), ticker_id, dia,
+                                         *_ultimos_por(segundos, cierres_dia, 3600, INTERVALOS[intervalo]))
+        conexion.execute('INSERT OR REPLACE INTO intradia_1d (ticker_id, dia, close) VALUES (?, ?, ?)',
+                         (ticker_id, dia, float(cierres_horas[-1])))
+    diagnostico.contar('intradia.barras_escritas', len(instantes))
+    return len(instantes)
+
+
+def cargar_barras(conexion, nombres, desde=None, hasta=None, resolucion='5m'):
+    """Barras de ``nombres`` en ``resolucion`` entre los instantes ``desde`` y ``hasta``.
+
+    Devuelve un DataFrame largo ``nombreTicker, fecha (datetime64, UTC), close`` ordenado por serie e instante,
+    como ``almacen.cargar_precios``.
+    """
+    nombres = list(nombres)
+    vacio = pd.DataFrame({'nombreTicker': [], 'fecha': pd.DatetimeIndex([]), 'close': []})
+    if not nombres:
+        return vacio
+    ids = dict(conexion.execute(f'''SELECT ticker_id, nombreTicker FROM series
+                                    WHERE nombreTicker IN ({','.join('?' * len(nombres))})''', nombres))
+    if not ids:
+        return vacio
+    desde_s = int(pd.Timestamp(desde).value // 10 ** 9) if desde is not None else None
+    hasta_s = int(pd.Timestamp(hasta).value // 10 ** 9) if hasta is not None else None
+    desde_dia = desde_s // SEGUNDOS_DIA if desde_s is not None else int(np.iinfo(np.int32).min)
+    hasta_dia = hasta_s // SEGUNDOS_DIA if hasta_s is not None else int(np.iinfo(np.int32).max)
+    marcadores = ','.join('?' * len(ids))
+
+    partes = []
+    with diagnostico.tramo('db.cargar_barras', series=len(ids), resolucion=resolucion):
+        if resolucion == '1d':
+            filas = conexion.execute(f'''SELECT ticker_id, dia, close FROM intradia_1d
+                                         WHERE ticker_id IN ({marcadores}) AND dia BETWEEN ? AND ?''',
+                                     (*ids, desde_dia, hasta_dia)).fetchall()
+            for ticker_id, dia, close in filas:
+                partes.append((ticker_id, np.array([dia * SEGUNDOS_DIA]), np.array([close])))
+        else:
+            for tabla in particiones(conexion, resolucion, desde_dia, hasta_dia):
+                filas = conexion.execute(f'''SELECT ticker_id, dia, decimales, minutos, precios FROM {tabla}
+                                             WHERE ticker_id IN ({marcadores}) AND dia BETWEEN ? AND ?''',
+                                         (*ids, desde_dia, hasta_dia)).fetchall()
+                for ticker_id, dia, *codificado in filas:
+                    segundos, cierres = decodificar(*codificado)
+                    partes.append((ticker_id, segundos + dia * SEGUNDOS_DIA, cierres))
+    if not partes:
+        return vacio
+
+    ticker_ids = np.concatenate([np.full(len(s), t) for t, s, _ in partes])
+    instantes = np.concatenate([s for _, s, _ in partes])
+    cierres = np.concatenate([c for _, _, c in partes])
+    dentro = np.ones(len(instantes), dtype=bool)
+    if desde_s is not None:
+        dentro &= instantes >= desde_s
+    if hasta_s is not None:
+        dentro &= instantes <= hasta_s
+    orden = np.lexsort((instantes[dentro], ticker_ids[dentro]))
+    diagnostico.contar('db.barras_leidas', int(dentro.sum()))
+    return pd.DataFrame({'nombreTicker': pd.Series(ticker_ids[dentro][orden]).map(ids).to_numpy(),
+                         'fecha': pd.DatetimeIndex(instantes[dentro][orden].astype('datetime64[s]')),
+                         'close': cierres[dentro][orden]})
+
+
+def disponibilidad(conexion):
+    """``{nombreTicker: {resolución: primer día (date)}}`` de las series con barras intradía."""
+    primeros = {}
+    for resolucion in ('1m', '5m', '1h'):
+        for tabla in particiones(conexion, resolucion):
+            for ticker_id, dia in conexion.execute(f'SELECT ticker_id, MIN(dia) FROM {tabla} GROUP BY ticker_id'):
+                primeros.setdefault(ticker_id, {}).setdefault(resolucion, dia)
+    if not primeros:
+        return {}
+    nombres = dict(conexion.execute('SELECT ticker_id, nombreTicker FROM series'))
+    return {nombres[ticker_id]: {resolucion: almacen.dia_a_fecha(dia) for resolucion, dia in por_resolucion.items()}
+            for ticker_id, por_resolucion in primeros.items() if ticker_id in nombres}
+
+
+def compactar(conexion, hoy=None, retencion=RETENCION):
+    """Aplica ``retencion``: borra las barras de más de N días de cada resolución.
+
+    Las particiones que quedan enteras fuera (o vacías) se borran con ``DROP TABLE``; en la del
+    límite se borran solo los días viejos. Los agregados horarios y diarios ya se escribieron al guardar,
+    así que lo borrado sigue disponible a una resolución menor. Devuelve las tablas borradas.
+    """
+    hoy_dia = almacen.fecha_a_dia(hoy or date.today())
+    borradas = []
+    for resolucion, dias in retencion.items():
+        corte = hoy_dia - dias
+        for tabla in particiones(conexion, resolucion, hasta_dia=corte - 1):
+            if rango_particion(tabla)[2] >= corte:
+                conexion.execute(f'DELETE FROM {tabla} WHERE dia < ?', (corte,))
+                if conexion.execute(f'SELECT 1 FROM {tabla} LIMIT 1').fetchone() is not None:
+                    continue
+            conexion.execute(f'DROP TABLE {tabla}')
+            borradas.append(tabla)
+    return borradas
+
+
+def ultimos_instantes(conexion, intervalo):
+    """``{ticker_id: Timestamp UTC}`` de la última barra descargada de ``intervalo``."""
+    return {ticker_id: pd.Timestamp(instante, unit='s', tz='UTC') for ticker_id, instante in conexion.execute(
+        'SELECT ticker_id, ultimo_instante FROM intradia_estado WHERE intervalo = ?', (intervalo,))}
+
+
+def ingerir(conexion, proveedor, df_tickers, intervalo='5m', errores=None):
+    """Descarga y guarda las barras nuevas de ``intervalo`` de las series de ``df_tickers`` y aplica la retención.
+
+    Devuelve ``{'barras': barras escritas, 'series': series con barras nuevas, 'borradas': particiones borradas}``.
+    """
+    if intervalo not in INTERVALOS:
+        raise ValueError(f"Intervalo intradía desconocido: {intervalo} ({', '.join(INTERVALOS)})")
+    inicializar_tabla(conexion)
+    ids = almacen.registrar_tickers(conexion, df_tickers)
+    ultimos = ultimos_instantes(conexion, intervalo)
+    peticiones = {ticker: ultimos.get(ticker_id) for ticker, ticker_id in ids.items()}
+
+    with diagnostico.tramo('intradia.descarga', series=len(peticiones), intervalo=intervalo):
+        descargadas = proveedor.barras(peticiones, intervalo, errores=errores)
+    barras = 0
+    with diagnostico.tramo('intradia.guardar', series=len(descargadas)):
+        for ticker, datos in descargadas.items():
+            escritas = guardar_barras(conexion, ids[ticker], intervalo, datos)
+            if escritas:
+                barras += escritas
+                ultimo = int(pd.to_datetime(datos['Datetime']).max().value // 10 ** 9)
+                conexion.execute('''INSERT OR REPLACE INTO intradia_estado (ticker_id, intervalo, ultimo_instante)
+                                    VALUES (?, ?, ?)''', (ids[ticker], intervalo, ultimo))
+    borradas = compactar(conexion)
+    return {'barras': barras, 'series': len(descargadas), 'borradas': borradas}
@@ -0,0 +1,354 @@
+"""Proveedores de cotizaciones para la ingesta de la base de datos.
+
+Un proveedor recibe un diccionario ``{ticker: fecha_inicio}`` (``None`` equivale a
+``period="max"``) y devuelve ``{ticker: DataFrame}`` con las columnas ``Date`` y
+``Close``. Los tickers que fallan o no traen datos nuevos no aparecen en el resultado; si
+se pasa un diccionario ``errores``, los que fallan tras agotar los reintentos quedan en él
+con el mensaje de error.
+
+Cada llamada fallida se reintenta ``reintentos`` veces con espera exponencial y jitter
+(``espera_backoff``), para que los fallos transitorios no cuesten un día de datos.
+
+``barras`` hace lo mismo con las barras intradía (``1m``, ``5m``, ``1h``): ``{ticker: instante
+de inicio}`` -> ``{ticker: DataFrame(Datetime, Close)}``, con ``Datetime`` en UTC sin zona.
+Yahoo solo da ``HISTORIA_INTRADIA`` días de cada intervalo; ``None`` pide todo lo que haya.
+Los instantes de inicio sin zona son UTC y se pasan al proveedor con zona: yfinance toma
+las fechas sin zona en la hora de la bolsa.
+"""
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from . import diagnostico
+
+# Días de historia que Yahoo sirve de cada intervalo intradía (1m: 7 días por petición)
+HISTORIA_INTRADIA = {'1m': 7, '5m': 60, '1h': 730}
+
+
+class LimitadorTasa:
+    """Cubo de fichas compartido entre hilos: ``llamadas_por_segundo`` sostenidas con ráfagas de ``rafaga``."""
+
+    def __init__(self, llamadas_por_segundo=None, rafaga=1):
+        self.llamadas_por_segundo = llamadas_por_segundo
+        self.rafaga = max(1, rafaga)
+        self._fichas = float(self.rafaga)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if not self.llamadas_por_segundo:
+            return
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.rafaga, self._fichas + (ahora - self._ultimo) * self.llamadas_por_segundo)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.llamadas_por_segundo
+            time.sleep(espera)
+
+
+def espera_backoff(intento, base, maximo=None):
+    """Segundos de espera antes del reintento ``intento`` (0, 1, 2...): ``base * 2**intento`` acotado por
+    ``maximo``, con jitter entre la mitad y el total para que los reintentos no lleguen todos a la vez."""
+    espera = base * 2 ** intento
+    if maximo is not None:
+        espera = min(espera, maximo)
+    return espera / 2 + random.uniform(0, espera / 2)
+
+
+def normalizar_historico(datos):
+    """Deja la salida de ``history()`` / ``download()`` como ``Date`` (sin zona horaria) + ``Close``."""
+    if datos is None or datos.empty or 'Close' not in datos:
+        return pd.DataFrame(columns=['Date', 'Close'])
+    df = datos[['Close']].dropna().reset_index()
+    df = df.rename(columns={df.columns[0]: 'Date'})
+    fechas = pd.to_datetime(df['Date'])
+    if fechas.dt.tz is not None:
+        fechas = fechas.dt.tz_localize(None)
+    df['Date'] = fechas.dt.normalize()
+    return df[['Date', 'Close']]
+
+
+def normalizar_intradia(datos):
+    """Deja la salida de ``history(interval=...)`` como ``Datetime`` (UTC, sin zona horaria) + ``Close``."""
+    if datos is None or datos.empty or 'Close' not in datos:
+        return pd.DataFrame(columns=['Datetime', 'Close'])
+    df = datos[['Close']].dropna().reset_index()
+    df = df.rename(columns={df.columns[0]: 'Datetime'})
+    instantes = pd.to_datetime(df['Datetime'])
+    if instantes.dt.tz is not None:
+        instantes = instantes.dt.tz_convert('UTC').dt.tz_localize(None)
+    df['Datetime'] = instantes
+    return df[['Datetime', 'Close']]
+
+
+def inicio_intradia(intervalo, start=None):
+    """``start`` acotado a la historia que da el proveedor para ``intervalo`` (``None`` = toda), en UTC con zona.
+
+    Un ``start`` sin zona se toma como UTC.
+    """
+    limite = pd.Timestamp.now(tz='UTC').normalize() - pd.Timedelta(days=HISTORIA_INTRADIA[intervalo] - 1)
+    if start is None:
+        return limite
+    start = pd.Timestamp(start)
+    start = start.tz_localize('UTC') if start.tz is None else start.tz_convert('UTC')
+    return max(start, limite)
+
+
+class ProveedorDatos:
+    """Interfaz base. Las subclases implementan ``historico``; ``historicos`` lo reparte en un pool de hilos acotado."""
+
+    def __init__(self, max_workers=8, llamadas_por_segundo=None, reintentos=2, espera_reintento=1.0):
+        self.max_workers = max(1, max_workers)
+        self.limitador = LimitadorTasa(llamadas_por_segundo, rafaga=self.max_workers)
+        self.reintentos = max(0, reintentos)
+        self.espera_reintento = espera_reintento
+
+    def historico(self, ticker, start=None):
+        raise NotImplementedError
+
+    def intradia(self, ticker, intervalo, start=None):
+        raise NotImplementedError
+
+    def _con_reintentos(self, descripcion, funcion):
+        """Ejecuta ``funcion`` respetando el limitador y reintentando con backoff. Si falla siempre, relanza el último error."""
+        for intento in range(self.reintentos + 1):
+            self.limitador.esperar()
+            try:
+                diagnostico.contar('red.llamadas')
+                return funcion()
+            except Exception as e:
+                if intento == self.reintentos:
+                    raise
+                diagnostico.contar('red.reintentos')
+                print(f"⚠️ Reintentando {descripcion} ({intento + 1}/{self.reintentos}): {e}")
+                time.sleep(espera_backoff(intento, self.espera_reintento))
+
+    def _historico_limitado(self, ticker, start, errores=None):
+        def descargar():
+            with diagnostico.tramo('red.historico', ticker=ticker, completo=start is None):
+                return normalizar_historico(self.historico(ticker, start=start))
+        try:
+            return self._con_reintentos(ticker, descargar)
+        except Exception as e:
+            print(f"❌ Error obteniendo datos para {ticker}: {e}")
+            if errores is not None:
+                errores[ticker] = str(e)
+            return None
+
+    def historicos(self, peticiones, errores=None):
+        if not peticiones:
+            return {}
+        tickers = list(peticiones)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tickers))) as pool:
+            frames = pool.map(lambda t: self._historico_limitado(t, peticiones[t], errores), tickers)
+            return {t: df for t, df in zip(tickers, frames) if df is not None and not df.empty}
+
+    def _barras_limitado(self, ticker, intervalo, start, errores=None):
+        def descargar():
+            with diagnostico.tramo('red.intradia', ticker=ticker, intervalo=intervalo):
+                return normalizar_intradia(self.intradia(ticker, intervalo, start=start))
+        try:
+            return self._con_reintentos(ticker, descargar)
+        except Exception as e:
+            print(f"❌ Error obteniendo barras {intervalo} para {ticker}: {e}")
+            if errores is not None:
+                errores[ticker] = str(e)
+            return None
+
+    def barras(self, peticiones, intervalo, errores=None):
+        if intervalo not in HISTORIA_INTRADIA:
+            raise ValueError(f"Intervalo intradía desconocido: {intervalo}")
+        if not peticiones:
+            return {}
+        tickers = list(peticiones)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tickers))) as pool:
+            frames = pool.map(lambda t: self._barras_limitado(t, intervalo, peticiones[t], errores), tickers)
+            return {t: df for t, df in zip(tickers, frames) if df is not None and not df.empty}
+
+
+class ProveedorYFinance(ProveedorDatos):
+    """Yahoo Finance vía yfinance.
+
+    ``modo="hilos"`` lanza un ``Ticker.history`` por ticker en el pool; ``modo="lote"`` agrupa
+    los tickers que comparten fecha de inicio y los pide con ``yf.download`` en lotes de ``tamano_lote``.
+    """
+
+    def __init__(self, max_workers=8, llamadas_por_segundo=None, modo="hilos", tamano_lote=50, **opciones):
+        super().__init__(max_workers=max_workers, llamadas_por_segundo=llamadas_por_segundo, **opciones)
+        if modo not in ("hilos", "lote"):
+            raise ValueError(f"Modo de descarga desconocido: {modo}")
+        self.modo = modo
+        self.tamano_lote = max(1, tamano_lote)
+
+    def historico(self, ticker, start=None):
+        import yfinance as yf
+        if start is None:
+            return yf.Ticker(ticker).history(period="max")
+        return yf.Ticker(ticker).history(start=start)
+
+    def intradia(self, ticker, intervalo, start=None):
+        import yfinance as yf
+        return yf.Ticker(ticker).history(interval=intervalo, start=inicio_intradia(intervalo, start))
+
+    def historicos(self, peticiones, errores=None):
+        if self.modo == "hilos":
+            return super().historicos(peticiones, errores)
+
+        grupos = {}
+        for ticker, start in peticiones.items():
+            grupos.setdefault(start, []).append(ticker)
+
+        resultado = {}
+        for start, tickers in grupos.items():
+            for i in range(0, len(tickers), self.tamano_lote):
+                lote = tickers[i:i + self.tamano_lote]
+
+                def descargar():
+                    with diagnostico.tramo('red.lote', tickers=len(lote), completo=start is None):
+                        return self._descargar_lote(lote, start)
+                try:
+                    frames = self._con_reintentos(f"lote {lote[0]}…{lote[-1]}", descargar)
+                except Exception as e:
+                    print(f"❌ Error descargando lote {lote[0]}…{lote[-1]}: {e}")
+                    if errores is not None:
+                        errores.update(dict.fromkeys(lote, str(e)))
+                    continue
+                resultado.update(frames)
+                # yf.download no lanza por ticker: los que no traen ninguna fila también son fallos
+                if errores is not None:
+                    errores.update({ticker: 'sin datos' for ticker in lote if ticker not in frames})
+        return resultado
+
+    def _descargar_lote(self, tickers, start):
+        import yfinance as yf
+        # yf.download no es seguro entre hilos (estado global), así que los lotes van en serie
+        # y la concurrencia la pone el propio yfinance con threads=max_workers.
+        opciones = dict(group_by="ticker", auto_adjust=True, progress=False,
+                        threads=min(self.max_workers, len(tickers)))
+        if start is None:
+            datos = yf.download(tickers, period="max", **opciones)
+        else:
+            datos = yf.download(tickers, start=start, **opciones)
+        if datos is None or datos.empty:
+            return {}
+
+        resultado = {}
+        for ticker in tickers:
+            if isinstance(datos.columns, pd.MultiIndex):
+                if ticker not in datos.columns.get_level_values(0):
+                    continue
+                df = normalizar_historico(datos[ticker])
+            else:
+                df = normalizar_historico(datos)
+            if not df.empty:
+                resultado[ticker] = df
+        return resultado
+
+
+class ProveedorFalso(ProveedorDatos):
+    """Proveedor local sin red: sirve ``frames`` enlatados o genera un paseo aleatorio determinista por ticker.
+
+    ``latencia`` (segundos) simula el coste de cada llamada; ``llamadas`` cuenta las peticiones servidas.
+    Los tickers de ``fallan`` lanzan siempre un error, para probar reintentos y backoff.
+    Como yfinance, ``intradia`` toma los ``start`` sin zona en la hora de la bolsa (``zona``).
+    """
+
+    def __init__(self, frames=None, latencia=0.0, inicio="2000-01-01", fallan=(), zona="America/New_York", **opciones):
+        super().__init__(**opciones)
+        self.zona = zona
+        self.frames = dict(frames or {})
+        self.fallan = set(fallan)
+        self.latencia = latencia
+        self.inicio = pd.Timestamp(inicio)
+        self.llamadas = 0
+        self._lock = threading.Lock()
+
+    def serie_sintetica(self, ticker):
+        # np.busday es mucho más rápido que pd.bdate_range para series largas
+        dias = np.arange(self.inicio.date(), datetime.today().date(), dtype='datetime64[D]')
+        fechas = pd.to_datetime(dias[np.is_busday(dias)])
+        rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+        close = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.012, len(fechas))))
+        return pd.DataFrame({'Date': fechas, 'Close': close})
+
+    def historico(self, ticker, start=None):
+        with self._lock:
+            self.llamadas += 1
+            df = self.frames.get(ticker)
+        if ticker in self.fallan:
+            raise ConnectionError(f"fallo simulado para {ticker}")
+        if df is None:
+            df = self.frames.setdefault(ticker, self.serie_sintetica(ticker))
+        if self.latencia:
+            time.sleep(self.latencia)
+        if start is not None:
+            df = df[pd.to_datetime(df['Date']) >= pd.Timestamp(start)]
+        return df.set_index('Date')
+
+    def barras_sinteticas(self, ticker, intervalo, dia):
+        # Sesión de 08:00 a 16:30 UTC; cada día es un paseo aleatorio determinista por ticker y día
+        paso = pd.Timedelta(intervalo.replace('m', 'min'))
+        instantes = pd.date_range(dia + pd.Timedelta(hours=8), dia + pd.Timedelta(hours=16, minutes=30), freq=paso,
+                                  inclusive='left')
+        rng = np.random.default_rng(zlib.crc32(f"{ticker}:{dia.date()}".encode()))
+        close = 100 * np.exp(rng.normal(0, 0.1) + np.cumsum(rng.normal(0, 0.0008 * np.sqrt(paso / pd.Timedelta('1min')),
+                                                                       len(instantes))))
+        return pd.DataFrame({'Datetime': instantes, 'Close': close})
+
+    def intradia(self, ticker, intervalo, start=None):
+        with self._lock:
+            self.llamadas += 1
+        if ticker in self.fallan:
+            raise ConnectionError(f"fallo simulado para {ticker}")
+        if self.latencia:
+            time.sleep(self.latencia)
+        if start is not None and pd.Timestamp(start).tz is None:
+            start = pd.Timestamp(start).tz_localize(self.zona)
+        inicio = inicio_intradia(intervalo, start).tz_localize(None)
+        ahora = pd.Timestamp.now(tz='UTC').tz_localize(None)
+        dias = pd.bdate_range(inicio.normalize(), ahora.normalize())
+        if not len(dias):
+            return pd.DataFrame(columns=['Close'])
+        df = pd.concat([self.barras_sinteticas(ticker, intervalo, dia) for dia in dias])
+        df = df[(df['Datetime'] >= inicio) & (df['Datetime'] <= ahora)]
+        return df.set_index(df['Datetime'].dt.tz_localize('UTC'))[['Close']]
+
+
+def medir_ingesta(proveedor, peticiones):
+    """Descarga ``peticiones`` con ``proveedor`` y devuelve los frames junto con sus métricas de rendimiento."""
+    t0 = time.perf_counter()
+    frames = proveedor.historicos(peticiones)
+    segundos = time.perf_counter() - t0
+    filas = sum(len(df) for df in frames.values())
+    metricas = {
+        'tickers': len(peticiones),
+        'tickers_con_datos': len(frames),
+        'filas': filas,
+        'segundos': segundos,
+        'tickers_por_segundo': len(peticiones) / segundos if segundos else float('inf'),
+    }
+    return frames, metricas
+
+
+PROVEEDORES = {
+    'yfinance': ProveedorYFinance,
+    'falso': ProveedorFalso,
+}
+
+
+def crear_proveedor(nombre='yfinance', **opciones):
+    """Instancia un proveedor por nombre (``yfinance`` o ``falso``)."""
+    try:
+        return PROVEEDORES[nombre](**opciones)
+    except KeyError:
+        raise ValueError(f"Proveedor desconocido: {nombre}") from None
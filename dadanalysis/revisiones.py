@@ -0,0 +1,149 @@
+"""Revisiones del proveedor: splits, dividendos y correcciones de cierres ya guardados.
+
+Yahoo ajusta hacia atrás los cierres de ``history()`` cuando hay un split o un dividendo,
+así que la historia guardada puede dejar de coincidir con la del proveedor. Para
+detectarlo sin descargarlo todo de nuevo, la sincronización pide cada ticker desde
+``SOLAPE_DIAS`` antes de su último cierre guardado y compara ese solape con lo guardado
+mediante sumas de control por tramos de ``RANGO_DIAS`` días, contados hacia atrás desde el
+último cierre:
+
+* Todo coincide: solo se guardan los días nuevos.
+* Solo cambia el tramo más reciente (p. ej. un cierre guardado a media sesión): es una
+  corrección de la cola, no una revisión. Se sobrescribe desde el primer día distinto y
+  no cuenta en ``revisiones``.
+* Cambia un tramo anterior: el ajuste puede venir de más atrás. Se descarga la historia
+  completa de ese ticker, se compara mes a mes con lo guardado y se reescribe desde el
+  primer mes distinto.
+
+Las sumas de control redondean los cierres a ``CIFRAS`` cifras significativas, para que el
+ruido de coma flotante entre descargas no cuente como revisión. El primer día reescrito
+entra en ``primer_dia_escrito`` de la sincronización, así que compuestos, conversiones y
+métricas derivadas se recalculan desde ahí. ``revisiones`` cuenta las revisiones de la
+historia de cada serie; los cierres sobrescritos, sean o no revisiones, quedan anotados en
+``reescrituras`` de ``almacen``, que es lo que mira la caché columnar.
+"""
+import time
+import zlib
+
+import numpy as np
+
+from . import almacen
+
+# Días naturales que se vuelven a pedir antes del último cierre guardado
+SOLAPE_DIAS = 14
+RANGO_DIAS = 7
+CIFRAS = 6
+
+
+def inicializar_tabla(conexion):
+    conexion.execute('''CREATE TABLE IF NOT EXISTS revisiones (
+                            ticker_id INTEGER PRIMARY KEY,
+                            numero INTEGER NOT NULL,
+                            desde_dia INTEGER NOT NULL,
+                            instante REAL NOT NULL)''')
+
+
+def cuantizar(cierres, cifras=CIFRAS):
+    """``(mantisas, exponentes)`` enteros de ``cierres`` redondeados a ``cifras`` cifras significativas."""
+    cierres = np.asarray(cierres, dtype=np.float64)
+    absolutos = np.abs(cierres)
+    exponentes = np.floor(np.log10(absolutos, out=np.zeros_like(absolutos), where=absolutos > 0))
+    mantisas = np.round(cierres / 10.0 ** (exponentes - cifras + 1))
+    return mantisas.astype(np.int64), exponentes.astype(np.int64)
+
+
+def sumas_por_rango(dias, cierres, rangos):
+    """``{rango: crc32}`` de los días y cierres cuantizados de cada rango (``rangos``, ordenado como ``dias``)."""
+    mantisas, exponentes = cuantizar(cierres)
+    sumas = {}
+    for rango in np.unique(rangos):
+        dentro = rangos == rango
+        bloque = np.stack([np.asarray(dias, dtype=np.int64)[dentro], mantisas[dentro], exponentes[dentro]])
+        sumas[int(rango)] = zlib.crc32(bloque.tobytes())
+    return sumas
+
+
+def rangos_distintos(guardados, nuevos, clave):
+    """Rangos (``clave(dias)``) cuyas sumas de control difieren entre ``guardados`` y ``nuevos`` (``(dias, cierres)``)."""
+    antes = sumas_por_rango(*guardados, clave(guardados[0]))
+    despues = sumas_por_rango(*nuevos, clave(nuevos[0]))
+    return sorted(r for r in antes.keys() | despues.keys() if antes.get(r) != despues.get(r))
+
+
+def _dias_cierres(datos):
+    datos = datos.dropna(subset=['Close'])
+    dias = almacen.fechas_a_dias(datos['Date'])
+    orden = np.argsort(dias, kind='stable')
+    return dias[orden], datos['Close'].to_numpy(dtype=np.float64)[orden]
+
+
+def _guardados(conexion, ticker_id, desde_dia):
+    filas = conexion.execute('''SELECT fecha, close FROM prices WHERE ticker_id = ? AND fecha >= ? AND close IS NOT NULL
+                                ORDER BY fecha''', (ticker_id, int(desde_dia))).fetchall()
+    datos = np.array(filas, dtype=np.float64).reshape(-1, 2)
+    return datos[:, 0].astype(np.int64), datos[:, 1]
+
+
+def comparar_solape(conexion, ticker_id, datos):
+    """Compara ``datos`` (``Date``/``Close`` desde antes del último cierre guardado) con lo guardado.
+
+    Devuelve ``(primer día a escribir o None, corrección, historia completa)``: ``corrección``
+    si ese día ya estaba guardado y ha cambiado (solo dentro del tramo más reciente), e
+    ``historia completa`` si ha cambiado un tramo anterior y hay que revisar la historia entera.
+    """
+    dias, cierres = _dias_cierres(datos)
+    if not len(dias):
+        return None, False, False
+    guardados = _guardados(conexion, ticker_id, dias[0])
+    if not len(guardados[0]):
+        return int(dias[0]), False, False
+    ultimo = int(guardados[0][-1])
+    nuevos = dias > ultimo
+    primero_nuevo = int(dias[nuevos][0]) if nuevos.any() else None
+
+    # Solo se compara hasta donde llegan los dos lados
+    hasta = min(ultimo, int(dias[-1]))
+    solape = dias <= hasta
+    distintos = rangos_distintos((guardados[0][guardados[0] <= hasta], guardados[1][guardados[0] <= hasta]),
+                                 (dias[solape], cierres[solape]), lambda d: (ultimo - d) // RANGO_DIAS)
+    if not distintos:
+        return primero_nuevo, False, False
+    if distintos[-1] > 0:
+        return primero_nuevo, False, True
+    # Tramo más reciente: se sobrescribe desde el primer día distinto
+    reciente = ultimo - RANGO_DIAS + 1
+    antes = (guardados[0] >= reciente) & (guardados[0] <= hasta)
+    ahora = solape & (dias >= reciente)
+    dias_distintos = rangos_distintos((guardados[0][antes], guardados[1][antes]), (dias[ahora], cierres[ahora]), lambda d: d)
+    return dias_distintos[0], True, False
+
+
+def revisar_historia(conexion, ticker_id, datos):
+    """Compara mes a mes la historia completa ``datos`` con lo guardado y reescribe desde el primer mes distinto.
+
+    Devuelve ``(primer día reescrito, filas escritas)``, o ``(None, 0)`` si todo coincide.
+    """
+    dias, cierres = _dias_cierres(datos)
+    if not len(dias):
+        return None, 0
+    guardados = _guardados(conexion, ticker_id, np.iinfo(np.int32).min)
+    distintos = rangos_distintos(guardados, (dias, cierres), lambda d: d.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64))
+    if not distintos:
+        return None, 0
+    desde = almacen.fecha_a_dia(np.datetime64(distintos[0], 'M').astype('datetime64[D]'))
+    return desde, reescribir(conexion, ticker_id, datos, desde)
+
+
+def reescribir(conexion, ticker_id, datos, desde_dia):
+    """Sustituye los cierres de ``ticker_id`` desde ``desde_dia`` por los de ``datos`` y anota la revisión.
+
+    Devuelve el número de filas escritas.
+    """
+    inicializar_tabla(conexion)
+    escritas = almacen.reescribir_precios(conexion, ticker_id, datos, desde_dia)
+    conexion.execute('''INSERT INTO revisiones (ticker_id, numero, desde_dia, instante) VALUES (?, 1, ?, ?)
+                        ON CONFLICT(ticker_id) DO UPDATE SET numero = numero + 1, desde_dia = excluded.desde_dia,
+                                                             instante = excluded.instante''',
+                     (ticker_id, int(desde_dia), time.time()))
+    return escritas
+
@@ -0,0 +1,190 @@
+"""API HTTP local, de solo lectura, sobre el almacén de precios: ``python -m dadanalysis servir``.
+
+    GET /series?tickers=SyP_500,^IBEX&desde=2020-01-01&hasta=2024-12-31&frecuencia=W&normalizar=1&divisa=EUR
+    GET /series?tickers=SyP_500&formato=arrow
+    GET /catalogo
+
+``/series`` devuelve ``consultas.obtener_series`` en JSON (``orient='split'`` de pandas:
+``columns``, ``index``, ``data``) o, con ``formato=arrow`` o ``Accept:
+application/vnd.apache.arrow.stream``, como stream IPC de Arrow (necesita ``pyarrow``).
+
+Las respuestas llevan ``ETag`` (versión de datos + consulta) y ``Last-Modified`` (última
+escritura de la sincronización). Una petición con ``If-None-Match`` o ``If-Modified-Since``
+al día recibe un 304 sin tocar las series, y las respuestas ya calculadas se guardan en
+memoria por versión de datos: repetir una consulta solo cuesta leer la marca de ``meta``.
+"""
+import hashlib
+import importlib.util
+import io
+import json
+import threading
+from collections import OrderedDict
+from email.utils import format_datetime, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from . import almacen, conexiones, diagnostico
+from .consultas import marca_datos, obtener_series
+
+PUERTO = 8765
+MAX_RESPUESTAS = 64
+
+TIPO_JSON = 'application/json'
+TIPO_ARROW = 'application/vnd.apache.arrow.stream'
+
+PARAMETROS = ('tickers', 'desde', 'hasta', 'frecuencia', 'normalizar', 'divisa')
+
+
+def leer_consulta(query):
+    """Parámetros de ``/series`` normalizados: el mismo diccionario para la misma consulta."""
+    valores = {clave: lista[-1] for clave, lista in parse_qs(query).items()}
+    desconocidos = set(valores) - set(PARAMETROS) - {'formato'}
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {', '.join(sorted(desconocidos))}")
+    tickers = [t.strip() for t in valores.get('tickers', '').split(',') if t.strip()]
+    if not tickers:
+        raise ValueError("Falta el parámetro tickers (separados por comas)")
+    return {
+        'tickers': tickers,
+        'desde': valores.get('desde') or None,
+        'hasta': valores.get('hasta') or None,
+        'frecuencia': valores.get('frecuencia', 'D').upper(),
+        'normalizar': valores.get('normalizar', '0').lower() in ('1', 'true', 'si', 'sí'),
+        'divisa': valores.get('divisa', '').upper() or None,
+    }
+
+
+def serializar(df, formato):
+    """``(cuerpo, content-type)`` del DataFrame en JSON o en un stream IPC de Arrow."""
+    if formato == 'arrow':
+        import pyarrow as pa
+        tabla = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+        salida = io.BytesIO()
+        with pa.ipc.new_stream(salida, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+        return salida.getvalue(), TIPO_ARROW
+    return df.to_json(orient='split', date_format='iso', date_unit='s').encode(), TIPO_JSON
+
+
+class ServidorSeries(ThreadingHTTPServer):
+    """Servidor HTTP con la caché de respuestas ``(versión, consulta, formato) -> (cuerpo, tipo)``."""
+
+    daemon_threads = True
+
+    def __init__(self, direccion, ruta_db=almacen.RUTA_DB, max_respuestas=MAX_RESPUESTAS):
+        super().__init__(direccion, ManejadorSeries)
+        self.ruta_db = ruta_db
+        self.max_respuestas = max_respuestas
+        self._respuestas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def marca(self):
+        with conexiones.lectura(self.ruta_db) as conexion:
+            return marca_datos(conexion)
+
+    def respuesta(self, clave, calcular):
+        with self._lock:
+            if clave in self._respuestas:
+                self._respuestas.move_to_end(clave)
+                diagnostico.contar('api.respuestas.aciertos', 1)
+                return self._respuestas[clave]
+        diagnostico.contar('api.respuestas.fallos', 1)
+        resultado = calcular()
+        with self._lock:
+            self._respuestas[clave] = resultado
+            # Las respuestas de versiones anteriores ya no se van a pedir
+            for vieja in [c for c in self._respuestas if c[0] != clave[0]]:
+                del self._respuestas[vieja]
+            while len(self._respuestas) > self.max_respuestas:
+                self._respuestas.popitem(last=False)
+        return resultado
+
+
+class ManejadorSeries(BaseHTTPRequestHandler):
+    server_version = 'DadAnalysis'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            if url.path == '/series':
+                self._series(url.query)
+            elif url.path == '/catalogo':
+                self._catalogo()
+            else:
+                self._error(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {url.path}")
+        except ValueError as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+
+    def _series(self, query):
+        consulta = leer_consulta(query)
+        formato = parse_qs(query).get('formato', [''])[-1].lower()
+        if not formato:
+            formato = 'arrow' if TIPO_ARROW in self.headers.get('Accept', '') else 'json'
+        if formato not in ('json', 'arrow'):
+            raise ValueError(f"Formato no soportado: {formato} (json o arrow)")
+        if formato == 'arrow' and importlib.util.find_spec('pyarrow') is None:
+            self._error(HTTPStatus.NOT_ACCEPTABLE, "El formato arrow necesita pyarrow instalado")
+            return
+
+        version, modificado = self.server.marca()
+        canonica = json.dumps(consulta, sort_keys=True)
+        etag = f'"{version}-{hashlib.sha1(f"{canonica}|{formato}".encode()).hexdigest()[:16]}"'
+        cabeceras = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept'}
+        if modificado is not None:
+            cabeceras['Last-Modified'] = format_datetime(modificado.replace(microsecond=0), usegmt=True)
+        if self._sin_cambios(etag, modificado):
+            diagnostico.contar('api.no_modificado', 1)
+            self._enviar(HTTPStatus.NOT_MODIFIED, b'', None, cabeceras)
+            return
+
+        def calcular():
+            with diagnostico.tramo('api.series', series=len(consulta['tickers']), formato=formato):
+                return serializar(obtener_series(ruta_db=self.server.ruta_db, **consulta), formato)
+
+        cuerpo, tipo = self.server.respuesta((version, canonica, formato), calcular)
+        self._enviar(HTTPStatus.OK, cuerpo, tipo, cabeceras)
+
+    def _catalogo(self):
+        with conexiones.lectura(self.server.ruta_db) as conexion:
+            filas = conexion.execute('SELECT ticker, nombreTicker FROM series ORDER BY nombreTicker').fetchall()
+        cuerpo = json.dumps([{'ticker': t, 'nombreTicker': n} for t, n in filas], ensure_ascii=False).encode()
+        self._enviar(HTTPStatus.OK, cuerpo, TIPO_JSON)
+
+    def _sin_cambios(self, etag, modificado):
+        # If-None-Match manda sobre If-Modified-Since (RFC 9110)
+        si_no_coincide = self.headers.get('If-None-Match')
+        if si_no_coincide is not None:
+            return si_no_coincide.strip() == '*' or etag in [e.strip() for e in si_no_coincide.split(',')]
+        si_modificado = self.headers.get('If-Modified-Since')
+        if si_modificado and modificado is not None:
+            try:
+                return modificado.replace(microsecond=0) <= parsedate_to_datetime(si_modificado)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _error(self, estado, mensaje):
+        self._enviar(estado, json.dumps({'error': mensaje}, ensure_ascii=False).encode(), TIPO_JSON)
+
+    def _enviar(self, estado, cuerpo, tipo, cabeceras=None):
+        self.send_response(estado)
+        if tipo:
+            self.send_header('Content-Type', tipo)
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        if estado != HTTPStatus.NOT_MODIFIED:
+            self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+def servir(host='127.0.0.1', puerto=PUERTO, ruta_db=almacen.RUTA_DB):
+    servidor = ServidorSeries((host, puerto), ruta_db=ruta_db)
+    print(f"🌐 Sirviendo {ruta_db} en http://{host}:{servidor.server_port} (Ctrl+C para parar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
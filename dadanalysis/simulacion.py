@@ -0,0 +1,240 @@
+"""Motor de backtesting para "💰 Inversión": muchas estrategias a la vez sobre la matriz de precios.
+
+Cada fila de ``escenarios`` (ver ``rejilla``) es una estrategia:
+
+* ``inicio``: fecha de la primera compra (se retrasa al primer día con precio de todos
+  los activos con peso).
+* ``pesos``: tupla con el peso de cada columna de la matriz (se normaliza a suma 1).
+* ``capital_inicial``: importe invertido el día de inicio.
+* ``aportacion`` / ``frecuencia_aportacion`` / ``num_aportaciones``: aportaciones
+  periódicas (``M`` mensual, ``Q`` trimestral, ``A`` anual, ``None`` ninguna) el primer
+  día hábil de cada periodo posterior al inicio; ``num_aportaciones = 0`` = sin límite.
+  Lump sum es ``capital_inicial`` sin aportaciones; DCA reparte el mismo importe.
+* ``rebalanceo``: vuelve a los pesos objetivo el primer día hábil de cada periodo
+  (``M``, ``Q``, ``A``) o nunca (``None``). Sin rebalanceo, cada aportación se reparte
+  según los pesos objetivo.
+* ``stop_loss``: si el valor cae esa fracción desde su máximo (stop dinámico), se vende
+  todo y la cartera queda en liquidez; las aportaciones siguientes se acumulan en efectivo.
+  ``0`` = sin stop.
+
+``simular`` evalúa todos los escenarios juntos. Entre dos días con eventos (inicio,
+aportación o rebalanceo de algún escenario) las posiciones no cambian, así que el valor de
+todos los escenarios en ese tramo es un producto de matrices ``posiciones @ precios.T``
+y el stop se busca en el tramo con un máximo acumulado vectorizado: el bucle de Python
+recorre eventos (~12 al año con frecuencia mensual), no días ni escenarios.
+Con ``procesos`` los barridos grandes se reparten en bloques entre varios procesos.
+"""
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import diagnostico
+from .analitica import DIAS_HABILES_ANIO
+
+FRECUENCIAS = {'M': 'Mensual', 'Q': 'Trimestral', 'A': 'Anual'}
+# Por debajo de este número de escenarios por proceso no compensa repartir el trabajo
+MIN_ESCENARIOS_POR_PROCESO = 200
+# Escenarios por bloque cuando no se piden las curvas: acota la memoria de las matrices (escenarios x días)
+TAMANO_BLOQUE = 500
+
+PARAMETROS = {
+    'inicio': None,
+    'pesos': None,
+    'capital_inicial': 10_000.0,
+    'aportacion': 0.0,
+    'frecuencia_aportacion': None,
+    'num_aportaciones': 0,
+    'rebalanceo': None,
+    'stop_loss': 0.0,
+}
+
+
+def rejilla(**valores):
+    """Producto cartesiano de los valores de cada parámetro: un escenario por combinación.
+
+    Cada argumento es un valor o una lista de valores de un parámetro de ``PARAMETROS``;
+    los que faltan toman el valor por defecto. ``pesos`` es siempre una lista de tuplas.
+    """
+    desconocidos = set(valores) - set(PARAMETROS)
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {', '.join(sorted(desconocidos))}")
+    listas = {}
+    for parametro, defecto in PARAMETROS.items():
+        valor = valores.get(parametro, defecto)
+        listas[parametro] = list(valor) if isinstance(valor, (list, np.ndarray, pd.Index)) else [valor]
+    return pd.DataFrame(list(itertools.product(*listas.values())), columns=list(listas))
+
+
+def primeros_dias(fechas, frecuencia):
+    """Máscara de los primeros días de cada periodo (``M``, ``Q``, ``A``) de ``fechas``; ``None`` = ninguno."""
+    marca = np.zeros(len(fechas), dtype=bool)
+    if frecuencia is None or pd.isna(frecuencia) or not len(fechas):
+        return marca
+    periodos = pd.DatetimeIndex(fechas).to_period({'M': 'M', 'Q': 'Q', 'A': 'Y'}[frecuencia]).asi8
+    marca[1:] = periodos[1:] != periodos[:-1]
+    return marca
+
+
+def _mascaras(fechas, codigos):
+    """``(S x T)`` booleana a partir de los códigos de frecuencia de cada escenario, sin repetir cálculos."""
+    codigos = [None if pd.isna(c) else c for c in codigos]
+    unicos = list(dict.fromkeys(codigos))
+    tabla = np.stack([primeros_dias(fechas, f) for f in unicos])
+    return tabla[[unicos.index(c) for c in codigos]]
+
+
+def _preparar(precios, fechas, escenarios):
+    T, N = precios.shape
+    # Sin pesos (None) = equiponderado
+    pesos = np.array([np.broadcast_to(np.asarray(p if isinstance(p, (tuple, list, np.ndarray)) else 1.0, dtype=np.float64), N)
+                      for p in escenarios['pesos']])
+    pesos = pesos / pesos.sum(axis=1, keepdims=True)
+
+    # Inicio: primer día >= fecha pedida en que todos los activos con peso tienen precio
+    disponible = np.maximum.accumulate(~np.isnan(precios), axis=0)
+    primer_dia = np.where(disponible.any(axis=0), disponible.argmax(axis=0), T)
+    primer_comun = np.where(pesos > 0, primer_dia[None, :], 0).max(axis=1)
+    pedido = np.array([0 if pd.isna(i) else np.searchsorted(fechas, pd.Timestamp(i).to_datetime64())
+                       for i in escenarios['inicio']], dtype=np.int64)
+    inicio = np.maximum(pedido, primer_comun)
+
+    dias = np.arange(T)
+    despues = dias[None, :] > inicio[:, None]
+    aporta = _mascaras(fechas, list(escenarios['frecuencia_aportacion'])) & despues
+    limite = escenarios['num_aportaciones'].to_numpy(dtype=np.int64)
+    aporta &= (np.cumsum(aporta, axis=1) <= limite[:, None]) | (limite[:, None] <= 0)
+    flujos = aporta * escenarios['aportacion'].to_numpy(dtype=np.float64)[:, None]
+    valido = inicio < T
+    flujos[valido, inicio[valido]] += escenarios['capital_inicial'].to_numpy(dtype=np.float64)[valido]
+    rebalancea = _mascaras(fechas, list(escenarios['rebalanceo'])) & despues
+    return pesos, inicio, flujos, rebalancea
+
+
+def simular(precios, escenarios, procesos=None, curvas=True):
+    """Evalúa ``escenarios`` sobre ``precios`` (DataFrame ``fecha x activo`` de ``analitica.cargar_matriz``).
+
+    Devuelve un diccionario con ``fechas``, la tabla ``estadisticas`` (una fila por escenario)
+    y, con ``curvas``, las matrices ``(escenarios x días)`` ``valor`` (NaN antes del inicio) y
+    ``aportado`` (aportaciones acumuladas). Sin curvas los escenarios se evalúan por bloques
+    de ``TAMANO_BLOQUE`` y la memoria no crece con el tamaño del barrido.
+    """
+    escenarios = escenarios.reset_index(drop=True)
+    matriz, fechas = precios.to_numpy(dtype=np.float64), precios.index.to_numpy()
+    procesos = max(1, min(procesos or 1, os.cpu_count() or 1, len(escenarios) // MIN_ESCENARIOS_POR_PROCESO))
+    num_bloques = procesos if curvas else max(procesos, math.ceil(len(escenarios) / TAMANO_BLOQUE))
+    bloques = [escenarios.iloc[b] for b in np.array_split(np.arange(len(escenarios)), num_bloques)]
+
+    with diagnostico.tramo('simulacion.simular', escenarios=len(escenarios), dias=len(precios), procesos=procesos):
+        if procesos == 1:
+            partes = [_simular(matriz, fechas, b, curvas) for b in bloques]
+        else:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                partes = list(pool.map(_simular, itertools.repeat(matriz), itertools.repeat(fechas),
+                                       bloques, itertools.repeat(curvas)))
+    resultado = {'fechas': pd.DatetimeIndex(fechas),
+                 'estadisticas': pd.concat([p['estadisticas'] for p in partes], ignore_index=True)}
+    if curvas:
+        for clave in ('valor', 'aportado'):
+            resultado[clave] = np.concatenate([p[clave] for p in partes])
+    return resultado
+
+
+def _simular(precios, fechas, escenarios, curvas=True):
+    escenarios = escenarios.reset_index(drop=True)
+    T, N = precios.shape
+    S = len(escenarios)
+    pesos, inicio, flujos, rebalancea = _preparar(precios, fechas, escenarios)
+    stop = escenarios['stop_loss'].to_numpy(dtype=np.float64)
+    # Antes del primer precio de un activo sin peso no importa su valor: 0 evita NaN en el producto
+    precios_0 = np.nan_to_num(precios)
+
+    eventos = np.flatnonzero((flujos != 0).any(axis=0) | rebalancea.any(axis=0))
+    eventos = np.union1d(eventos, inicio[inicio < T])
+    fronteras = np.append(eventos, T)
+
+    posiciones = np.zeros((S, N))
+    efectivo = np.zeros(S)
+    maximo = np.zeros(S)
+    parado = np.zeros(S, dtype=bool)
+    dia_stop = np.full(S, -1)
+    valor = np.full((S, T), np.nan)
+
+    for desde, hasta in zip(fronteras[:-1], fronteras[1:]):
+        p = precios_0[desde]
+        efectivo += flujos[:, desde]
+        activos = ~parado & (inicio <= desde)
+        # Rebalanceo: todo el patrimonio a los pesos objetivo; si no, solo se invierte el efectivo
+        reb = activos & rebalancea[:, desde]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            total = np.where(reb, posiciones @ p + efectivo, efectivo)
+            compra = np.where(p > 0, total[:, None] * pesos / p, 0.0)
+        posiciones = np.where(reb[:, None], compra, posiciones + np.where(activos[:, None], compra, 0.0))
+        efectivo = np.where(activos, 0.0, efectivo)
+
+        tramo = posiciones @ precios_0[desde:hasta].T + efectivo[:, None]     # (S x días del tramo)
+        con_stop = activos & (stop > 0)
+        if con_stop.any():
+            pico = np.maximum(np.maximum.accumulate(tramo, axis=1), maximo[:, None])
+            salta = con_stop[:, None] & (tramo < (1 - stop[:, None]) * pico)
+            hay = salta.any(axis=1)
+            if hay.any():
+                primero = salta.argmax(axis=1)
+                filas = np.flatnonzero(hay)
+                efectivo[filas] = tramo[filas, primero[filas]]
+                posiciones[filas] = 0.0
+                parado[filas] = True
+                dia_stop[filas] = desde + primero[filas]
+                columnas = np.arange(hasta - desde)
+                despues = hay[:, None] & (columnas[None, :] > primero[:, None])
+                tramo = np.where(despues, efectivo[:, None], tramo)
+        maximo = np.maximum(maximo, np.nanmax(tramo, axis=1))
+        valor[:, desde:hasta] = tramo
+
+    valor[np.arange(T)[None, :] < inicio[:, None]] = np.nan
+    aportado = np.cumsum(flujos, axis=1)
+    resultado = {'estadisticas': estadisticas(fechas, valor, aportado, inicio, dia_stop, escenarios)}
+    if curvas:
+        resultado.update(valor=valor, aportado=aportado)
+    return resultado
+
+
+def rendimientos(valor, aportado):
+    """Rendimientos diarios ponderados por tiempo: descuentan las aportaciones de cada día."""
+    r = np.full_like(valor, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r[:, 1:] = (valor[:, 1:] - np.diff(aportado, axis=1)) / valor[:, :-1] - 1
+    return r
+
+
+def estadisticas(fechas, valor, aportado, inicio, dia_stop, escenarios):
+    """Tabla por escenario: valor final, aportado, ganancia, TWR anualizada, volatilidad, máximo drawdown y Sharpe (sin tipo libre)."""
+    r = rendimientos(valor, aportado)
+    crecimiento = np.cumprod(1 + np.nan_to_num(r), axis=1)
+    T = valor.shape[1]
+    fechas = np.asarray(fechas)
+    inicio = np.minimum(inicio, T - 1)
+    anios = (fechas[-1] - fechas[inicio]) / np.timedelta64(1, 'D') / 365.25
+    with np.errstate(invalid='ignore', divide='ignore'):
+        twr = crecimiento[:, -1] ** (1 / anios) - 1
+        indice = np.where(np.isnan(valor), np.nan, crecimiento)
+        caida = np.nanmin(indice / np.fmax.accumulate(indice, axis=1) - 1, axis=1)
+        volatilidad = np.nanstd(r, axis=1, ddof=1) * np.sqrt(DIAS_HABILES_ANIO)
+        sharpe = np.nanmean(r, axis=1) * DIAS_HABILES_ANIO / volatilidad
+    final = valor[:, -1]
+    total_aportado = aportado[:, -1]
+    tabla = escenarios.reset_index(drop=True).copy()
+    tabla['inicio_efectivo'] = pd.DatetimeIndex(fechas[inicio])
+    tabla['valor_final'] = final
+    tabla['aportado'] = total_aportado
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tabla['ganancia'] = final / total_aportado - 1
+    tabla['twr_anualizada'] = twr
+    tabla['volatilidad'] = volatilidad
+    tabla['max_drawdown'] = caida
+    tabla['sharpe'] = sharpe
+    tabla['stop'] = pd.DatetimeIndex(np.where(dia_stop >= 0, fechas[np.maximum(dia_stop, 0)], np.datetime64('NaT')))
+    return tabla
@@ -0,0 +1,404 @@
+"""Sincronización de la base de datos con el proveedor de cotizaciones.
+
+La sincronización ya no se ejecuta al importar ``streamlit_app.py``: se lanza desde la
+línea de comandos (``python -m dadanalysis sync``) o desde ``RefrescoFondo``, un hilo
+compartido por todas las sesiones que la ejecuta como mucho una vez por día hábil.
+La marca de frescura queda en la tabla ``meta``:
+
+* ``dia_sincronizado``: último día hábil (ISO) completamente sincronizado.
+* ``ultima_sincronizacion``: instante (ISO) en que terminó la última sincronización.
+* ``version_datos``: contador que sube cada vez que se escriben filas nuevas.
+
+El estado de cada ticker queda en ``sync_status``: último intento, último éxito, errores
+seguidos, último error, próximo intento permitido y último día hábil completado. Con él:
+
+* Un ticker que falla no vuelve a pedirse hasta ``proximo_intento``, que se aleja con
+  backoff exponencial y jitter (de ``ESPERA_BASE`` hasta ``ESPERA_MAXIMA``); uno que nunca
+  ha descargado datos no repite la historia completa en cada arranque.
+* Una sincronización interrumpida (caída, kill o ``presupuesto`` agotado) se reanuda en la
+  siguiente sin volver a pedir los tickers ya completados ese día.
+
+Cada ticker se pide desde ``revisiones.SOLAPE_DIAS`` antes de su último cierre, y el solape
+se compara con lo guardado para detectar splits y dividendos ajustados hacia atrás
+(``dadanalysis/revisiones.py``): solo se reescribe la historia del ticker revisado. Un
+cambio en el tramo más reciente (un cierre guardado a media sesión) solo sobrescribe la
+cola, y compuestos, conversiones y métricas derivadas siguen desde el día corregido.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+
+from . import almacen, compuestos, conexiones, derivadas, diagnostico, divisas, revisiones
+from .consultas import incrementar_version_datos
+from .proveedores import espera_backoff
+
+# Tickers por lote de descarga: cada lote se guarda y confirma antes de seguir
+TAMANO_LOTE = 100
+
+# Backoff entre sincronizaciones de un ticker que falla: 15 minutos, 30, 1 hora... hasta una semana
+ESPERA_BASE = 15 * 60
+ESPERA_MAXIMA = 7 * 24 * 3600
+
+# Backoff de RefrescoFondo tras una sincronización entera fallida: 1 minuto, 2, 4... hasta 6 horas
+ESPERA_BASE_REFRESCO = 60
+ESPERA_MAXIMA_REFRESCO = 6 * 3600
+
+
+def inicializar_tabla(conexion):
+    conexion.execute('''CREATE TABLE IF NOT EXISTS sync_status (
+                            ticker_id INTEGER PRIMARY KEY,
+                            ultimo_intento REAL,
+                            ultimo_exito REAL,
+                            dia_completado INTEGER,
+                            errores INTEGER NOT NULL DEFAULT 0,
+                            ultimo_error TEXT,
+                            proximo_intento REAL)''')
+
+
+def leer_estado(conexion):
+    """``{ticker: (dia_completado, errores, proximo_intento)}`` de ``sync_status``."""
+    inicializar_tabla(conexion)
+    filas = conexion.execute('''SELECT s.ticker, e.dia_completado, e.errores, e.proximo_intento FROM sync_status e
+                                JOIN series s ON s.ticker_id = e.ticker_id''').fetchall()
+    return {ticker: (dia, errores, proximo) for ticker, dia, errores, proximo in filas}
+
+
+def registrar_exitos(conexion, ticker_ids, dia, ahora=None):
+    ahora = ahora or time.time()
+    conexion.executemany('''INSERT INTO sync_status (ticker_id, ultimo_intento, ultimo_exito, dia_completado, errores)
+                            VALUES (?, ?, ?, ?, 0)
+                            ON CONFLICT(ticker_id) DO UPDATE SET
+                                ultimo_intento = excluded.ultimo_intento, ultimo_exito = excluded.ultimo_exito,
+                                dia_completado = excluded.dia_completado, errores = 0,
+                                ultimo_error = NULL, proximo_intento = NULL''',
+                         [(ticker_id, ahora, ahora, dia) for ticker_id in ticker_ids])
+
+
+def registrar_errores(conexion, errores_por_id, ahora=None):
+    """Suma un error a cada ``ticker_id`` y aplaza su próximo intento con backoff y jitter."""
+    ahora = ahora or time.time()
+    previos = dict(conexion.execute(
+        f'SELECT ticker_id, errores FROM sync_status WHERE ticker_id IN ({",".join("?" * len(errores_por_id))})',
+        list(errores_por_id)).fetchall()) if errores_por_id else {}
+    filas = []
+    for ticker_id, mensaje in errores_por_id.items():
+        errores = previos.get(ticker_id, 0) + 1
+        proximo = ahora + espera_backoff(errores - 1, ESPERA_BASE, ESPERA_MAXIMA)
+        filas.append((ticker_id, ahora, errores, mensaje[:500], proximo))
+    conexion.executemany('''INSERT INTO sync_status (ticker_id, ultimo_intento, errores, ultimo_error, proximo_intento)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(ticker_id) DO UPDATE SET
+                                ultimo_intento = excluded.ultimo_intento, errores = excluded.errores,
+                                ultimo_error = excluded.ultimo_error, proximo_intento = excluded.proximo_intento''',
+                         filas)
+
+
+def dia_habil(hoy=None):
+    """Último día hábil (lunes a viernes) a fecha de ``hoy``."""
+    hoy = hoy or date.today()
+    while hoy.weekday() >= 5:
+        hoy -= timedelta(days=1)
+    return hoy
+
+
+def esta_al_dia(conexion, hoy=None):
+    sincronizado = almacen.leer_meta(conexion, 'dia_sincronizado')
+    return sincronizado is not None and sincronizado >= dia_habil(hoy).isoformat()
+
+
+def calcular_peticiones(conexion, tickers, hoy=None, reanudar=False, ignorar_backoff=False, ahora=None):
+    """``{ticker: fecha_inicio}`` para los tickers que necesitan datos (``None`` = historia completa).
+
+    Los tickers con historia se piden desde ``revisiones.SOLAPE_DIAS`` antes de su último
+    cierre, para comparar ese solape con lo guardado.
+
+    Se omiten los tickers en espera de reintento (salvo con ``ignorar_backoff``) y, con
+    ``reanudar``, los que ya completaron el día hábil de ``hoy``. Los que acumulan errores
+    van al final, para que no retrasen al resto.
+    """
+    hoy = hoy or date.today()
+    ahora = ahora or time.time()
+    dia = almacen.fecha_a_dia(dia_habil(hoy))
+    ultimas = almacen.ultimas_fechas(conexion)
+    estado = leer_estado(conexion)
+    peticiones = {}
+    for ticker in sorted(tickers, key=lambda t: estado.get(t, (None, 0, None))[1]):
+        dia_completado, _, proximo_intento = estado.get(ticker, (None, 0, None))
+        if not ignorar_backoff and proximo_intento is not None and proximo_intento > ahora:
+            continue
+        if reanudar and dia_completado is not None and dia_completado >= dia:
+            continue
+        ultima_fecha_en_db = ultimas.get(ticker)
+        if not ultima_fecha_en_db:
+            peticiones[ticker] = None
+            continue
+        if ultima_fecha_en_db + timedelta(days=1) > hoy:
+            continue
+        fecha_inicio = ultima_fecha_en_db - timedelta(days=revisiones.SOLAPE_DIAS)
+        peticiones[ticker] = fecha_inicio.strftime('%Y-%m-%d')
+    return peticiones
+
+
+def sin_registrar(conexion, df_tickers):
+    """Tickers de ``df_tickers`` que todavía no están en el catálogo ``series`` (p. ej. componentes recién importados)."""
+    registrados = {ticker for ticker, in conexion.execute('SELECT ticker FROM series')}
+    return [ticker for ticker in df_tickers['ticker'] if ticker not in registrados]
+
+
+def sincronizar(conexion, df_tickers, proveedor, hoy=None, **opciones):
+    """Descarga lo que falte de cada ticker de ``df_tickers`` y lo guarda. Devuelve un resumen."""
+    return sincronizar_por_fases(lambda: nullcontext(conexion), df_tickers, proveedor, hoy=hoy, **opciones)
+
+
+def lotes(peticiones, tamano_lote):
+    """Parte ``{ticker: fecha_inicio}`` en diccionarios de ``tamano_lote`` tickers como mucho."""
+    tickers = list(peticiones)
+    for i in range(0, len(tickers), max(1, tamano_lote)):
+        yield {ticker: peticiones[ticker] for ticker in tickers[i:i + tamano_lote]}
+
+
+def descargar_por_lotes(proveedor, peticiones, tamano_lote, seguir=None):
+    """Genera ``(lote, frames, errores)`` descargando el lote siguiente mientras se procesa el actual.
+
+    Cada lote se reparte entre los ``max_workers`` hilos del proveedor; con el lote siguiente
+    ya en vuelo, guardar un lote no deja la red parada. ``seguir`` (opcional) se consulta antes
+    de lanzar cada lote: si devuelve ``False`` no se lanzan más y se termina con los que ya
+    estaban en vuelo.
+    """
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='descarga') as pool:
+        pendiente = None
+        for numero, lote in enumerate(lotes(peticiones, tamano_lote)):
+            if seguir is not None and not seguir():
+                break
+            siguiente = pool.submit(_descargar_lote, proveedor, lote, numero)
+            if pendiente is not None:
+                yield pendiente.result()
+            pendiente = siguiente
+        if pendiente is not None:
+            yield pendiente.result()
+
+
+def _descargar_lote(proveedor, lote, numero):
+    errores = {}
+    with diagnostico.tramo('sync.descarga', lote=numero, peticiones=len(lote)):
+        frames = proveedor.historicos(lote, errores)
+    return lote, frames, errores
+
+
+def pedir_capitalizaciones(cache_info, df_tickers, limite=None):
+    """Pide ``marketCap`` de los bancos de los compuestos a ``cache_info``; solo van a la red los caducados.
+
+    Espera como mucho hasta ``limite`` (``time.monotonic``); lo que no llegue queda para la siguiente.
+    """
+    futuros = cache_info.lanzar(compuestos.miembros(df_tickers), campos=('marketCap',))
+    wait(futuros.values(), timeout=max(limite - time.monotonic(), 0) if limite is not None else None)
+
+
+def sincronizar_por_fases(escritura, df_tickers, proveedor, hoy=None, tamano_lote=TAMANO_LOTE, presupuesto=None,
+                          ignorar_backoff=False, cache_info=None, reanudar=None):
+    """Igual que ``sincronizar``, pero sin retener la conexión de escritura durante la descarga.
+
+    ``escritura`` devuelve un gestor de contexto con la conexión de escritura (p. ej.
+    ``GestorConexiones.escritura``); se pide antes de la descarga, después de cada lote y al
+    final, para que el resto de escrituras del proceso no esperen a la red.
+
+    Las peticiones se descargan en lotes de ``tamano_lote`` tickers y cada lote se guarda y
+    confirma en cuanto llega: la memoria no crece con el universo y una sincronización
+    interrumpida conserva lo ya guardado. Compuestos, series convertidas de divisa, métricas
+    derivadas y versión de datos se actualizan una sola vez, al final.
+
+    Con ``presupuesto`` (segundos de reloj) no se lanzan más lotes una vez agotado: se guarda
+    lo descargado, se actualizan compuestos y métricas y se sale sin marcar el día como
+    sincronizado, de modo que la siguiente sincronización continúa donde se quedó esta.
+
+    Los tickers cuyo solape no coincide con lo guardado más allá del último tramo se
+    descargan enteros después de los lotes, también en lotes y dentro del ``presupuesto``, y
+    se reescriben desde el primer mes distinto. No cuentan como completados hasta entonces.
+
+    Con ``cache_info`` (``info_tickers.CacheInfo``) se pide antes de los compuestos el
+    ``marketCap`` de sus bancos, para no depender de que alguien los haya consultado.
+
+    ``reanudar`` omite los tickers que ya completaron el día; por defecto solo se hace si el
+    día no está sincronizado (con el día hecho se vuelve a pedir todo, como ``sync --forzar``).
+    """
+    limite = time.monotonic() + presupuesto if presupuesto is not None else None
+    with escritura() as conexion, diagnostico.tramo('sync.peticiones'):
+        ids_por_ticker = almacen.registrar_tickers(conexion, df_tickers)
+        if reanudar is None:
+            reanudar = not esta_al_dia(conexion, hoy)
+        peticiones = calcular_peticiones(conexion, ids_por_ticker, hoy=hoy, reanudar=reanudar,
+                                         ignorar_backoff=ignorar_backoff)
+        conexion.commit()
+
+    dia = almacen.fecha_a_dia(dia_habil(hoy))
+    filas = 0
+    actualizados = 0
+    procesados = 0
+    fallidos = {}
+    primer_dia_escrito = {}
+    por_revisar = []
+    revisados = 0
+    seguir = (lambda: time.monotonic() < limite) if limite is not None else None
+    for lote, frames, errores in descargar_por_lotes(proveedor, peticiones, tamano_lote, seguir=seguir):
+        # Pedir la historia completa y no recibir nada también es un fallo: si no, el ticker
+        # repetiría la descarga más cara en cada sincronización
+        for ticker, inicio in lote.items():
+            if inicio is None and ticker not in frames and ticker not in errores:
+                errores[ticker] = 'sin datos'
+        with escritura() as conexion, diagnostico.tramo('sync.guardar', series=len(frames)):
+            for ticker, datos_close in frames.items():
+                ticker_id = ids_por_ticker[ticker]
+                desde, correccion, historia = revisiones.comparar_solape(conexion, ticker_id, datos_close)
+                if historia:
+                    por_revisar.append(ticker)
+                if desde is None:
+                    continue
+                if correccion:
+                    # Cierre corregido en el tramo más reciente: se sobrescribe la cola, no es una revisión
+                    escritas = almacen.reescribir_precios(conexion, ticker_id, datos_close, desde)
+                else:
+                    escritas = almacen.guardar_precios(conexion, ticker_id,
+                                                       datos_close[almacen.fechas_a_dias(datos_close['Date']) >= desde])
+                if escritas:
+                    filas += escritas
+                    primer_dia_escrito[ticker_id] = desde
+            # Los que esperan revisar su historia se completan cuando se revise
+            registrar_exitos(conexion, [ids_por_ticker[t] for t in lote if t not in errores and t not in por_revisar], dia)
+            registrar_errores(conexion, {ids_por_ticker[t]: mensaje for t, mensaje in errores.items()})
+            conexion.commit()
+        actualizados += len(frames)
+        procesados += len(lote)
+        fallidos.update(errores)
+    completa = procesados == len(peticiones)
+
+    # Revisiones que pueden venir de antes del solape: historia completa de esos tickers. Si la
+    # descarga falla o se acaba el presupuesto, el solape seguirá sin coincidir y se reintenta
+    # en la próxima sincronización
+    revisadas = 0
+    for lote, historias, errores in descargar_por_lotes(proveedor, dict.fromkeys(por_revisar), tamano_lote,
+                                                        seguir=seguir):
+        with escritura() as conexion, diagnostico.tramo('sync.revisiones', series=len(historias)):
+            for ticker, datos_close in historias.items():
+                ticker_id = ids_por_ticker[ticker]
+                desde, escritas = revisiones.revisar_historia(conexion, ticker_id, datos_close)
+                if desde is not None:
+                    revisados += 1
+                    filas += escritas
+                    primer_dia_escrito[ticker_id] = min(desde, primer_dia_escrito.get(ticker_id, desde))
+            registrar_exitos(conexion, [ids_por_ticker[t] for t in lote if t in historias], dia)
+            registrar_errores(conexion, {ids_por_ticker[t]: mensaje for t, mensaje in errores.items()})
+            conexion.commit()
+        revisadas += len(lote)
+        fallidos.update(errores)
+    completa = completa and revisadas == len(por_revisar)
+
+    if cache_info is not None:
+        with diagnostico.tramo('sync.capitalizaciones'):
+            pedir_capitalizaciones(cache_info, df_tickers, limite)
+
+    with escritura() as conexion:
+        # Compuestos de bancos por país y región: solo los días nuevos, salvo correcciones
+        with diagnostico.tramo('sync.compuestos'):
+            cambiados = compuestos.actualizar(conexion, df_tickers, desde_dia_por_ticker=primer_dia_escrito)
+        primer_dia_escrito.update(cambiados)
+
+        # Series convertidas a cada divisa base: solo los días nuevos cubiertos por los tipos de cambio
+        with diagnostico.tramo('sync.divisas'):
+            convertidas = divisas.actualizar(conexion, df_tickers, desde_dia_por_ticker=primer_dia_escrito)
+        primer_dia_escrito.update(convertidas)
+
+        # Métricas derivadas: de cada serie solo se calculan las filas posteriores a su estado guardado
+        with diagnostico.tramo('sync.derivadas'):
+            derivadas.actualizar(conexion, desde_dia_por_ticker=primer_dia_escrito)
+
+        if filas or cambiados or convertidas:
+            incrementar_version_datos(conexion)
+        if completa:
+            almacen.escribir_meta(conexion, 'dia_sincronizado', dia_habil(hoy).isoformat())
+        almacen.escribir_meta(conexion, 'ultima_sincronizacion', datetime.now().isoformat(timespec='seconds'))
+        conexion.commit()
+    return {'tickers': len(ids_por_ticker), 'peticiones': len(peticiones),
+            'actualizados': actualizados, 'filas': filas, 'revisados': revisados,
+            'compuestos': len(cambiados), 'convertidas': len(convertidas),
+            'fallidos': len(fallidos), 'pendientes': len(peticiones) - procesados, 'completa': completa}
+
+
+class RefrescoFondo:
+    """Sincroniza en un hilo aparte, como mucho una vez por día hábil y proceso.
+
+    ``df_tickers`` puede ser una función que devuelva el universo vigente (``universo.actual``):
+    se consulta en cada ``asegurar`` y, si ha cambiado desde la última sincronización, se
+    vuelve a sincronizar el mismo día para descargar los tickers nuevos.
+
+    ``crear_proveedor`` se invoca solo cuando hay que sincronizar, para no instanciar
+    clientes de red en los reruns en los que la base de datos ya está al día.
+    ``al_terminar`` (opcional) se llama tras una sincronización que ha escrito filas,
+    p. ej. para invalidar cachés de lectura.
+    Con ``presupuesto`` cada ejecución dura como mucho esos segundos (más el lote en vuelo);
+    si no termina, el día no se da por hecho y el siguiente ``asegurar`` continúa.
+    ``cache_info`` (opcional) se usa para pedir las capitalizaciones de los compuestos.
+    Si una ejecución falla entera, ``asegurar`` no relanza hasta ``reintentar_en``, que se
+    aleja con backoff exponencial mientras sigan los fallos.
+    """
+
+    def __init__(self, df_tickers, crear_proveedor, ruta_db=almacen.RUTA_DB, al_terminar=None, presupuesto=None,
+                 cache_info=None):
+        self.df_tickers = df_tickers
+        self.crear_proveedor = crear_proveedor
+        self.ruta_db = ruta_db
+        self.al_terminar = al_terminar
+        self.presupuesto = presupuesto
+        self.cache_info = cache_info
+        self.ultimo_dia = None
+        self.ultimo_resumen = None
+        self.ultimo_error = None
+        self.universo_sincronizado = None
+        self.fallos = 0
+        self.reintentar_en = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    @property
+    def en_curso(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def asegurar(self):
+        """Lanza la sincronización si hoy no se ha hecho todavía. No bloquea; devuelve si hay una en curso."""
+        hoy = dia_habil()
+        df_tickers = self.df_tickers() if callable(self.df_tickers) else self.df_tickers
+        with self._lock:
+            if (self.ultimo_dia == hoy and df_tickers is self.universo_sincronizado) or self.en_curso:
+                return self.en_curso
+            if self.reintentar_en is not None and time.monotonic() < self.reintentar_en:
+                return False
+            self._hilo = threading.Thread(target=self._ejecutar, args=(hoy, df_tickers), name='refresco-db', daemon=True)
+            self._hilo.start()
+            return True
+
+    def _ejecutar(self, hoy, df_tickers):
+        try:
+            gestor = conexiones.gestor(self.ruta_db)
+            with gestor.lectura() as conexion:
+                al_dia = esta_al_dia(conexion) and not sin_registrar(conexion, df_tickers)
+            completa, resumen = True, None
+            if not al_dia:
+                # Con el día ya hecho solo se descargan los tickers que no lo han completado (los nuevos)
+                resumen = sincronizar_por_fases(gestor.escritura, df_tickers, self.crear_proveedor(),
+                                                presupuesto=self.presupuesto, cache_info=self.cache_info, reanudar=True)
+                self.ultimo_resumen = resumen
+                completa = resumen['completa']
+            # Solo se avisa de lo que ha escrito esta ejecución
+            if self.al_terminar and resumen and (resumen['filas'] or resumen['compuestos'] or resumen['convertidas']):
+                self.al_terminar()
+            if completa:
+                self.ultimo_dia = hoy
+                self.universo_sincronizado = df_tickers
+            self.ultimo_error = None
+            self.fallos, self.reintentar_en = 0, None
+        except Exception as e:
+            self.ultimo_error = e
+            self.reintentar_en = time.monotonic() + espera_backoff(self.fallos, ESPERA_BASE_REFRESCO, ESPERA_MAXIMA_REFRESCO)
+            self.fallos += 1
+            print(f"❌ Error sincronizando la base de datos: {e}")
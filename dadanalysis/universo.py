@@ -0,0 +1,192 @@
+"""Universo de tickers de la app: índices de referencia, bancos por país y componentes de índices.
+
+* El universo base (índices y bancos) está en ``datos/universo.csv``, con las columnas
+  ``ticker, nombreTicker, tipo, pais, divisa``.
+* Los componentes de los índices (S&P 500, IBEX 35, DAX...) se guardan en la tabla
+  ``componentes(indice, ticker, nombreTicker)`` de la base de datos y se importan desde
+  un CSV con ``python -m dadanalysis componentes INDICE fichero.csv``.
+
+``cargar`` une las dos fuentes en un único ``df_tickers`` con las columnas ``ticker,
+nombreTicker, tipo, pais, indices, divisa`` (``tipo`` = ``indice``, ``banco``,
+``componente`` o ``divisa``; ``indices`` = índices a los que pertenece, separados por
+comas; ``divisa`` = divisa de cotización). Un componente que ya está en el universo base
+conserva su fila y solo suma el índice a ``indices``; la divisa de los demás se deduce del
+sufijo del ticker. Al final se añaden los pares de divisas que necesitan las conversiones
+de ``divisas.py``, que se sincronizan como cualquier otro ticker.
+
+``actual()`` devuelve el ``df_tickers`` de la base de datos por defecto y lo vuelve a cargar
+cuando cambian los componentes guardados (``version_componentes`` en ``meta``), así que una
+app en marcha ve los componentes importados después de arrancar. ``df_tickers``,
+``df_indices``, ``df_bancos`` y ``df_componentes`` se leen del mismo modo como atributos
+del módulo; quien los importa con ``from ... import`` se queda con la versión de ese momento.
+"""
+import os
+import re
+import threading
+from contextlib import nullcontext
+
+import pandas as pd
+
+from . import almacen, conexiones, divisas
+
+RUTA_UNIVERSO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos', 'universo.csv')
+
+COLUMNAS = ['ticker', 'nombreTicker', 'tipo', 'pais', 'indices', 'divisa']
+
+# Regiones de los índices compuestos de bancos (Finlandia está en la Eurozona y en los nórdicos)
+regiones_bancos = {
+    "Eurozona": ["Alemania", "Austria", "Bélgica", "Chipre", "Eslovenia", "España", "Finlandia", "Francia",
+                 "Grecia", "Italia", "Países Bajos"],
+    "Nórdicos": ["Dinamarca", "Finlandia", "Suecia"],
+    "Reino Unido y Suiza": ["Reino Unido", "Suiza"],
+    "USA": ["USA"],
+}
+
+# Nombres de columna aceptados al importar componentes (exportaciones de Wikipedia, de la web del índice...)
+SINONIMOS = {
+    'ticker': ('ticker', 'symbol', 'simbolo', 'símbolo'),
+    'nombreTicker': ('nombreticker', 'nombre', 'name', 'security', 'company', 'empresa'),
+}
+
+
+def inicializar_tabla(conexion):
+    conexion.execute('''CREATE TABLE IF NOT EXISTS componentes (
+                            indice TEXT NOT NULL,
+                            ticker TEXT NOT NULL,
+                            nombreTicker TEXT NOT NULL,
+                            PRIMARY KEY (indice, ticker))''')
+
+
+def leer_fichero(ruta=RUTA_UNIVERSO):
+    df = pd.read_csv(ruta, comment='#', dtype=str, keep_default_na=False)
+    df['pais'] = df['pais'].replace('', None)
+    df['indices'] = ''
+    return df[COLUMNAS]
+
+
+def nombre_serie(texto):
+    """``"Banco Santander, S.A."`` -> ``"Banco_Santander_S_A"``: el estilo de ``nombreTicker``."""
+    return re.sub(r'\W+', '_', str(texto)).strip('_')
+
+
+def leer_componentes(ruta, sufijo=''):
+    """Lee un CSV de componentes (``ticker`` y, opcionalmente, nombre) y devuelve ``ticker, nombreTicker``.
+
+    ``sufijo`` (p. ej. ``.MC``) se añade a los tickers que no lo llevan, para convertir los
+    símbolos de la bolsa en los de Yahoo.
+    """
+    df = pd.read_csv(ruta, dtype=str, keep_default_na=False)
+    columnas = {}
+    for destino, nombres in SINONIMOS.items():
+        for columna in df.columns:
+            if columna.strip().lower() in nombres:
+                columnas[destino] = columna
+                break
+    if 'ticker' not in columnas:
+        raise ValueError(f"{ruta}: falta la columna del ticker (una de {', '.join(SINONIMOS['ticker'])})")
+    tickers = df[columnas['ticker']].str.strip()
+    if sufijo:
+        tickers = tickers.where(tickers.str.endswith(sufijo), tickers + sufijo)
+    nombres = df[columnas['nombreTicker']] if 'nombreTicker' in columnas else tickers
+    resultado = pd.DataFrame({'ticker': tickers, 'nombreTicker': nombres.map(nombre_serie)})
+    resultado = resultado[resultado['ticker'] != '']
+    return resultado.drop_duplicates('ticker').reset_index(drop=True)
+
+
+def version_componentes(conexion):
+    """Contador de cambios de ``componentes`` (0 si nunca han cambiado o no hay tabla ``meta``)."""
+    existe = conexion.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='meta'").fetchone()
+    return int(almacen.leer_meta(conexion, 'version_componentes', 0)) if existe else 0
+
+
+def _incrementar_version(conexion):
+    conexion.execute('''INSERT INTO meta (clave, valor) VALUES ('version_componentes', '1')
+                        ON CONFLICT(clave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1''')
+
+
+def importar_componentes(conexion, indice, df):
+    """Sustituye los componentes de ``indice`` por las filas ``ticker, nombreTicker`` de ``df``."""
+    inicializar_tabla(conexion)
+    conexion.execute('DELETE FROM componentes WHERE indice = ?', (indice,))
+    conexion.executemany('INSERT INTO componentes (indice, ticker, nombreTicker) VALUES (?, ?, ?)',
+                         [(indice, t, n) for t, n in zip(df['ticker'], df['nombreTicker'])])
+    _incrementar_version(conexion)
+    return len(df)
+
+
+def borrar_componentes(conexion, indice):
+    inicializar_tabla(conexion)
+    borrados = conexion.execute('DELETE FROM componentes WHERE indice = ?', (indice,)).rowcount
+    _incrementar_version(conexion)
+    return borrados
+
+
+def cargar_componentes(conexion):
+    """``indice, ticker, nombreTicker`` de la tabla ``componentes`` (vacío si no existe)."""
+    existe = conexion.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='componentes'").fetchone()
+    if not existe:
+        return pd.DataFrame(columns=['indice', 'ticker', 'nombreTicker'])
+    filas = conexion.execute('SELECT indice, ticker, nombreTicker FROM componentes ORDER BY indice, ticker').fetchall()
+    return pd.DataFrame(filas, columns=['indice', 'ticker', 'nombreTicker'])
+
+
+def combinar(base, componentes):
+    """Une el universo base y los componentes (ver el docstring del módulo)."""
+    if componentes.empty:
+        return base.reset_index(drop=True)
+    indices = componentes.groupby('ticker', sort=False)['indice'].agg(','.join)
+    df = base.copy()
+    df['indices'] = df['ticker'].map(indices).fillna('')
+
+    nuevos = componentes.drop_duplicates('ticker')
+    nuevos = nuevos[~nuevos['ticker'].isin(df['ticker'])]
+    # nombreTicker identifica la serie en toda la app: si ya está cogido se le añade el ticker
+    usados = set(df['nombreTicker'])
+    nombres = []
+    for ticker, nombre in zip(nuevos['ticker'], nuevos['nombreTicker']):
+        if nombre in usados:
+            nombre = f"{nombre}_{nombre_serie(ticker)}"
+        usados.add(nombre)
+        nombres.append(nombre)
+    nuevos = pd.DataFrame({'ticker': nuevos['ticker'], 'nombreTicker': nombres, 'tipo': 'componente',
+                           'pais': None, 'indices': nuevos['ticker'].map(indices),
+                           'divisa': nuevos['ticker'].map(divisas.por_sufijo)})
+    return pd.concat([df, nuevos], ignore_index=True)[COLUMNAS]
+
+
+def cargar(conexion=None, ruta=RUTA_UNIVERSO):
+    """``df_tickers``: universo base de ``ruta``, componentes guardados en ``conexion`` y pares de divisas."""
+    df = leer_fichero(ruta)
+    if conexion is not None:
+        df = combinar(df, cargar_componentes(conexion))
+    return pd.concat([df, divisas.pares(df)], ignore_index=True)[COLUMNAS]
+
+
+_cargados = {}
+_lock = threading.Lock()
+
+
+def _vigentes():
+    """Universo por defecto (``df_tickers`` y sus subconjuntos), recargado si ha cambiado ``version_componentes``."""
+    # Con el pool de lectura compartido; si la base de datos no existe todavía no se crea aquí
+    existe = os.path.exists(almacen.RUTA_DB)
+    with conexiones.lectura(almacen.RUTA_DB) if existe else nullcontext() as conexion, _lock:
+        version = version_componentes(conexion) if conexion is not None else None
+        if not _cargados or _cargados['version'] != version:
+            df = cargar(conexion)
+            _cargados.clear()
+            _cargados.update(version=version, df_tickers=df)
+            for tipo, clave in (('indice', 'df_indices'), ('banco', 'df_bancos'), ('componente', 'df_componentes')):
+                _cargados[clave] = df[df['tipo'] == tipo].reset_index(drop=True)
+        return dict(_cargados)
+
+
+def actual():
+    """``df_tickers`` de la base de datos por defecto; el mismo objeto mientras no cambien los componentes."""
+    return _vigentes()['df_tickers']
+
+
+def __getattr__(nombre):
+    if nombre not in ('df_tickers', 'df_indices', 'df_bancos', 'df_componentes'):
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    return _vigentes()[nombre]
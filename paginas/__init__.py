@@ -0,0 +1,22 @@
+"""Páginas de la app.
+
+Cada página vive en su propio módulo y ``cargar`` lo importa la primera vez que se abre,
+así que el arranque solo paga las dependencias (Plotly, analítica...) de la página
+visible y los reruns siguientes no vuelven a importar nada.
+"""
+import importlib
+
+# Página -> (módulo, función que la dibuja)
+PAGINAS = {
+    "📈 Gráficar": ("paginas.graficar", "mostrar"),
+    "📊 Estudio Índices": ("paginas.estudio_indices", "mostrar"),
+    "💰 Inversión": ("paginas.inversion", "mostrar"),
+    "🧑🏻‍🤝‍🧑🏽 Estudio Países": ("paginas.estudio_compuestos", "mostrar_paises"),
+    "🗺️ Estudio Regiones": ("paginas.estudio_compuestos", "mostrar_regiones"),
+}
+
+
+def cargar(pagina):
+    """La función que dibuja ``pagina``."""
+    modulo, funcion = PAGINAS[pagina]
+    return getattr(importlib.import_module(modulo), funcion)
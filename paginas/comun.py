@@ -0,0 +1,46 @@
+"""Recursos compartidos por las páginas: uno por proceso, vía ``st.cache_resource``."""
+import os
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from dadanalysis import universo
+
+
+# La sincronización no bloquea los reruns: un único hilo por proceso (compartido entre
+# sesiones) actualiza la base de datos como mucho una vez por día hábil. También se puede
+# lanzar a mano con `python -m dadanalysis sync`.
+# DAD_PROVEEDOR=falso permite arrancar la app sin red con datos sintéticos
+# DAD_WORKERS fija las descargas en paralelo de cada lote de la sincronización (8 por defecto)
+# DAD_PRESUPUESTO limita (en segundos) cada tanda de sincronización; lo pendiente sigue en el siguiente rerun
+# DAD_COLUMNAR=1 lee los cierres diarios de la caché columnar mapeada en memoria
+@st.cache_resource
+def obtener_cache_series():
+    from dadanalysis.columnar import AlmacenColumnar
+    from dadanalysis.consultas import CacheSeries
+    columnar = AlmacenColumnar() if os.environ.get('DAD_COLUMNAR') == '1' else None
+    return CacheSeries(columnar=columnar)
+
+
+@st.cache_resource
+def obtener_refresco():
+    from dadanalysis.proveedores import crear_proveedor
+    from dadanalysis.sincronizacion import RefrescoFondo
+    return RefrescoFondo(universo.actual, lambda: crear_proveedor(os.environ.get('DAD_PROVEEDOR', 'yfinance'), max_workers=int(os.environ.get('DAD_WORKERS', 8))),
+                         al_terminar=obtener_cache_series().invalidar,
+                         presupuesto=float(os.environ['DAD_PRESUPUESTO']) if os.environ.get('DAD_PRESUPUESTO') else None,
+                         cache_info=obtener_cache_info())
+
+
+# Caché de Ticker.info compartida por todas las sesiones del proceso
+@st.cache_resource
+def obtener_cache_info():
+    from dadanalysis.info_tickers import OBTENEDORES, CacheInfo
+    return CacheInfo(obtener=OBTENEDORES[os.environ.get('DAD_PROVEEDOR', 'yfinance')])
+
+
+def desde_periodo(periodo):
+    anios_periodo = {"1 Año": 1, "5 Años": 5, "10 Años": 10}
+    if periodo in anios_periodo:
+        return (datetime.today() - timedelta(days=anios_periodo[periodo] * 365)).date()
+    return None
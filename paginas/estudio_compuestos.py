@@ -0,0 +1,76 @@
+"""🧑🏻‍🤝‍🧑🏽 Estudio Países y 🗺️ Estudio Regiones: índices compuestos de bancos."""
+import plotly.graph_objects as go
+import streamlit as st
+
+from dadanalysis import analitica, compuestos, conexiones
+from dadanalysis.graficos import clase_trazo
+from dadanalysis.universo import df_tickers, regiones_bancos
+from paginas.comun import desde_periodo, obtener_cache_series
+
+
+# Los compuestos de bancos por país y región se calculan al sincronizar (dadanalysis/compuestos.py)
+# y se guardan como series normales: estas páginas solo leen unas pocas series ya calculadas
+df_compuestos = compuestos.definiciones(df_tickers)
+
+
+@st.cache_data(max_entries=16)
+def cargar_matriz_compuestos(nombres, desde, version):
+    with conexiones.lectura() as conexion:
+        return analitica.cargar_matriz(conexion, nombres, desde=desde, columnar=obtener_cache_series().columnar)
+
+
+def estudio_compuestos(titulo, ambito, por_defecto):
+    cache_series = obtener_cache_series()
+    st.markdown(f"<div class='title'>{titulo}</div>", unsafe_allow_html=True)
+    definiciones = df_compuestos[df_compuestos['ambito'] == ambito]
+    grupos = list(dict.fromkeys(definiciones['grupo']))
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        elegidos = st.multiselect("Grupos", grupos, default=[g for g in por_defecto if g in grupos], key=f"grupos_{ambito}")
+    with col2:
+        ponderacion = st.radio("Ponderación", list(compuestos.PONDERACIONES), format_func=compuestos.PONDERACIONES.get,
+                               horizontal=True, key=f"ponderacion_{ambito}")
+    with col3:
+        periodo = st.selectbox("Periodo", ["1 Año", "5 Años", "10 Años", "Todos los tiempos"], index=1, key=f"periodo_{ambito}")
+
+    if not elegidos:
+        st.info("Selecciona al menos un grupo.")
+        return
+
+    seleccion = definiciones[(definiciones['ponderacion'] == ponderacion) & definiciones['grupo'].isin(elegidos)]
+    matriz = cargar_matriz_compuestos(tuple(seleccion['nombreTicker']), desde_periodo(periodo), cache_series.version())
+    if matriz.empty:
+        st.info("Todavía no hay compuestos calculados: se generan en la próxima sincronización o con `python -m dadanalysis compuestos`.")
+        return
+    matriz = matriz.rename(columns=dict(zip(seleccion['nombreTicker'], seleccion['grupo'])))
+
+    # Base 100 al inicio del periodo elegido
+    base = matriz.bfill().iloc[0]
+    Trazo = clase_trazo(matriz.size)
+    fig = go.Figure()
+    for grupo in matriz.columns:
+        fig.add_trace(Trazo(x=matriz.index, y=matriz[grupo] / base[grupo] * 100, mode='lines', name=grupo))
+    fig.update_layout(yaxis_title="Base 100", hovermode="x unified")
+    st.plotly_chart(fig, key=f"compuestos_{ambito}")
+
+    tabla = analitica.resumen(matriz)
+    st.dataframe(tabla.style.format("{:.2%}"))
+
+    if len(matriz.columns) > 1:
+        st.markdown("#### Correlación de rendimientos diarios")
+        correlacion = analitica.correlaciones(analitica.rendimientos_log(matriz.to_numpy()))
+        fig_corr = go.Figure(go.Heatmap(z=correlacion, x=list(matriz.columns), y=list(matriz.columns),
+                                        zmin=-1, zmax=1, colorscale="RdBu"))
+        st.plotly_chart(fig_corr, key=f"correlaciones_{ambito}")
+
+    with st.expander("Composición"):
+        for fila in seleccion.itertuples():
+            st.markdown(f"**{fila.grupo}**: {', '.join(n.replace('_', ' ') for n in fila.componentes)}")
+
+
+def mostrar_paises():
+    estudio_compuestos("🧑🏻‍🤝‍🧑🏽 Estudio Países", "pais", ["España", "Italia", "Francia", "Alemania", "USA"])
+
+def mostrar_regiones():
+    estudio_compuestos("🗺️ Estudio Regiones", "region", list(regiones_bancos))
@@ -0,0 +1,76 @@
+"""📊 Estudio Índices: rentabilidad, volatilidad, drawdown, betas y correlaciones del universo."""
+import plotly.graph_objects as go
+import streamlit as st
+
+from dadanalysis import analitica, conexiones, derivadas
+from dadanalysis.universo import df_indices, df_tickers
+from paginas.comun import desde_periodo, obtener_cache_series
+
+
+# Los componentes de índices (y los pares de divisas) no entran en el estudio: con más de
+# mil series la tabla y la matriz de correlaciones dejarían de ser legibles
+df_estudio = df_tickers[df_tickers['tipo'].isin(['indice', 'banco'])]
+
+
+# La matriz alineada de todo el universo se cachea por fecha de inicio y versión de datos:
+# las métricas se recalculan en NumPy sobre ella en milisegundos
+@st.cache_data(max_entries=8)
+def cargar_matriz_estudio(desde, version):
+    with conexiones.lectura() as conexion:
+        return analitica.cargar_matriz(conexion, df_estudio['nombreTicker'], desde=desde, columnar=obtener_cache_series().columnar)
+
+
+@st.cache_data(max_entries=16)
+def cargar_metrica_estudio(columna, desde, version):
+    with conexiones.lectura() as conexion:
+        return derivadas.cargar_metrica(conexion, df_indices['nombreTicker'], columna, desde=desde)
+
+
+def mostrar():
+    cache_series = obtener_cache_series()
+    st.markdown("<div class='title'>📊 Estudio Índices</div>", unsafe_allow_html=True)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        referencia = st.selectbox("Índice de referencia (beta)", ["SyP_500", "Eurostoxx600"])
+    with col2:
+        periodo = st.selectbox("Periodo", ["1 Año", "5 Años", "10 Años", "Todos los tiempos"], index=1)
+    with col3:
+        ventana = st.selectbox("Ventana de volatilidad (días)", [20, 60, 250])
+
+    desde_estudio = desde_periodo(periodo)
+
+    matriz = cargar_matriz_estudio(desde_estudio, cache_series.version())
+
+    if matriz.empty:
+        st.info("Todavía no hay datos en la base de datos.")
+    else:
+        tabla = analitica.resumen(matriz, referencia=referencia, ventana_volatilidad=ventana)
+        st.dataframe(tabla.style.format("{:.2%}", subset=[c for c in tabla.columns if not c.startswith("Beta")])
+                                .format("{:.2f}", subset=[c for c in tabla.columns if c.startswith("Beta")]))
+
+        rendimientos = analitica.rendimientos_log(matriz.to_numpy())
+
+        st.markdown("#### Correlación de rendimientos diarios")
+        correlacion = analitica.correlaciones(rendimientos)
+        fig_corr = go.Figure(go.Heatmap(z=correlacion, x=list(matriz.columns), y=list(matriz.columns),
+                                        zmin=-1, zmax=1, colorscale="RdBu"))
+        fig_corr.update_layout(height=800)
+        st.plotly_chart(fig_corr, key="correlaciones")
+
+        # Volatilidad y drawdown se leen ya calculados de la tabla de métricas derivadas
+        st.markdown(f"#### Volatilidad móvil {ventana} días (índices)")
+        volatilidad = cargar_metrica_estudio(f"vol{ventana}", desde_estudio, cache_series.version())
+        fig_vol = go.Figure()
+        for nombre in volatilidad.columns:
+            fig_vol.add_trace(go.Scattergl(x=volatilidad.index, y=volatilidad[nombre], mode='lines', name=nombre))
+        fig_vol.update_layout(yaxis_tickformat=".0%", hovermode="x unified")
+        st.plotly_chart(fig_vol, key="volatilidad")
+
+        st.markdown("#### Drawdown desde máximos (índices)")
+        caidas = cargar_metrica_estudio("drawdown", desde_estudio, cache_series.version())
+        fig_dd = go.Figure()
+        for nombre in caidas.columns:
+            fig_dd.add_trace(go.Scattergl(x=caidas.index, y=caidas[nombre], mode='lines', name=nombre))
+        fig_dd.update_layout(yaxis_tickformat=".0%", hovermode="x unified")
+        st.plotly_chart(fig_dd, key="drawdown")
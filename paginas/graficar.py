@@ -0,0 +1,358 @@
+"""📈 Gráficar: evolución de precios de las series seleccionadas y sus datos financieros clave."""
+import time
+from datetime import datetime, timedelta
+
+import plotly.graph_objects as go
+import streamlit as st
+
+from dadanalysis import diagnostico, divisas, universo
+from dadanalysis.graficos import PUNTOS_POR_TRAZO, clase_trazo, elegir_frecuencia
+from dadanalysis.info_tickers import TIMEOUT_INFO
+from dadanalysis.intradia import INTERVALOS
+from paginas.comun import obtener_cache_info, obtener_cache_series
+from paginas.selector import seleccionar_series
+
+
+def mostrar():
+    cache_series = obtener_cache_series()
+    cache_info = obtener_cache_info()
+    df_tickers = universo.actual()
+
+    st.markdown("""
+    <style>
+    /* Compactar títulos dentro del expander */
+    .streamlit-expanderHeader {
+        font-size: 15px !important;
+        padding: 0.3rem 0.5rem !important;
+    }
+    
+    /* Compactar márgenes y tamaño del nombre del país */
+    div[data-testid="stMarkdownContainer"] p {
+        font-size: 13px !important;
+        margin: 0.1rem 0 0.1rem 0 !important;
+    }
+    
+    /* Ajustar márgenes generales de títulos */
+    h1, h2, h3, h4, h5, h6 {
+        margin-top: 0.2rem !important;
+        margin-bottom: 0.2rem !important;
+        font-size: 14px !important;
+    }
+    
+    /* Reducir espacio vertical de los checkboxes */
+    div[data-testid="stCheckbox"] {
+        padding-top: 0rem !important;
+        padding-bottom: 0rem !important;
+        margin-top: -0.2rem !important;
+        margin-bottom: -0.2rem !important;
+    }
+    
+    /* Separadores finos */
+    hr {
+        margin: 0.3rem 0 !important;
+        border: none;
+        border-top: 1px solid #333;
+    }
+    
+    /* Compactar expander en general */
+    section[role="region"] > div {
+        padding-top: 0.3rem !important;
+        padding-bottom: 0.3rem !important;
+    }
+    </style>
+    """, unsafe_allow_html=True)
+
+
+    # Índices, bancos y componentes de índices: búsqueda y páginas en lugar de una casilla por ticker
+    selected_tickers = seleccionar_series(df_tickers)
+    simbolos = df_tickers.set_index('nombreTicker')['ticker']
+    # La divisa de cotización viene del universo: el gráfico ya no espera a .info
+    monedas = df_tickers.set_index('nombreTicker')['divisa']
+
+    # .info de todas las series seleccionadas a la vez y en segundo plano: los boxes se van
+    # rellenando según llegan
+    futuros_info = cache_info.lanzar([simbolos[nombre] for nombre in selected_tickers])
+    limite_info = time.monotonic() + TIMEOUT_INFO
+    # Aplicamos CSS para cambiar el color de fondo de los contenedores
+    st.markdown(
+        """
+        <style>
+        /* Obtener el color primario del tema */
+        :root {
+            --primary-color: #2BA846; /* Color principal definido en config.toml */
+            --primary-color-dark: #168F40; /* Versión más oscura al pasar el ratón */
+            --text-color: white; /* Color del texto */
+        }
+
+        /* Estilo para los botones */
+        .stButton>button {
+            background-color: var(--primary-color);
+            color: var(--text-color);
+            border-radius: 5px;
+            border: none;
+            padding: 10px 20px;
+            cursor: pointer;
+            transition: background-color 0.3s ease;
+        }
+
+        /* Cambio de color al pasar el ratón */
+        .stButton>button:hover {
+            background-color: var(--primary-color-dark);
+            color: var(--text-color); /* Mantener el texto en blanco */
+        }
+        </style>
+        """,
+        unsafe_allow_html=True
+    )
+
+
+    # Crear las columnas para los botones de selección de tipo de gráfico
+    col1, col2, col3 = st.columns(3)
+
+    # Inicializar la opción de gráfico si no está definida
+    if 'graph_option' not in st.session_state:
+        st.session_state.graph_option = 'Gráfico Lineal'
+
+    # Botón para "Gráfico Lineal"
+    with col1:
+        if st.button('Gráfico Lineal'):
+            st.session_state.graph_option = 'Gráfico Lineal'
+
+    # Botón para "Gráfico de Índices"
+    with col2:
+        if st.button('Gráfico de Índices'):
+            st.session_state.graph_option = 'Gráfico de Índices'
+
+    # Divisa del gráfico: las series convertidas ya están materializadas (dadanalysis/divisas.py)
+    with col3:
+        divisa_grafico = st.selectbox("Divisa", ["Original", *divisas.BASES], key="divisa_grafico")
+
+    # Inicializar start_date si no está definido
+    if 'start_date' not in st.session_state:
+        st.session_state.start_date = datetime(1900, 1, 1)
+
+
+    # Crear un marcador de lugar para el gráfico
+    graph_placeholder = st.empty()
+
+    # **Botones y entrada de fecha**
+    # Se resuelven antes de dibujar para que el gráfico se renderice una sola vez por rerun
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
+
+    # Actualizar start_date basado en las interacciones
+    with col1:
+        if st.button('5 Días'):
+            st.session_state.start_date = datetime.today() - timedelta(days=5)
+
+    with col2:
+        if st.button('1 Mes'):
+            st.session_state.start_date = datetime.today() - timedelta(days=30)
+
+    with col3:
+        if st.button('1 Año'):
+            st.session_state.start_date = datetime.today() - timedelta(days=365)
+
+    with col4:
+        if st.button('5 Años'):
+            st.session_state.start_date = datetime.today() - timedelta(days=5 * 365)
+
+    with col5:
+        if st.button('Todos los tiempos'):
+            st.session_state.start_date = datetime(1900, 1, 1)
+
+    with col6:
+        custom_date = st.date_input("Selecciona la fecha de inicio", st.session_state.start_date)
+        if custom_date != st.session_state.start_date.date():
+            st.session_state.start_date = datetime.combine(custom_date, datetime.min.time())
+
+    def render_graph(key):
+        # Usar la fecha seleccionada
+        start_date = st.session_state.start_date
+
+        # Crear una figura interactiva
+        fig = go.Figure()
+
+        # Serie que se dibuja por cada selección: la original o su conversión a la divisa elegida
+        leer = {nombre: nombre if divisa_grafico in ("Original", monedas[nombre]) else divisas.nombre_convertido(nombre, divisa_grafico)
+                for nombre in selected_tickers}
+
+        # Nivel de detalle: cada serie se lee en la resolución más fina que quepa en el rango
+        # visible (barras intradía si las hay, diaria, semanal o mensual) y se reduce con LTTB a
+        # PUNTOS_POR_TRAZO puntos
+        primeras_fechas = cache_series.primeras_fechas()
+        barras = cache_series.intradia()
+        por_frecuencia = {}
+        for ticker_nombre in selected_tickers:
+            inicio = max(start_date.date(), primeras_fechas.get(leer[ticker_nombre], start_date.date()))
+            frecuencia = elegir_frecuencia(inicio, intradia=barras.get(leer[ticker_nombre]))
+            por_frecuencia.setdefault(frecuencia, []).append(leer[ticker_nombre])
+        con_horas = any(frecuencia in INTERVALOS for frecuencia in por_frecuencia)
+
+        # Series memoizadas por (ticker, fecha de inicio, resolución, versión de datos): cambiar
+        # de gráfico lineal a índices solo vuelve a normalizar, sin leer de la base de datos
+        series = {}
+        for frecuencia, nombres in por_frecuencia.items():
+            series.update(cache_series.series(nombres, desde=start_date, frecuencia=frecuencia, puntos=PUNTOS_POR_TRAZO))
+
+        # Con muchos puntos en total se dibuja con WebGL
+        Trazo = clase_trazo(sum(len(df) for df in series.values()))
+
+        # Graficar los datos de los índices seleccionados
+        sin_convertir = []
+        for ticker_nombre in selected_tickers:
+            df = series.get(leer[ticker_nombre])
+            if df is None:
+                if leer[ticker_nombre] != ticker_nombre:
+                    sin_convertir.append(ticker_nombre)
+                continue
+            close = df['close']
+
+            # Normalizar si se selecciona el gráfico de índices
+            if st.session_state.graph_option == 'Gráfico de Índices':
+                close = (close / close.iloc[0]) * 100
+
+            currency = monedas[ticker_nombre] if divisa_grafico == "Original" else divisa_grafico
+
+            # Añadir los datos al gráfico
+            fig.add_trace(Trazo(
+                x=df['fecha'],
+                y=close,
+                mode='lines',
+                name=f"{ticker_nombre} ({currency})"
+            ))
+
+        # Ajustar el rango de fechas en función del valor de time_option y months_input
+        fig.update_layout(
+            title="Evolución Precio",
+            xaxis_title="Fecha (UTC)" if con_horas else "Fecha",
+            yaxis_title="Índice Normalizado" if st.session_state.graph_option == 'Gráfico de Índices' else "Precio de Cierre",
+            xaxis=dict(
+                showgrid=True,
+                tickformat="%e %b %H:%M" if con_horas else "%e %b %Y",  # Día, mes y hora o año
+                rangeslider=dict(visible=True),  # Añadir un slider interactivo para el rango de fechas
+            ),
+            yaxis=dict(
+                showgrid=True
+            ),
+            hovermode="x unified",  # Al pasar el cursor, ver todos los valores en esa fecha
+        )
+
+        # Mostrar la gráfica interactiva en el marcador de lugar
+        with diagnostico.tramo('app.plotly_chart', trazos=len(fig.data)):
+            graph_placeholder.plotly_chart(fig, key=key)
+        if sin_convertir:
+            st.caption(f"Todavía sin conversión a {divisa_grafico} (se genera al sincronizar): {', '.join(sin_convertir)}")
+
+
+    with diagnostico.tramo('app.render_graph', series=len(selected_tickers)):
+        render_graph(key="graph")
+
+
+    # Sección Resumen
+    def formatear_miles(valor):
+        if valor in [None, 'N/A']: return "N/A"
+        try:
+            return f"{int(valor):,}".replace(",", ".")
+        except:
+            return "N/A"
+
+    def formatear_decimal(valor, decimales=4):
+        if valor in [None, 'N/A']: return "N/A"
+        try:
+            return f"{valor:.{decimales}f}".replace(".", ",")
+        except:
+            return "N/A"
+
+    if selected_tickers:
+        st.markdown("#### Datos Financieros Clave")
+
+        # Estilos CSS para los boxes
+        st.markdown("""
+            <style>
+            .box-container {
+                border: 1px solid #444;
+                border-radius: 10px;
+                padding: 15px;
+                background-color: #1e1e1e;
+                color: white;
+                text-align: center;
+                margin-bottom: 20px;
+            }
+            .box-title {
+                font-weight: bold;
+                font-size: 18px;
+                margin-bottom: 10px;
+            }
+            .box-item {
+                margin: 5px 0;
+                font-size: 16px;
+                text-align: left;
+            }
+            </style>
+        """, unsafe_allow_html=True)
+
+
+
+
+        # Un hueco por box, en el orden de la selección; cada uno se rellena en cuanto llega su
+        # .info (descargas en paralelo, ver lanzar). Lo que no llega en TIMEOUT_INFO segundos desde
+        # que se lanzaron las descargas se muestra con los últimos valores conocidos y se sigue descargando para el próximo rerun.
+        cols = st.columns(4)
+        huecos = {}
+        for i, nombre in enumerate(selected_tickers):
+            ticker_symbol = simbolos[nombre]
+            huecos[ticker_symbol] = (nombre, cols[i % 4].empty())
+            huecos[ticker_symbol][1].markdown(f"""
+                <div class='box-container'>
+                    <div class='box-title'>{nombre} ({ticker_symbol})</div>
+                    <div class='box-item'>⏳ Cargando…</div>
+                </div>
+                """, unsafe_allow_html=True)
+
+        for ticker_symbol, info, actualizado in cache_info.a_medida(futuros_info, timeout=max(0, limite_info - time.monotonic())):
+            nombre, hueco = huecos[ticker_symbol]
+            with diagnostico.tramo('app.info_box', ticker=ticker_symbol, antiguo=actualizado is not None):
+                if not info:
+                    hueco.warning(f"No se pudo obtener información para {nombre}")
+                    continue
+                quote_type = info.get("quoteType", "UNKNOWN")
+
+                # Estructura condicional personalizada
+                if quote_type == "ETF":
+                    tipo_mostrar = "📦 ETF"
+
+                elif quote_type == "INDEX":
+                    tipo_mostrar = "🧱 Índice"
+
+                elif quote_type == "EQUITY":
+                    tipo_mostrar = "🏢 Activo"
+
+                else:
+                    tipo_mostrar = "❓ Otro"
+
+                if quote_type == "EQUITY":
+                    pb_ratio = formatear_decimal(info.get('priceToBook', 'N/A'))
+                    earnings = formatear_miles(info.get('netIncomeToCommon', 'N/A'))
+                    market_cap = formatear_miles(info.get('marketCap', 'N/A'))
+                    ROA = formatear_decimal(info.get('returnOnAssets', 'N/A'))
+                    ROE = formatear_decimal(info.get('returnOnEquity', 'N/A'))
+
+                    items = f"""
+                        <div class='box-item'>📘 P/B: {pb_ratio}</div>
+                        <div class='box-item'>💰 BDII: {earnings}</div>
+                        <div class='box-item'>💼 Capitalización: {market_cap}</div>
+                        <div class='box-item'>📈 ROA: {ROA}</div>
+                        <div class='box-item'>📊 ROE: {ROE}</div>"""
+                else:
+                    items = f"<div class='box-item'>{tipo_mostrar}</div>"
+
+                # Sin respuesta a tiempo (o con error): últimos valores conocidos, con su fecha
+                if actualizado is not None:
+                    items += f"<div class='box-item'>⏱️ Datos del {datetime.fromtimestamp(actualizado):%d/%m/%Y %H:%M}</div>"
+
+                hueco.markdown(f"""
+                <div class='box-container'>
+                    <div class='box-title'>{nombre} ({ticker_symbol})</div>
+                    {items}
+                </div>
+                """, unsafe_allow_html=True)
@@ -0,0 +1,165 @@
+"""💰 Inversión: compara estrategias (lump sum o DCA, rebalanceo, stop-loss) sobre los cierres guardados."""
+import os
+
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from dadanalysis import analitica, conexiones, simulacion, universo
+from dadanalysis.graficos import clase_trazo
+from paginas.comun import obtener_cache_series
+
+ENTRADAS = ["Lump sum", "DCA"]
+INICIOS = {"Solo el primer día": None, "Cada año": 'YS', "Cada trimestre": 'QS', "Cada mes": 'MS'}
+STOPS = [0.0, 0.1, 0.2, 0.3]
+# Los inicios del barrido dejan al menos este margen hasta el último cierre
+DIAS_MINIMOS = 365
+
+
+@st.cache_data(max_entries=8)
+def cargar_matriz_inversion(nombres, version):
+    with conexiones.lectura() as conexion:
+        return analitica.cargar_matriz(conexion, nombres, columnar=obtener_cache_series().columnar)
+
+
+def escenarios_estrategias(pesos, total, entradas, meses_dca, rebalanceos, stops, inicios):
+    """Escenarios de ``simulacion.rejilla``: lump sum y DCA reparten el mismo ``total``."""
+    comunes = dict(inicio=list(inicios), pesos=[pesos], rebalanceo=list(rebalanceos), stop_loss=list(stops))
+    partes = []
+    if "Lump sum" in entradas:
+        partes.append(simulacion.rejilla(capital_inicial=total, **comunes))
+    if "DCA" in entradas:
+        # Primera compra el día de inicio y el resto el primer día hábil de los meses siguientes
+        cuota = total / meses_dca
+        partes.append(simulacion.rejilla(capital_inicial=cuota, aportacion=cuota, frecuencia_aportacion='M',
+                                         num_aportaciones=meses_dca - 1, **comunes))
+    escenarios = pd.concat(partes, ignore_index=True)
+    escenarios['estrategia'] = [etiqueta(e) for e in escenarios.itertuples()]
+    return escenarios
+
+
+def etiqueta(escenario):
+    entrada = (f"DCA {escenario.num_aportaciones + 1} meses" if escenario.aportacion > 0 else "Lump sum")
+    rebalanceo = simulacion.FRECUENCIAS.get(escenario.rebalanceo, "Sin rebalanceo")
+    stop = f"stop {escenario.stop_loss:.0%}" if escenario.stop_loss > 0 else "sin stop"
+    return f"{entrada} · {rebalanceo} · {stop}"
+
+
+# El barrido completo solo devuelve estadísticas; las curvas se piden para el primer inicio,
+# que son tantas como estrategias
+@st.cache_data(max_entries=8)
+def simular_estrategias(nombres, pesos, total, entradas, meses_dca, rebalanceos, stops, frecuencia_inicios, procesos, version):
+    precios = cargar_matriz_inversion(nombres, version)
+    # El barrido empieza el primer día en que todos los activos con peso tienen precio: los
+    # inicios anteriores la simulación los llevaría a ese mismo día y saldrían repetidos
+    con_precio = precios.loc[:, [p > 0 for p in pesos]].notna().cummax().all(axis=1)
+    primero = con_precio.idxmax() if con_precio.any() else precios.index[0]
+    ultimo = precios.index[-1] - pd.Timedelta(days=DIAS_MINIMOS)
+    if frecuencia_inicios is None or ultimo <= primero:
+        inicios = [primero]
+    else:
+        inicios = [primero, *(d for d in pd.date_range(primero, ultimo, freq=frecuencia_inicios) if d > primero)]
+    escenarios = escenarios_estrategias(pesos, total, entradas, meses_dca, rebalanceos, stops, inicios)
+    columnas = list(simulacion.PARAMETROS)
+
+    barrido = simulacion.simular(precios, escenarios[columnas], procesos=procesos, curvas=False)
+    tabla = barrido['estadisticas']
+    tabla['estrategia'] = escenarios['estrategia']
+
+    primeros = escenarios[escenarios['inicio'] == inicios[0]].reset_index(drop=True)
+    curvas = simulacion.simular(precios, primeros[columnas])
+    valor = pd.DataFrame(curvas['valor'].T, index=curvas['fechas'], columns=primeros['estrategia'])
+    aportado = pd.DataFrame(curvas['aportado'].T, index=curvas['fechas'], columns=primeros['estrategia'])
+    return tabla, valor, aportado, len(inicios)
+
+
+def resumen_estrategias(tabla):
+    """Una fila por estrategia con la mediana (y el peor caso) de los inicios del barrido."""
+    grupos = tabla.groupby('estrategia', sort=False)
+    return pd.DataFrame({
+        'Inicios': grupos.size(),
+        'Ganancia (mediana)': grupos['ganancia'].median(),
+        'TWR anual (mediana)': grupos['twr_anualizada'].median(),
+        'TWR anual (peor)': grupos['twr_anualizada'].min(),
+        'Volatilidad (mediana)': grupos['volatilidad'].median(),
+        'Máx. drawdown (mediana)': grupos['max_drawdown'].median(),
+        'Sharpe (mediana)': grupos['sharpe'].median(),
+        'Stop activado': grupos['stop'].apply(lambda s: s.notna().mean()),
+    })
+
+
+def mostrar():
+    cache_series = obtener_cache_series()
+    df_tickers = universo.actual()
+    st.markdown("<div class='title'>💰 Inversión</div>", unsafe_allow_html=True)
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        nombres = st.multiselect("Activos de la cartera", list(df_tickers['nombreTicker']),
+                                 default=["SyP_500", "Eurostoxx600"], key="inv_activos")
+    with col2:
+        total = st.number_input("Importe total", min_value=100.0, value=10_000.0, step=1_000.0, key="inv_total")
+    if not nombres:
+        st.info("Selecciona al menos un activo.")
+        return
+
+    # Pesos relativos (se normalizan): todos a 1 = equiponderado
+    cols = st.columns(min(len(nombres), 4))
+    pesos = tuple(cols[i % len(cols)].number_input(f"Peso {nombre}", min_value=0.0, value=1.0, step=0.5,
+                                                   key=f"inv_peso_{nombre}")
+                  for i, nombre in enumerate(nombres))
+    if sum(pesos) <= 0:
+        st.info("Algún activo tiene que tener peso.")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        entradas = st.multiselect("Entrada", ENTRADAS, default=ENTRADAS, key="inv_entradas")
+        meses_dca = st.number_input("Meses de DCA", min_value=2, max_value=120, value=12, key="inv_meses")
+    with col2:
+        rebalanceos = st.multiselect("Rebalanceo", [None, *simulacion.FRECUENCIAS], default=[None, 'A'],
+                                     format_func=lambda f: simulacion.FRECUENCIAS.get(f, "Sin rebalanceo"), key="inv_rebalanceo")
+    with col3:
+        stops = st.multiselect("Stop-loss", STOPS, default=[0.0], format_func=lambda s: f"{s:.0%}" if s else "Sin stop",
+                               key="inv_stops")
+    with col4:
+        inicios = st.selectbox("Fechas de inicio", list(INICIOS), index=1, key="inv_inicios")
+        procesos = st.number_input("Procesos", min_value=1, max_value=os.cpu_count() or 1, value=1, key="inv_procesos",
+                                   help="Reparte los barridos grandes entre varios procesos")
+    if not (entradas and rebalanceos and stops):
+        st.info("Elige al menos una entrada, un rebalanceo y un stop-loss.")
+        return
+
+    matriz = cargar_matriz_inversion(tuple(nombres), cache_series.version())
+    if matriz.empty or matriz.dropna(how='all').empty:
+        st.info("Todavía no hay datos en la base de datos.")
+        return
+
+    tabla, valor, aportado, num_inicios = simular_estrategias(
+        tuple(nombres), pesos, float(total), tuple(entradas), int(meses_dca), tuple(rebalanceos), tuple(stops),
+        INICIOS[inicios], int(procesos), cache_series.version())
+
+    st.markdown(f"#### Evolución desde {valor.index[valor.notna().any(axis=1).argmax()]:%d/%m/%Y}")
+    Trazo = clase_trazo(valor.size)
+    fig = go.Figure()
+    for estrategia in valor.columns:
+        fig.add_trace(Trazo(x=valor.index, y=valor[estrategia], mode='lines', name=estrategia))
+    # Lo aportado solo depende de la entrada: una línea por cada una
+    for estrategia in aportado.T.drop_duplicates().index:
+        fig.add_trace(Trazo(x=aportado.index, y=aportado[estrategia], mode='lines', line=dict(dash='dot'),
+                            name=f"Aportado · {estrategia.split(' · ')[0]}"))
+    fig.update_layout(yaxis_title="Valor de la cartera", hovermode="x unified")
+    st.plotly_chart(fig, key="inversion")
+
+    st.markdown(f"#### Resumen por estrategia ({num_inicios} fechas de inicio, {len(tabla)} simulaciones)")
+    resumen = resumen_estrategias(tabla)
+    st.dataframe(resumen.style.format("{:.2%}", subset=[c for c in resumen.columns if c not in ('Inicios', 'Sharpe (mediana)')])
+                              .format("{:.2f}", subset=['Sharpe (mediana)']))
+
+    if num_inicios > 1:
+        st.markdown("#### TWR anualizada según la fecha de inicio")
+        fig_twr = go.Figure()
+        for estrategia, grupo in tabla.groupby('estrategia', sort=False):
+            fig_twr.add_trace(go.Scatter(x=grupo['inicio_efectivo'], y=grupo['twr_anualizada'], mode='lines+markers', name=estrategia))
+        fig_twr.update_layout(yaxis_tickformat=".0%", hovermode="x unified")
+        st.plotly_chart(fig_twr, key="inversion_twr")
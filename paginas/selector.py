@@ -0,0 +1,96 @@
+"""Selección de series buscable y paginada.
+
+Con los componentes de los índices el universo pasa de mil tickers, demasiados para una
+rejilla con una casilla por ticker: aquí se filtra por grupo y por texto y solo se dibujan
+las casillas de la página visible. La selección vive en ``st.session_state.seleccion``
+(lista de ``nombreTicker`` en el orden en que se eligieron), así que se conserva al
+cambiar de filtro o de página.
+"""
+import math
+
+import streamlit as st
+
+POR_PAGINA = 40
+COLUMNAS = 4
+PREFIJO_COMPONENTES = "Componentes "
+
+
+def grupos(df_tickers):
+    indices = sorted({i for valor in df_tickers['indices'] if valor for i in valor.split(',')})
+    return ["Índices", "Bancos", *[PREFIJO_COMPONENTES + i for i in indices], "Divisas", "Todos"]
+
+
+def filtrar(df_tickers, grupo, busqueda):
+    df = df_tickers
+    if grupo == "Índices":
+        df = df[df['tipo'] == 'indice']
+    elif grupo == "Bancos":
+        df = df[df['tipo'] == 'banco']
+    elif grupo == "Divisas":
+        df = df[df['tipo'] == 'divisa']
+    elif grupo.startswith(PREFIJO_COMPONENTES):
+        indice = grupo[len(PREFIJO_COMPONENTES):]
+        df = df[(',' + df['indices'] + ',').str.contains(f',{indice},', regex=False)]
+    if busqueda:
+        texto = df['ticker'] + ' ' + df['nombreTicker'] + ' ' + df['pais'].fillna('')
+        df = df[texto.str.contains(busqueda.strip(), case=False, regex=False)]
+    return df
+
+
+def _clave(nombre):
+    return f"sel_{nombre}"
+
+
+def _alternar(nombre):
+    seleccion = st.session_state.seleccion
+    if st.session_state[_clave(nombre)]:
+        if nombre not in seleccion:
+            seleccion.append(nombre)
+    elif nombre in seleccion:
+        seleccion.remove(nombre)
+
+
+def _quitar():
+    actuales = st.session_state.seleccion_actual
+    for nombre in st.session_state.seleccion:
+        if nombre not in actuales and _clave(nombre) in st.session_state:
+            st.session_state[_clave(nombre)] = False
+    st.session_state.seleccion = list(actuales)
+
+
+def seleccionar_series(df_tickers, titulo="Selecciona series para visualizar"):
+    """Dibuja el selector y devuelve la lista de ``nombreTicker`` seleccionados."""
+    seleccion = st.session_state.setdefault('seleccion', [])
+
+    with st.expander(titulo):
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            grupo = st.selectbox("Grupo", grupos(df_tickers), key="sel_grupo")
+        with col2:
+            busqueda = st.text_input("Buscar (nombre, ticker o país)", key="sel_busqueda")
+        candidatos = filtrar(df_tickers, grupo, busqueda)
+
+        paginas = max(1, math.ceil(len(candidatos) / POR_PAGINA))
+        # Al cambiar el filtro la página guardada puede quedar fuera de rango
+        if st.session_state.get('sel_pagina', 1) > paginas:
+            st.session_state.sel_pagina = 1
+        pagina = st.session_state.get('sel_pagina', 1)
+        st.caption(f"{len(candidatos)} series" + (f" · página {pagina} de {paginas}" if paginas > 1 else ""))
+
+        visibles = candidatos['nombreTicker'].iloc[(pagina - 1) * POR_PAGINA:pagina * POR_PAGINA]
+        cols = st.columns(COLUMNAS)
+        for i, nombre in enumerate(visibles):
+            # Las casillas que no se dibujan pierden su estado: se recupera de la selección
+            if _clave(nombre) not in st.session_state:
+                st.session_state[_clave(nombre)] = nombre in seleccion
+            with cols[i % COLUMNAS]:
+                st.checkbox(nombre, key=_clave(nombre), on_change=_alternar, args=(nombre,))
+
+        if paginas > 1:
+            st.number_input("Página", min_value=1, max_value=paginas, step=1, key="sel_pagina")
+
+        if seleccion:
+            st.session_state.seleccion_actual = list(seleccion)
+            st.multiselect("Seleccionadas", seleccion, key="seleccion_actual", on_change=_quitar)
+
+    return list(seleccion)
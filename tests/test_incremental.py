@@ -0,0 +1,319 @@
+"""Invariantes de la actualización incremental, contra el proveedor falso y datos sintéticos.
+
+Lo calculado por partes (sincronización incremental, correcciones de la cola, revisiones
+del proveedor) tiene que coincidir con lo que saldría de calcularlo todo de nuevo.
+
+    python -m pytest tests
+"""
+import os
+import shutil
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+import datos_sinteticos  # noqa: E402
+from dadanalysis import (almacen, compuestos, conexiones, derivadas, divisas, graficos, intradia,  # noqa: E402
+                         revisiones, sincronizacion)
+from dadanalysis.columnar import AlmacenColumnar  # noqa: E402
+from dadanalysis.proveedores import ProveedorFalso  # noqa: E402
+
+INICIO = (date.today() - timedelta(days=3 * 365)).isoformat()
+DIAS_ATRASO = 5
+
+
+def universo_prueba():
+    """Seis bancos en dos países y tres divisas, más los pares de divisas que necesitan."""
+    df = datos_sinteticos.universo_sintetico(6, bancos_por_pais=3)
+    df['tipo'], df['indices'] = 'banco', ''
+    df['divisa'] = ['EUR', 'EUR', 'USD', 'USD', 'GBp', 'EUR']
+    return pd.concat([df, divisas.pares(df)], ignore_index=True)[['ticker', 'nombreTicker', 'tipo', 'pais', 'indices',
+                                                                  'divisa']]
+
+
+def proveedor(atraso=0):
+    """``ProveedorFalso`` de la prueba; con ``atraso`` le faltan los últimos días hábiles."""
+    falso = ProveedorFalso(inicio=INICIO)
+    if atraso:
+        for ticker in universo_prueba()['ticker']:
+            falso.frames[ticker] = falso.serie_sintetica(ticker).iloc[:-atraso]
+    return falso
+
+
+@pytest.fixture(scope='module')
+def base(tmp_path_factory):
+    """Base de datos sincronizada con ``DIAS_ATRASO`` días de retraso."""
+    ruta = str(tmp_path_factory.mktemp('base') / 'base.db')
+    with almacen.abrir(ruta) as conexion:
+        conexiones.inicializar_todo(conexion)
+        sincronizacion.sincronizar(conexion, universo_prueba(), proveedor(DIAS_ATRASO))
+        conexion.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return ruta
+
+
+@pytest.fixture
+def conexion(base, tmp_path):
+    ruta = str(tmp_path / 'prueba.db')
+    shutil.copy(base, ruta)
+    conexion = almacen.conectar(ruta)
+    yield conexion
+    conexion.close()
+
+
+def sincronizar(conexion, **opciones):
+    return sincronizacion.sincronizar(conexion, universo_prueba(), opciones.pop('proveedor', None) or proveedor(),
+                                      **opciones)
+
+
+def tabla(conexion, nombre):
+    return np.array(conexion.execute(f'SELECT * FROM {nombre} ORDER BY 1, 2').fetchall(), dtype=np.float64)
+
+
+def sin_capitalizacion(conexion, filas):
+    """``filas`` sin las de los compuestos por capitalización, que mantienen las acciones de su primera estimación."""
+    por_cap = [t for t, nombre in conexion.execute('SELECT ticker_id, nombreTicker FROM series') if nombre.endswith('_cap')]
+    return filas[~np.isin(filas[:, 0], por_cap)]
+
+
+def comprobar_igual_que_reconstruir(conexion):
+    """Compuestos, conversiones y métricas coinciden con recalcularlo todo desde cero."""
+    conexion.commit()
+    precios, metricas = tabla(conexion, 'prices'), tabla(conexion, 'metricas')
+    df = universo_prueba()
+    compuestos.reconstruir(conexion, df)
+    divisas.reconstruir(conexion, df)
+    derivadas.reconstruir(conexion)
+    np.testing.assert_allclose(sin_capitalizacion(conexion, tabla(conexion, 'prices')),
+                               sin_capitalizacion(conexion, precios), rtol=1e-9)
+    np.testing.assert_allclose(sin_capitalizacion(conexion, tabla(conexion, 'metricas')),
+                               sin_capitalizacion(conexion, metricas), rtol=1e-7, equal_nan=True)
+    conexion.rollback()
+
+
+def id_de(conexion, ticker):
+    return conexion.execute('SELECT ticker_id FROM series WHERE ticker = ?', (ticker,)).fetchone()[0]
+
+
+def cierres(conexion, ticker_id):
+    return np.array(conexion.execute('SELECT fecha, close FROM prices WHERE ticker_id = ? ORDER BY fecha',
+                                     (ticker_id,)).fetchall())
+
+
+def cierres_proveedor(ticker):
+    serie = proveedor().serie_sintetica(ticker)
+    return np.column_stack([almacen.fechas_a_dias(serie['Date']), serie['Close']])
+
+
+def revisados(conexion):
+    return dict(conexion.execute('SELECT ticker_id, numero FROM revisiones'))
+
+
+# ----------------------------------------------------------------------------- sincronización y dependientes
+
+def test_sincronizacion_incremental_igual_que_reconstruir(conexion):
+    resumen = sincronizar(conexion)
+    assert resumen['filas'] > 0 and resumen['revisados'] == 0 and resumen['completa']
+    assert resumen['compuestos'] and resumen['convertidas']
+    comprobar_igual_que_reconstruir(conexion)
+    assert revisados(conexion) == {}
+    # Solo se han añadido días: ninguna serie tiene cierres reescritos
+    assert almacen.reescrituras(conexion) == {}
+
+
+def test_correccion_de_la_cola_no_es_una_revision(conexion):
+    sincronizar(conexion)
+    conexion.commit()
+    ticker = 'T00000'
+    ticker_id = id_de(conexion, ticker)
+    ultima = conexion.execute('SELECT MAX(fecha) FROM prices WHERE ticker_id = ?', (ticker_id,)).fetchone()[0]
+    antes = tabla(conexion, 'prices'), tabla(conexion, 'metricas')
+    # Último cierre guardado a media sesión
+    conexion.execute('UPDATE prices SET close = close * 1.003 WHERE ticker_id = ? AND fecha = ?', (ticker_id, ultima))
+    conexion.commit()
+
+    resumen = sincronizar(conexion)
+    assert resumen['revisados'] == 0
+    assert revisados(conexion) == {}
+    np.testing.assert_allclose(cierres(conexion, ticker_id), cierres_proveedor(ticker))
+    assert almacen.reescrituras(conexion) == {ticker_id: (1, ultima)}
+    # Los dependientes se retoman desde el día corregido y vuelven a lo que eran
+    np.testing.assert_allclose(tabla(conexion, 'prices'), antes[0], rtol=1e-9)
+    np.testing.assert_allclose(tabla(conexion, 'metricas'), antes[1], rtol=1e-9, equal_nan=True)
+    comprobar_igual_que_reconstruir(conexion)
+
+
+def test_dividendo_reescribe_solo_el_ticker_revisado(conexion):
+    sincronizar(conexion)
+    conexion.commit()
+    ticker = 'T00002'
+    ticker_id = id_de(conexion, ticker)
+    ultima = conexion.execute('SELECT MAX(fecha) FROM prices WHERE ticker_id = ?', (ticker_id,)).fetchone()[0]
+    antes = tabla(conexion, 'prices')
+    # Ajuste hacia atrás que llega más allá del tramo más reciente
+    conexion.execute('UPDATE prices SET close = close * 0.98 WHERE ticker_id = ? AND fecha <= ?',
+                     (ticker_id, ultima - revisiones.RANGO_DIAS - 2))
+    conexion.commit()
+
+    falso = proveedor()
+    resumen = sincronizar(conexion, proveedor=falso)
+    assert resumen['revisados'] == 1
+    assert falso.llamadas == resumen['peticiones'] + 1
+    assert revisados(conexion) == {ticker_id: 1}
+    np.testing.assert_allclose(tabla(conexion, 'prices'), antes, rtol=1e-9)
+    comprobar_igual_que_reconstruir(conexion)
+
+
+def test_revision_sin_presupuesto_deja_la_sincronizacion_pendiente(conexion, monkeypatch):
+    sincronizar(conexion)
+    conexion.commit()
+    ticker_id = id_de(conexion, 'T00002')
+    conexion.execute('UPDATE prices SET close = close * 0.98 WHERE ticker_id = ?', (ticker_id,))
+    conexion.commit()
+
+    # El presupuesto se acaba justo después de los lotes incrementales
+    descargar = sincronizacion.descargar_por_lotes
+    llamadas = []
+
+    def sin_presupuesto_para_revisar(proveedor, peticiones, tamano_lote, seguir=None):
+        llamadas.append(peticiones)
+        return descargar(proveedor, peticiones, tamano_lote, seguir=(lambda: False) if len(llamadas) > 1 else seguir)
+    monkeypatch.setattr(sincronizacion, 'descargar_por_lotes', sin_presupuesto_para_revisar)
+    resumen = sincronizar(conexion)
+    assert list(llamadas[1]) == ['T00002']
+    assert resumen['revisados'] == 0 and not resumen['completa']
+    assert revisados(conexion) == {}
+
+
+def test_reescribir_los_mismos_cierres_no_cuenta(conexion):
+    ticker_id = id_de(conexion, 'T00001')
+    serie = cierres(conexion, ticker_id)
+    datos = pd.DataFrame({'Date': almacen.dias_a_fechas(serie[-20:, 0]), 'Close': serie[-20:, 1]})
+    almacen.guardar_precios(conexion, ticker_id, datos)
+    almacen.reescribir_precios(conexion, ticker_id, datos, int(serie[-20, 0]))
+    assert almacen.reescrituras(conexion) == {}
+
+    datos.loc[15, 'Close'] *= 1.01
+    almacen.guardar_precios(conexion, ticker_id, datos)
+    assert almacen.reescrituras(conexion) == {ticker_id: (1, int(serie[-5, 0]))}
+
+
+# ----------------------------------------------------------------------------- métricas derivadas
+
+def test_metricas_por_partes_igual_que_de_una_vez():
+    cierres_todos = datos_sinteticos.cierres_sinteticos('T00003', 900)
+    completas, maximo = derivadas.calcular(np.empty(0), cierres_todos, -np.inf)
+    for corte in (1, 30, 251, 600):
+        previos = cierres_todos[:corte][-derivadas.HISTORIA_ESTADO:]
+        parte, maximo_parte = derivadas.calcular(previos, cierres_todos[corte:], np.max(cierres_todos[:corte]))
+        np.testing.assert_allclose(parte, completas[corte:], rtol=1e-9, equal_nan=True)
+        assert maximo_parte == maximo
+
+
+def test_retroceder_deja_el_estado_del_dia_anterior(conexion):
+    ticker_id = id_de(conexion, 'T00004')
+    serie = cierres(conexion, ticker_id)
+    antes = tabla(conexion, 'metricas')
+    derivadas.retroceder(conexion, ticker_id, int(serie[-40, 0]))
+    assert conexion.execute('SELECT MAX(fecha) FROM metricas WHERE ticker_id = ?', (ticker_id,)).fetchone()[0] \
+        == serie[-41, 0]
+    assert derivadas.actualizar_ticker(conexion, ticker_id) == 40
+    np.testing.assert_allclose(tabla(conexion, 'metricas'), antes, rtol=1e-9, equal_nan=True)
+
+
+# ----------------------------------------------------------------------------- caché columnar
+
+def test_columnar_sigue_a_sqlite_sin_cambiar_lo_mapeado(conexion, tmp_path):
+    columnar = AlmacenColumnar(conexion.execute('PRAGMA database_list').fetchone()[2], directorio=str(tmp_path / 'cols'))
+    columnar.actualizar(conexion)
+    ticker_id = id_de(conexion, 'T00000')
+    _, mapeados = columnar.serie(ticker_id)
+    vistos = np.array(mapeados)
+
+    sincronizar(conexion)
+    ultima = conexion.execute('SELECT MAX(fecha) FROM prices WHERE ticker_id = ?', (ticker_id,)).fetchone()[0]
+    conexion.execute('UPDATE prices SET close = close * 1.01 WHERE ticker_id = ? AND fecha = ?', (ticker_id, ultima))
+    sincronizar(conexion)
+    conexion.commit()
+    columnar.actualizar(conexion)
+
+    np.testing.assert_array_equal(mapeados, vistos)
+    lector = AlmacenColumnar(columnar.ruta_db, directorio=columnar.directorio)
+    for (ticker_id,) in conexion.execute('SELECT DISTINCT ticker_id FROM prices').fetchall():
+        dias, close = lector.serie(ticker_id)
+        esperado = cierres(conexion, ticker_id)
+        np.testing.assert_array_equal(dias, esperado[:, 0])
+        # Reescribir un cierre con ruido de coma flotante no cuenta como cambio
+        np.testing.assert_allclose(close, esperado[:, 1], rtol=almacen.TOLERANCIA_CIERRE)
+
+
+# ----------------------------------------------------------------------------- reducción de puntos
+
+@pytest.mark.parametrize('metodo', list(graficos.METODOS))
+def test_reducir_conserva_extremos_y_escala(metodo):
+    fechas = almacen.dias_a_fechas(np.arange(20000))
+    valores = datos_sinteticos.cierres_sinteticos('T00005', 20000)
+    x, y = graficos.reducir(fechas, valores, puntos=500, metodo=metodo)
+    assert len(y) <= 500
+    assert x[0] == fechas[0] and x[-1] == fechas[-1] or metodo == 'minmax'
+    assert np.all(np.diff(np.asarray(x).astype(np.int64)) > 0)
+    if metodo == 'minmax':
+        assert y.max() == valores.max() and y.min() == valores.min()
+    # Invariante a multiplicar por una constante positiva (se cachea antes de normalizar)
+    x2, y2 = graficos.reducir(fechas, valores * 3.7, puntos=500, metodo=metodo)
+    np.testing.assert_array_equal(x2, x)
+    np.testing.assert_allclose(y2, y * 3.7)
+
+
+# ----------------------------------------------------------------------------- intradía
+
+def test_codificacion_intradia_ida_y_vuelta():
+    segundos = np.arange(8 * 3600, 16 * 3600 + 1800, 60)
+    precios = 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.001, len(segundos))))
+    vuelta_segundos, vuelta_precios = intradia.decodificar(*intradia.codificar(segundos, precios))
+    np.testing.assert_array_equal(vuelta_segundos, segundos)
+    np.testing.assert_allclose(vuelta_precios, precios, rtol=10.0 ** -(intradia.MAX_CIFRAS - 1))
+
+
+def test_barras_agregados_y_retencion(tmp_path):
+    conexion = almacen.conectar(str(tmp_path / 'intradia.db'))
+    conexiones.inicializar_todo(conexion)
+    ticker_id = almacen.registrar_serie(conexion, 'X', 'X')
+    hoy = date(2026, 6, 15)
+    viejo, reciente = pd.Timestamp('2026-03-02'), pd.Timestamp('2026-06-12')
+    for dia in (viejo, reciente):
+        instantes = pd.date_range(dia + pd.Timedelta(hours=8), dia + pd.Timedelta(hours=16, minutes=30),
+                                  freq='1min', inclusive='left')
+        precios = np.linspace(100, 101, len(instantes))
+        intradia.guardar_barras(conexion, ticker_id, '1m', pd.DataFrame({'Datetime': instantes, 'Close': precios}))
+
+    horas = intradia.cargar_barras(conexion, ['X'], resolucion='1h')
+    # Cada hora de reloj lleva el cierre de su última barra de minuto
+    assert list(horas['fecha'].dt.hour.unique()) == list(range(8, 17))
+    assert horas['close'].iloc[-1] == pytest.approx(101, rel=1e-6)
+
+    borradas = intradia.compactar(conexion, hoy=hoy)
+    assert 'intradia_1m_202603' in borradas and 'intradia_1m_202606' not in borradas
+    minutos = intradia.cargar_barras(conexion, ['X'], resolucion='1m')
+    assert minutos['fecha'].dt.normalize().unique().tolist() == [reciente]
+    # Lo borrado sigue a resolución horaria y diaria
+    assert len(intradia.cargar_barras(conexion, ['X'], hasta=reciente, resolucion='1h')) == 9
+    assert len(intradia.cargar_barras(conexion, ['X'], resolucion='1d')) == 2
+    conexion.close()
+
+
+def test_base_sin_tablas_nuevas_se_lee_en_solo_lectura(base, tmp_path):
+    """``reescrituras`` se consulta desde conexiones de solo lectura sin que exista la tabla."""
+    ruta = str(tmp_path / 'antigua.db')
+    shutil.copy(base, ruta)
+    with sqlite3.connect(ruta) as escritura:
+        escritura.execute('DROP TABLE reescrituras')
+    lectura = sqlite3.connect(f'file:{ruta}?mode=ro', uri=True)
+    assert almacen.reescrituras(lectura) == {}
+    lectura.close()